@@ -12,6 +12,7 @@ Drop this into any project and run:
   python raggy.py interactive --quiet         # Interactive search mode
   python raggy.py status                      # Database stats with model info
   python raggy.py optimize                    # Benchmark and tune search modes
+  python raggy.py bench --backend onnx        # Check ONNX/int8 embeddings vs PyTorch
   python raggy.py search "query" --json       # Enhanced JSON output with scores
 
 Key Features:
@@ -22,43 +23,71 @@ Key Features:
 • Model Presets: --model-preset fast/balanced/multilingual/accurate
 • Config Support: Optional raggy_config.yaml for customization
 • Multilingual: Enhanced Dutch/English mixed content support
+• Async API: AsyncUniversalRAG for FastAPI/asyncio servers
 • Backward Compatible: All v1.x commands work unchanged
 """
 
 # Standard library imports
 import argparse
+import asyncio
+import fnmatch
+import functools
 import glob
+import gzip
 import hashlib
 import importlib.util
 import json
 import math
+import multiprocessing
 import os
+import platform
+import random
 import re
+import shutil
+import sqlite3
+import struct
 import subprocess
 import sys
+import threading
 import time
-from collections import Counter, defaultdict
+import zipfile
+import zlib
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 from typing import (
     Any,
     Callable,
     Dict,
+    Iterable,
     Iterator,
     List,
     Optional,
+    Pattern,
     Set,
     Tuple,
     Union,
 )
+from xml.etree import ElementTree
 
 # Version information
 __version__ = "2.0.0"
 
 # Constants
 CHUNK_READ_SIZE = 8192  # 8KB chunks for file reading
-MAX_CACHE_SIZE = 1000   # Maximum number of cached embeddings  
+MAX_CACHE_SIZE = 1000   # Maximum number of cached search results
 CACHE_TTL = 3600       # Cache time-to-live in seconds (1 hour)
 MAX_FILE_SIZE_MB = 100  # Maximum file size in MB
+STREAM_THRESHOLD_MB = 8  # Text files above this are chunked while streaming
+DEFAULT_PDF_WORKERS = 1  # PDF page-extraction processes per build (1 = in-process, 0 = one per CPU core)
+PDF_PARALLEL_MIN_PAGES = 32  # Shorter PDFs are extracted in-process
+PAGE_CACHE_DIR = "pages"  # Per-PDF page text cache in the db dir
+CHUNK_BOUNDARY_MODES = ["fixed", "content"]  # content = edit-stable boundaries and ids
+CONTENT_CUT_DIVISOR = 4  # A landmark past the minimum size ends a chunk with 1-in-N odds
+CONTENT_HASH_WINDOW = 48  # Characters before a landmark that decide whether it cuts
+STREAM_WINDOW_CHARS = 1 << 16  # Characters decoded per streaming read
+STREAMING_EXTENSIONS = {".md", ".txt"}
 SESSION_CACHE_HOURS = 24  # Hours before update check
 UPDATE_TIMEOUT_SECONDS = 2  # API timeout for update checks
 DEFAULT_CHUNK_SIZE = 1000
@@ -66,10 +95,75 @@ DEFAULT_CHUNK_OVERLAP = 200
 DEFAULT_RESULTS = 5
 DEFAULT_CONTEXT_CHARS = 200
 DEFAULT_HYBRID_WEIGHT = 0.7
+DEFAULT_RERANK_STRATEGY = "mmr"
+DEFAULT_MMR_LAMBDA = 0.7  # 1.0 = pure relevance, 0.0 = pure diversity
+MMR_CANDIDATE_MULTIPLIER = 3  # Candidate pool size relative to n_results
+MAX_QUERY_VARIANTS = 8  # Expanded query variants embedded per search
+RRF_K = 60  # Reciprocal rank fusion damping constant
+PREFILTER_QUERY_FACTOR = 4  # Max vector-index k for AND/-term filters, per requested candidate
+PREFILTER_EXACT_MAX = 4096  # Most allowed chunks an AND/-term filter scores exactly
+EXACT_SCORE_PAGE = 1000  # Ids per ChromaDB get when scoring exactly (SQLite variable limit)
+BINARY_RESCORE_FACTOR = 10  # Hamming candidates rescored per requested candidate
+BINARY_SCAN_BLOCK = 262144  # Binary codes compared per Hamming scan step
+
+GENERATION_FILE = ".raggy_generation"  # Index generation counter in db dir
+ALIAS_FILE = "aliases.json"  # Logical collection name -> live physical collection
+LOCK_FILE = ".raggy_lock"  # Serializes alias and generation updates across processes
+# Seconds a swapped-out collection is kept for readers.
+# Leases only cover queries in the process that deletes retired collections;
+# readers in other processes (e.g. a bot serving while the CLI runs rebuild)
+# are protected by this grace alone, so a longer query can lose its collection.
+# Every process that sees a retirement collects it once the grace has passed.
+RETIRED_COLLECTION_GRACE = 300
+DEFAULT_COLLECTION = "project_docs"
+MAX_COLLECTION_HANDLES = 16  # Open collection handles / BM25 states kept per process
+DEFAULT_ASYNC_WORKERS = 4  # Thread pool size for AsyncUniversalRAG
+
+# Embedding backend constants
+EMBEDDING_BACKENDS = ["torch", "onnx"]
+DEFAULT_EMBEDDING_BACKEND = "torch"
+DEFAULT_MODEL_CACHE_DIR = ".raggy_models"  # Exported ONNX models
+DEFAULT_BENCH_TOLERANCE = 0.99  # Minimum cosine similarity vs. PyTorch embeddings
+BENCH_SAMPLE_SIZE = 64
+DEFAULT_ENCODE_BATCH_SIZE = 32
+DEFAULT_ENCODE_WORKERS = 1  # 1 = encode in-process, 0 = one worker per CPU core
+DEFAULT_TOKEN_BUDGET = 8192  # Padded tokens per encode batch (0 = fixed-size batches)
+CHARS_PER_TOKEN = 4  # Rough token estimate for length bucketing
+
+# Index storage constants
+DEFAULT_ADD_BATCH_SIZE = 5000  # Fallback when ChromaDB doesn't report its max batch size
+DEFAULT_COMMIT_CHUNKS = 2000  # Chunks embedded and committed per build checkpoint
+MEMORY_HIGH_WATERMARK = 0.85  # Share of max_memory_mb above which build batches shrink
+MEMORY_LOW_WATERMARK = 0.6  # Share of max_memory_mb below which they grow back
+MEMORY_SAMPLE_INTERVAL = 0.05  # Seconds between RSS samples during a memory-capped build
+MIN_COMMIT_CHUNKS = 32  # Smallest commit a memory-capped build shrinks to
+MIN_TOKEN_BUDGET = 512  # Smallest token budget (one full-length sequence)
+MIN_INSERT_BATCH_SIZE = 100  # Smallest ChromaDB write a memory-capped build shrinks to
+REDUCTION_METHODS = ["pca", "truncate"]  # truncate = Matryoshka prefix
+REDUCTION_FIT_SAMPLE = 20000  # Rows used to fit a PCA projection
+REDUCTION_BENCH_SAMPLE = 2000  # Indexed chunks re-encoded by the reduction benchmark
+DEFAULT_SHARD_DIR = "./shards"
+SHARD_FILE_TEMPLATE = "shard-{index:03d}-of-{count:03d}.npz"
+SHARD_FORMAT_VERSION = 1
+
+# Snapshot constants
+SNAPSHOT_MAGIC = b"RAGGYSNP"
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_ALIGNMENT = 64  # Section alignment so vectors can be memory-mapped
+SNAPSHOT_SCAN_BLOCK = 65536  # Rows converted to float32 per scan step
+DEFAULT_SNAPSHOT_DTYPE = "float16"
+SNAPSHOT_SECTIONS = ("vectors", "columns", "bm25", "projection")  # Content hash order
+SNAPSHOT_SUFFIX = ".snap"
 
 # File type constants
 SUPPORTED_EXTENSIONS = [".md", ".pdf", ".docx", ".txt"]
-GLOB_PATTERNS = ["**/*.md", "**/*.pdf", "**/*.docx", "**/*.txt"]
+DEFAULT_INCLUDE_PATTERNS = [f"*{extension}" for extension in SUPPORTED_EXTENSIONS]
+DEFAULT_EXCLUDE_PATTERNS = [".git/", "node_modules/", "__pycache__/"]  # gitignore syntax
+IGNORE_FILE = ".gitignore"
+DISCOVERY_CACHE_FILE = "discovery.json"  # Directory listings keyed by mtime, in the db dir
+DISCOVERY_RACY_SECONDS = 2  # Listings this fresh aren't cached (mtime granularity)
+DOCX_DOCUMENT_PART = "word/document.xml"
+DOCX_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
 
 # Model presets
 FAST_MODEL = "paraphrase-MiniLM-L3-v2"
@@ -119,11 +213,13 @@ SYMBOLS = get_symbols()
 
 # Pre-compiled regex patterns for performance
 WORD_PATTERN = re.compile(r"\b\w+\b")
-NEGATIVE_TERM_PATTERN = re.compile(r"-\w+")
-AND_TERM_PATTERN = re.compile(r"\w+(?=\s+AND)", re.IGNORECASE)
+NEGATIVE_TERM_PATTERN = re.compile(r"(?<!\S)-\w+")  # "-term", not "well-known"
+AND_TERM_PATTERN = re.compile(r"\w+(?=\s+AND\b)|(?<=\bAND\s)\w+")  # Both operands
+AND_OPERATOR_PATTERN = re.compile(r"\bAND\b")
 QUOTED_PHRASE_PATTERN = re.compile(r'"([^"]+)"')
 HEADER_PATTERN = re.compile(r"(^#{1,6}\s+.*$)", re.MULTILINE)
 SENTENCE_BOUNDARY_PATTERN = re.compile(r"[.!?\n]")
+LANDMARK_PATTERN = re.compile(r"[.!?](?=\s)|\n")  # Candidate content-defined cut points
 WINDOWS_PATH_PATTERN = re.compile(r'[A-Za-z]:[\\\/][^\\\/\s]*[\\\/]')
 UNIX_PATH_PATTERN = re.compile(r'\/[^\/\s]*\/')
 FILE_URL_PATTERN = re.compile(r'\bfile:\/\/[^\s]*')
@@ -265,6 +361,94 @@ def check_for_updates(
         pass
 
 
+class SearchResultCache:
+    """Thread-safe LRU/TTL cache for search results, scoped to an index generation."""
+
+    def __init__(self, max_size: int = MAX_CACHE_SIZE, ttl: float = CACHE_TTL) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.generation: Optional[int] = None
+        self._entries: "OrderedDict[Tuple[Any, ...], Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+        query: str,
+        n_results: int,
+        hybrid: bool,
+        expand_query: bool,
+        model_name: str,
+        show_scores: Optional[bool] = None,
+        collection_name: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[Any, ...]:
+        """Build a cache key from the normalized query and search options."""
+        normalized = " ".join(query.lower().split())
+        filter_key = tuple(
+            (key, tuple(values)) for key, values in sorted(normalize_filters(filters).items())
+        )
+        return (
+            normalized, n_results, hybrid, expand_query, model_name, show_scores,
+            collection_name, filter_key,
+        )
+
+    def get(
+        self, key: Tuple[Any, ...], generation: int
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Return cached results for key, or None on a miss."""
+        with self._lock:
+            self._check_generation(generation)
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            # Copy so callers can't mutate the cached entry
+            return [dict(result) for result in entry[1]]
+
+    def put(
+        self, key: Tuple[Any, ...], generation: int, results: List[Dict[str, Any]]
+    ) -> None:
+        """Store results for key, evicting the least recently used entry."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._check_generation(generation)
+            self._entries[key] = (time.time(), [dict(result) for result in results])
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached entries (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "generation": self.generation,
+            }
+
+    def _check_generation(self, generation: int) -> None:
+        """Invalidate everything when the index generation changes."""
+        if generation != self.generation:
+            self._entries.clear()
+            self.generation = generation
+
+
 class BM25Scorer:
     """Lightweight BM25 implementation for keyword scoring."""
 
@@ -276,24 +460,41 @@ class BM25Scorer:
         self.doc_count = 0
         self.term_frequencies: List[Dict[str, int]] = []
         self.idf_scores: Dict[str, float] = {}
+        self.doc_index: Dict[str, int] = {}
+        self.doc_ids: List[str] = []
+        self._postings: Optional[Dict[str, Set[int]]] = None
 
-    def fit(self, documents: List[str]) -> None:
-        """Build BM25 index from documents."""
-        self.doc_count = len(documents)
-        self.doc_lengths = []
-        self.term_frequencies = []
-        doc_term_counts: Dict[str, int] = defaultdict(int)
+    def fit(self, documents: List[str], ids: Optional[List[str]] = None) -> None:
+        """Build BM25 index from documents (optionally keyed by document id)."""
+        term_frequencies = []
+        doc_lengths = []
 
         # Calculate term frequencies and document lengths
         for doc in documents:
             terms = self._tokenize(doc)
-            self.doc_lengths.append(len(terms))
+            doc_lengths.append(len(terms))
+            term_frequencies.append(Counter(terms))
 
-            term_freq = Counter(terms)
-            self.term_frequencies.append(term_freq)
+        self.fit_term_frequencies(term_frequencies, doc_lengths, ids)
+
+    def fit_term_frequencies(
+        self,
+        term_frequencies: List[Dict[str, int]],
+        doc_lengths: List[int],
+        ids: Optional[List[str]] = None,
+    ) -> None:
+        """Build BM25 index from precomputed per-document term counts."""
+        self.doc_count = len(term_frequencies)
+        self.doc_lengths = list(doc_lengths)
+        self.term_frequencies = list(term_frequencies)
+        self.doc_ids = list(ids or [])
+        self.doc_index = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
+        self._postings = None
+        doc_term_counts: Dict[str, int] = defaultdict(int)
 
-            # Count documents containing each term
-            for term in set(terms):
+        # Count documents containing each term
+        for term_freq in self.term_frequencies:
+            for term in term_freq:
                 doc_term_counts[term] += 1
 
         self.avg_doc_length = (
@@ -302,14 +503,98 @@ class BM25Scorer:
         )
 
         # Calculate IDF scores
+        self.idf_scores = {}
         for term, doc_freq in doc_term_counts.items():
             # Use standard BM25 IDF: log((N + 1) / df)
             # This avoids negative scores and is more stable for small datasets
             self.idf_scores[term] = math.log((self.doc_count + 1) / doc_freq)
 
+    def state_dict(self) -> Dict[str, Any]:
+        """Export per-document statistics (idf is recomputed on load)."""
+        ids = sorted(self.doc_index, key=self.doc_index.get)
+        return {
+            "k1": self.k1,
+            "b": self.b,
+            "ids": ids,
+            "doc_lengths": self.doc_lengths,
+            "term_frequencies": [dict(term_freq) for term_freq in self.term_frequencies],
+        }
+
+    @classmethod
+    def from_states(cls, states: List[Dict[str, Any]]) -> "BM25Scorer":
+        """Combine exported states, recomputing global document frequencies."""
+        scorer = cls(
+            k1=states[0].get("k1", 1.2) if states else 1.2,
+            b=states[0].get("b", 0.75) if states else 0.75,
+        )
+        term_frequencies: List[Dict[str, int]] = []
+        doc_lengths: List[int] = []
+        ids: List[str] = []
+        for state in states:
+            term_frequencies.extend(state["term_frequencies"])
+            doc_lengths.extend(state["doc_lengths"])
+            ids.extend(state["ids"])
+        scorer.fit_term_frequencies(term_frequencies, doc_lengths, ids)
+        return scorer
+
+    def save(self, path: Path, generation: int) -> None:
+        """Persist the scorer state for an index generation."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        state = self.state_dict()
+        state["generation"] = generation
+        tmp_path = path.with_name(path.name + ".tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path, generation: int) -> Optional["BM25Scorer"]:
+        """Load a persisted scorer, or None if missing or from another generation."""
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get("generation") != generation:
+            return None
+        return cls.from_states([state])
+
+    def postings(self) -> Dict[str, Set[int]]:
+        """Inverted index: term -> indices of documents containing it (built once)."""
+        if self._postings is None:
+            postings: Dict[str, Set[int]] = defaultdict(set)
+            for doc_index, term_freq in enumerate(self.term_frequencies):
+                for term in term_freq:
+                    postings[term].add(doc_index)
+            self._postings = dict(postings)
+        return self._postings
+
+    def match(self, must_have: List[str], must_not: List[str]) -> Set[int]:
+        """Indices of documents containing every must_have and no must_not term."""
+        postings = self.postings()
+        required = [postings.get(term, set()) for term in self._terms(must_have)]
+        if required:
+            # Intersect starting from the shortest posting list
+            required.sort(key=len)
+            matches = set(required[0])
+            for posting in required[1:]:
+                matches &= posting
+                if not matches:
+                    return matches
+        else:
+            matches = set(range(self.doc_count))
+
+        for term in self._terms(must_not):
+            matches -= postings.get(term, set())
+        return matches
+
+    def _terms(self, words: List[str]) -> List[str]:
+        """Tokenize operator words the way documents were tokenized."""
+        return sorted({term for word in words for term in self._tokenize(word)})
+
     def score(self, query: str, doc_index: int) -> float:
         """Calculate BM25 score for query against document."""
-        if doc_index >= len(self.term_frequencies):
+        if not 0 <= doc_index < len(self.term_frequencies):
             return 0.0
 
         query_terms = self._tokenize(query)
@@ -337,6 +622,201 @@ class BM25Scorer:
         return WORD_PATTERN.findall(text.lower())
 
 
+class QueryHighlighter:
+    """Single-pass multi-term highlighter for result snippets."""
+
+    def __init__(self, query: str, context_chars: int = DEFAULT_CONTEXT_CHARS) -> None:
+        self.context_chars = context_chars
+        # Longest terms first so the alternation prefers the most specific match
+        terms = sorted(set(WORD_PATTERN.findall(query.lower())), key=len, reverse=True)
+        self._pattern = (
+            re.compile(r"\b(?:" + "|".join(map(re.escape, terms)) + ")", re.IGNORECASE)
+            if terms
+            else None
+        )
+
+    def find_matches(self, text: str) -> List[Tuple[int, int]]:
+        """Return (start, end) offsets of every query term match in text."""
+        if self._pattern is None:
+            return []
+        return [match.span() for match in self._pattern.finditer(text)]
+
+    def highlight(self, text: str) -> str:
+        """Return the context window of text with the densest term matches."""
+        context_chars = self.context_chars
+        matches = self.find_matches(text)
+
+        if not matches:
+            # No direct match, return beginning
+            return text[:context_chars] + "..." if len(text) > context_chars else text
+
+        # Two-pointer sweep for the window holding the most matches
+        best_first, best_last, best_count = 0, 0, 0
+        last = 0
+        for first, (match_start, _) in enumerate(matches):
+            last = max(last, first)
+            while (
+                last + 1 < len(matches)
+                and matches[last + 1][1] - match_start <= context_chars
+            ):
+                last += 1
+            if last - first + 1 > best_count:
+                best_first, best_last, best_count = first, last, last - first + 1
+
+        # Center the context window on the matched span
+        span_start = matches[best_first][0]
+        span_end = matches[best_last][1]
+        padding = max(0, context_chars - (span_end - span_start)) // 2
+        start = max(0, span_start - padding)
+        end = min(len(text), span_end + padding)
+
+        # Extend to word boundaries
+        if start > 0:
+            start = max(0, text.rfind(" ", 0, start + 1))
+        if end < len(text):
+            end = text.find(" ", end)
+            if end == -1:
+                end = len(text)
+
+        excerpt = text[start:end].strip()
+        if start > 0:
+            excerpt = "..." + excerpt
+        if end < len(text):
+            excerpt = excerpt + "..."
+
+        return excerpt
+
+
+class BinaryIndex:
+    """Sign-binarized embeddings searched by Hamming distance.
+
+    One bit per dimension keeps the resident index 32x smaller than float32
+    vectors; it only shortlists candidates, which are then rescored from a
+    memory-mapped copy of the full-precision vectors. Both are written at
+    build time (see write()), so queries never page embeddings out of ChromaDB.
+    """
+
+    def __init__(self, codes: Any, ids: Any, vectors: Any = None) -> None:
+        self.codes = codes
+        self.ids = ids
+        self.vectors = vectors
+
+    @classmethod
+    def from_embeddings(cls, embeddings: Any, ids: List[str]) -> "BinaryIndex":
+        """Binarize embeddings (bit set = positive component)."""
+        import numpy as np
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        return cls(cls.encode(embeddings), list(ids), embeddings)
+
+    @staticmethod
+    def encode(embeddings: Any) -> Any:
+        """Pack the sign bits of each row into bytes."""
+        import numpy as np
+
+        return np.packbits(np.asarray(embeddings) > 0, axis=1)
+
+    def search(self, query_vector: Any, k: int) -> List[int]:
+        """Indices of the k codes nearest to a query, closest first."""
+        import numpy as np
+
+        query_code = self.encode(np.asarray(query_vector)[None, :])
+        distances = np.empty(len(self.ids), dtype=np.uint32)
+        for start in range(0, len(self.ids), BINARY_SCAN_BLOCK):
+            block = np.bitwise_xor(self.codes[start:start + BINARY_SCAN_BLOCK], query_code)
+            distances[start:start + len(block)] = _popcount(block).sum(axis=1)
+        k = min(k, len(self.ids))
+        if k <= 0:
+            return []
+        top = np.argpartition(distances, k - 1)[:k] if k < len(self.ids) else np.arange(len(self.ids))
+        return top[np.argsort(distances[top], kind="stable")].tolist()
+
+    @classmethod
+    def write(cls, path: Path, collection) -> int:
+        """Binarize a collection into ``path`` page by page; returns the chunk count.
+
+        Codes, ids and float32 vectors go to .npy files in a new directory,
+        and the ``current`` pointer is switched to it last, so readers never
+        map a half-written index.
+        """
+        import numpy as np
+
+        total = collection.count()
+        stamp = f"{time.time_ns()}-{os.getpid()}"
+        target = path / stamp
+        target.mkdir(parents=True)
+        ids: List[str] = []
+        codes = vectors = None
+        for offset in range(0, total, DEFAULT_ADD_BATCH_SIZE):
+            page = collection.get(limit=DEFAULT_ADD_BATCH_SIZE, offset=offset, include=["embeddings"])
+            embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+            if not len(embeddings):
+                break
+            if vectors is None:
+                # Streamed to disk so the vectors are never all resident
+                vectors = np.lib.format.open_memmap(
+                    target / "vectors.npy", mode="w+", dtype=np.float32, shape=(total, embeddings.shape[1])
+                )
+                codes = np.lib.format.open_memmap(
+                    target / "codes.npy", mode="w+", dtype=np.uint8, shape=(total, (embeddings.shape[1] + 7) // 8)
+                )
+            rows = slice(len(ids), len(ids) + len(embeddings))
+            vectors[rows] = embeddings
+            codes[rows] = cls.encode(embeddings)
+            ids.extend(page["ids"])
+        if vectors is None:
+            np.save(target / "vectors.npy", np.zeros((0, 0), dtype=np.float32))
+            np.save(target / "codes.npy", np.zeros((0, 0), dtype=np.uint8))
+        else:
+            vectors.flush()
+            codes.flush()
+            del vectors, codes
+        np.save(target / "ids.npy", np.array(ids, dtype=str))
+
+        pointer = path / "current"
+        tmp_pointer = path / f"current.{stamp}.tmp"
+        tmp_pointer.write_text(stamp)
+        os.replace(tmp_pointer, pointer)
+        for old in path.iterdir():
+            if old.is_dir() and old.name != stamp:
+                shutil.rmtree(old, ignore_errors=True)  # Open mappings stay valid on POSIX
+        return len(ids)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["BinaryIndex"]:
+        """Load the codes written by write() and map its ids and vectors, or None."""
+        import numpy as np
+
+        try:
+            target = path / (path / "current").read_text().strip()
+            ids = np.load(target / "ids.npy", mmap_mode="r")
+            count = len(ids)
+            if not count:
+                return None
+            return cls(
+                np.load(target / "codes.npy")[:count],
+                ids,
+                np.load(target / "vectors.npy", mmap_mode="r")[:count],
+            )
+        except (OSError, ValueError):
+            return None
+
+
+def _popcount(block: Any) -> Any:
+    """Per-byte set-bit counts of a uint8 array."""
+    import numpy as np
+
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(block)  # NumPy 2.0+
+    global _POPCOUNT_TABLE
+    if _POPCOUNT_TABLE is None:
+        _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    return _POPCOUNT_TABLE[block]
+
+
+_POPCOUNT_TABLE = None
+
+
 class QueryProcessor:
     """Enhanced query processing with expansion and operators."""
 
@@ -354,6 +834,18 @@ class QueryProcessor:
             # Can be extended via configuration file
         }
 
+        # Precompiled token matcher: term tokens -> alternative phrasings
+        self._expansion_index: Dict[Tuple[str, ...], List[str]] = {}
+        for term, expansions in self.expansions.items():
+            key = tuple(WORD_PATTERN.findall(term.lower()))
+            alternatives = [
+                expansion for expansion in expansions[1:]  # Skip the original term
+                if expansion.lower() != term.lower()
+            ]
+            if key and alternatives:
+                self._expansion_index[key] = alternatives
+        self._max_term_tokens = max(map(len, self._expansion_index), default=0)
+
     def process(self, query: str) -> Dict[str, Any]:
         """Process query and return enhanced version with metadata."""
         original = query.strip()
@@ -372,11 +864,10 @@ class QueryProcessor:
                 "terms": [phrase],
             }
 
-        # Expand terms
-        expanded = self._expand_query(original)
-
-        # Extract boolean operators
-        must_have, must_not = self._extract_operators(expanded)
+        # Extract boolean operators, then expand what remains
+        must_have, must_not, stripped = self.parse_boolean(original)
+        matches = self._match_expansions(stripped)
+        expanded = self._expand_query(stripped, matches)
 
         return {
             "processed": expanded,
@@ -386,6 +877,7 @@ class QueryProcessor:
             "must_have": must_have,
             "must_not": must_not,
             "terms": WORD_PATTERN.findall(expanded.lower()),
+            "variants": self._expansion_variants(stripped, matches),
         }
 
     def _detect_type(self, query: str) -> str:
@@ -404,16 +896,68 @@ class QueryProcessor:
         
         return "keyword"
 
-    def _expand_query(self, query: str) -> str:
-        """Expand query with synonyms"""
-        expanded = query.lower()
-        for term, expansions in self.expansions.items():
-            if term in expanded:
-                # Add expansions as OR terms
-                expansion_str = " OR ".join(expansions[1:])  # Skip the original term
-                if expansion_str:
-                    expanded = expanded.replace(term, f"({term} OR {expansion_str})")
-        return expanded
+    def _match_expansions(self, query: str) -> List[Tuple[int, int, List[str]]]:
+        """Find expandable terms in one pass over the query tokens.
+
+        Returns ``(start, end, alternatives)`` character spans. Whole tokens
+        only, so "ai" never matches inside "maintain"; the longest configured
+        term wins. Cost depends on the query, not the dictionary size.
+        """
+        tokens = [
+            (match.group().lower(), match.start(), match.end())
+            for match in WORD_PATTERN.finditer(query)
+        ]
+        matches = []
+        i = 0
+        while i < len(tokens):
+            for n in range(min(self._max_term_tokens, len(tokens) - i), 0, -1):
+                alternatives = self._expansion_index.get(
+                    tuple(token for token, _, _ in tokens[i:i + n])
+                )
+                if alternatives:
+                    matches.append((tokens[i][1], tokens[i + n - 1][2], alternatives))
+                    i += n
+                    break
+            else:
+                i += 1
+        return matches
+
+    def _expand_query(
+        self, query: str, matches: Optional[List[Tuple[int, int, List[str]]]] = None
+    ) -> str:
+        """Expand query with synonyms as ``(term OR synonym)`` groups."""
+        matches = self._match_expansions(query) if matches is None else matches
+        parts = []
+        last = 0
+        for start, end, alternatives in matches:
+            term = query[start:end]
+            parts.append(query[last:start])
+            parts.append(f"({term} OR {' OR '.join(alternatives)})")
+            last = end
+        parts.append(query[last:])
+        return "".join(parts).lower()
+
+    def _expansion_variants(
+        self, query: str, matches: List[Tuple[int, int, List[str]]]
+    ) -> List[str]:
+        """The query plus one rewrite per synonym, for multi-vector search."""
+        variants = [query]
+        for start, end, alternatives in matches:
+            for alternative in alternatives:
+                variant = query[:start] + alternative + query[end:]
+                if variant not in variants:
+                    variants.append(variant)
+        return variants[:MAX_QUERY_VARIANTS]
+
+    def parse_boolean(self, query: str) -> Tuple[List[str], List[str], str]:
+        """Split a query into must_have terms, must_not terms and the free text.
+
+        ``cats AND dogs -birds`` requires "cats" and "dogs", excludes "birds"
+        and leaves ``cats dogs`` for semantic and keyword scoring.
+        """
+        must_have, must_not = self._extract_operators(query)
+        stripped = AND_OPERATOR_PATTERN.sub(" ", NEGATIVE_TERM_PATTERN.sub(" ", query))
+        return must_have, must_not, " ".join(stripped.split())
 
     def _extract_operators(self, query: str) -> Tuple[List[str], List[str]]:
         """Extract boolean operators"""
@@ -425,9 +969,10 @@ class QueryProcessor:
         for term in negative_terms:
             must_not.append(term[1:])  # Remove the -
 
-        # Extract AND terms
-        and_terms = AND_TERM_PATTERN.findall(query)
-        must_have.extend(and_terms)
+        # Extract AND terms (uppercase AND only, so prose "and" stays free text)
+        for term in AND_TERM_PATTERN.findall(query):
+            if term not in must_have:
+                must_have.append(term)
 
         return must_have, must_not
 
@@ -455,6 +1000,497 @@ def normalize_hybrid_score(
     return weighted_semantic + weighted_keyword
 
 
+def get_quantization_config() -> str:
+    """Pick the dynamic int8 quantization target for this CPU."""
+    machine = platform.machine().lower()
+    if machine in ("arm64", "aarch64"):
+        return "arm64"
+    return "avx2"  # Broadly supported on x86-64; avx512_vnni can be set in config
+
+
+def load_embedding_model(
+    model_name: str,
+    backend: str = DEFAULT_EMBEDDING_BACKEND,
+    quantize: bool = True,
+    cache_dir: str = DEFAULT_MODEL_CACHE_DIR,
+    quantization_config: Optional[str] = None,
+    quiet: bool = False,
+    fallback: bool = True,
+) -> Any:
+    """Load a SentenceTransformer with the PyTorch or ONNX Runtime backend.
+
+    The ONNX model is exported (and optionally int8-quantized) on first use
+    and cached under ``cache_dir``; later loads read the cached export.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    if backend != "onnx":
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    try:
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        quantization_config = quantization_config or get_quantization_config()
+        variant = f"onnx-qint8-{quantization_config}" if quantize else "onnx"
+        export_dir = Path(cache_dir) / model_name.replace("/", "__") / variant
+        file_name = (
+            f"onnx/model_qint8_{quantization_config}.onnx" if quantize else "onnx/model.onnx"
+        )
+
+        if not (export_dir / file_name).exists():
+            if not quiet:
+                print(f"Exporting {model_name} to ONNX (first use, cached in {export_dir})...")
+            model = SentenceTransformer(model_name, backend="onnx")
+            model.save(str(export_dir))
+            if quantize:
+                export_dynamic_quantized_onnx_model(
+                    model, quantization_config, str(export_dir)
+                )
+
+        return SentenceTransformer(
+            str(export_dir), backend="onnx", model_kwargs={"file_name": file_name}
+        )
+    except Exception as e:
+        if not fallback:
+            raise
+        log_warning(
+            "ONNX backend unavailable (uv pip install \"sentence-transformers[onnx]\"), "
+            "using PyTorch",
+            e,
+            quiet=quiet,
+        )
+        return SentenceTransformer(model_name)
+
+
+def estimate_token_lengths(texts: List[str], max_seq_length: int = 512) -> List[int]:
+    """Estimate per-text token counts (plus special tokens), capped at the model limit."""
+    return [min(max_seq_length, len(text) // CHARS_PER_TOKEN + 2) for text in texts]
+
+
+def plan_length_buckets(
+    token_lengths: List[int], token_budget: int, max_batch_size: int
+) -> List[List[int]]:
+    """Group text indices into batches of similar length under a padded-token budget.
+
+    Indices are sorted longest first, so each batch is padded to its first
+    member and a batch closes once another item would exceed the budget.
+    """
+    order = sorted(range(len(token_lengths)), key=lambda i: token_lengths[i], reverse=True)
+    batches: List[List[int]] = []
+    current: List[int] = []
+    for index in order:
+        padded_length = token_lengths[current[0]] if current else token_lengths[index]
+        if current and (
+            len(current) >= max_batch_size
+            or (len(current) + 1) * padded_length > token_budget
+        ):
+            batches.append(current)
+            current = []
+        current.append(index)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def padded_tokens(token_lengths: List[int], batches: List[List[int]]) -> int:
+    """Total tokens processed when each batch is padded to its longest member."""
+    return sum(len(batch) * max(token_lengths[i] for i in batch) for batch in batches)
+
+
+def encode_bucketed(
+    model: Any,
+    texts: List[str],
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    max_batch_size: int = DEFAULT_ENCODE_BATCH_SIZE,
+    show_progress_bar: bool = False,
+) -> Tuple[Any, Dict[str, int]]:
+    """Encode texts in length-bucketed batches, returning embeddings in input order.
+
+    Also returns padding statistics against what ``model.encode`` would do
+    itself: sort by length, then cut fixed-size batches.
+    """
+    import numpy as np
+
+    token_lengths = estimate_token_lengths(
+        texts, getattr(model, "max_seq_length", None) or 512
+    )
+    batches = plan_length_buckets(token_lengths, token_budget, max_batch_size)
+
+    batch_iter: Any = batches
+    if show_progress_bar:
+        from tqdm import tqdm  # Installed with sentence-transformers
+
+        batch_iter = tqdm(batches, desc="Batches")
+
+    embeddings = None
+    for batch in batch_iter:
+        batch_embeddings = np.asarray(
+            model.encode([texts[i] for i in batch], batch_size=len(batch), show_progress_bar=False)
+        )
+        if embeddings is None:
+            embeddings = np.empty((len(texts), batch_embeddings.shape[1]), dtype=batch_embeddings.dtype)
+        embeddings[batch] = batch_embeddings
+
+    # SentenceTransformer.encode orders inputs longest first (by characters)
+    length_order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+    encode_batches = [
+        length_order[start:start + max_batch_size]
+        for start in range(0, len(texts), max_batch_size)
+    ]
+    stats = {
+        "tokens": sum(token_lengths),
+        "padded_tokens": padded_tokens(token_lengths, batches),
+        "baseline_padded_tokens": padded_tokens(token_lengths, encode_batches),
+        "batches": len(batches),
+    }
+    return embeddings, stats
+
+
+def encode_documents(
+    model: Any,
+    texts: List[str],
+    batch_size: int = DEFAULT_ENCODE_BATCH_SIZE,
+    workers: int = DEFAULT_ENCODE_WORKERS,
+    quiet: bool = False,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    pool: Optional[Any] = None,
+) -> Any:
+    """Encode texts, sharding across a pool of worker processes when asked.
+
+    Each worker holds its own model copy; results come back in input order.
+    A ``pool`` from start_encode_pool() is reused (and left running), so
+    callers encoding in several rounds pay the worker startup once.
+    In-process encoding uses length-bucketed batches when token_budget > 0.
+    """
+    workers = resolve_encode_workers(workers)
+    if pool is not None:
+        return model.encode_multi_process(texts, pool, batch_size=batch_size)
+
+    # Small jobs don't amortize the worker startup cost
+    if workers <= 1 or len(texts) < workers * batch_size:
+        if token_budget <= 0 or not texts:
+            return model.encode(texts, batch_size=batch_size, show_progress_bar=not quiet)
+
+        embeddings, stats = encode_bucketed(
+            model, texts, token_budget, batch_size, show_progress_bar=not quiet
+        )
+        if not quiet:
+            waste = stats["padded_tokens"] - stats["tokens"]
+            baseline_waste = stats["baseline_padded_tokens"] - stats["tokens"]
+            print(
+                f"Encoded {len(texts)} chunks in {stats['batches']} length-bucketed batches: "
+                f"{waste} padding tokens vs {baseline_waste} with fixed "
+                f"{batch_size}-chunk length-sorted batches"
+            )
+        return embeddings
+
+    pool = start_encode_pool(model, workers, quiet)
+    try:
+        return model.encode_multi_process(texts, pool, batch_size=batch_size)
+    finally:
+        model.stop_multi_process_pool(pool)
+
+
+def resolve_encode_workers(workers: int) -> int:
+    """Encode worker count with 0 meaning one per CPU core."""
+    return (os.cpu_count() or 1) if workers == 0 else workers
+
+
+def start_encode_pool(model: Any, workers: int, quiet: bool = False) -> Any:
+    """Start a CPU encode worker pool; stop it with model.stop_multi_process_pool().
+
+    Worker intra-op threads are capped so the pool doesn't oversubscribe cores.
+    """
+    workers = resolve_encode_workers(workers)
+    if not quiet:
+        print(f"Encoding with {workers} worker processes...")
+
+    threads_per_worker = str(max(1, (os.cpu_count() or 1) // workers))
+    saved_env = {name: os.environ.get(name) for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS")}
+    os.environ.update({name: threads_per_worker for name in saved_env})
+    try:
+        return model.start_multi_process_pool(target_devices=["cpu"] * workers)
+    finally:
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def parse_shard_spec(spec: str) -> Tuple[int, int]:
+    """Parse a 1-based ``i/N`` shard spec, e.g. ``2/8``."""
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard spec '{spec}' (expected i/N, e.g. 1/4)")
+    if not 1 <= index <= count:
+        raise ValueError(f"Invalid shard spec '{spec}' (need 1 <= i <= N)")
+    return index, count
+
+
+def select_shard(
+    files: List[Path], base_dir: Path, shard_index: int, shard_count: int
+) -> List[Path]:
+    """Pick the files belonging to a shard by hashing their relative paths.
+
+    The assignment depends only on the path, so every node computes the same
+    split regardless of discovery order or filesystem.
+    """
+    selected = []
+    for file_path in files:
+        relative = file_path.relative_to(base_dir).as_posix()
+        bucket = int(hashlib.sha1(relative.encode("utf-8")).hexdigest(), 16) % shard_count
+        if bucket == shard_index - 1:
+            selected.append(file_path)
+    return selected
+
+
+def parse_memory_size(spec: str) -> int:
+    """Parse a memory size such as ``2G``, ``1536M`` or ``1536`` (MB) into MB."""
+    units = {"K": 1 / 1024, "M": 1, "G": 1024, "T": 1024 * 1024}
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([KMGT]?)(?:I?B)?", str(spec).strip().upper())
+    if not match:
+        raise ValueError(f"Invalid memory size '{spec}' (expected e.g. 2G, 512M or MB)")
+    value = float(match.group(1)) * units.get(match.group(2), 1)
+    if value < 1:
+        raise ValueError(f"Invalid memory size '{spec}' (need at least 1 MB)")
+    return int(value)
+
+
+def current_rss() -> Optional[int]:
+    """Current resident set size of this process in bytes (None when it can't be read).
+
+    Peak-only sources such as ``resource.ru_maxrss`` are deliberately not
+    used: once crossed, a peak never drops back under a watermark.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return None
+
+
+class MemoryBudget:
+    """Keep a build's resident memory under a cap by resizing its batches.
+
+    A background thread samples RSS while documents are extracted, encoded
+    and written. After each commit every batch size is halved if the peak
+    since the previous commit passed the high watermark, and doubled (up to
+    its configured size) if it stayed below the low watermark. The RSS left
+    after a commit (the loaded model, retained heap) is the baseline: when
+    it alone is above the high watermark, smaller batches can't help and
+    the sizes are left alone. Encode worker processes are not counted; use
+    it with in-process encoding.
+    """
+
+    FLOORS = {
+        "commit_chunks": MIN_COMMIT_CHUNKS,
+        "batch_size": 1,
+        "token_budget": MIN_TOKEN_BUDGET,
+        "insert_batch_size": MIN_INSERT_BATCH_SIZE,
+    }
+
+    def __init__(self, limit_mb: int, sizes: Dict[str, int]) -> None:
+        self.limit = limit_mb * 1024 * 1024
+        self.configured = dict(sizes)
+        self.sizes = dict(sizes)
+        self.peak = 0
+        self.window_peak = 0
+        self.settled = 0  # RSS right after the last commit
+        self.baseline_over = False
+        self.shrinks = 0
+        self.grows = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sample(self) -> int:
+        """Record the current RSS and return it (0 when it can't be read)."""
+        rss = current_rss() or 0
+        self.peak = max(self.peak, rss)
+        self.window_peak = max(self.window_peak, rss)
+        return rss
+
+    def start(self) -> "MemoryBudget":
+        self.settled = self.sample()
+
+        def run() -> None:
+            while not self._stop.wait(MEMORY_SAMPLE_INTERVAL):
+                self.sample()
+
+        self._thread = threading.Thread(target=run, name="raggy-rss", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.sample()
+
+    def should_commit_early(self, pending_chunks: int) -> bool:
+        """True when pending chunks have pushed RSS from below the high watermark past it.
+
+        At least MIN_COMMIT_CHUNKS must be pending, which bounds how often
+        the build rewrites its checkpoint.
+        """
+        high = self.limit * MEMORY_HIGH_WATERMARK
+        return pending_chunks >= MIN_COMMIT_CHUNKS and self.settled < high < self.sample()
+
+    def adapt(self, committed_chunks: int) -> None:
+        """Resize the batches from the peak RSS seen since the last call."""
+        if self.settled > self.limit * MEMORY_HIGH_WATERMARK:
+            # The baseline alone is over the watermark; smaller batches can't fix that
+            self.baseline_over = True
+            resized = self.sizes
+        elif self.window_peak > self.limit * MEMORY_HIGH_WATERMARK:
+            if not self.sizes["commit_chunks"]:
+                # One-batch builds get a commit size once memory is tight
+                self.sizes["commit_chunks"] = max(committed_chunks, MIN_COMMIT_CHUNKS)
+            resized = {
+                key: max(self.FLOORS[key], value // 2) if value else value
+                for key, value in self.sizes.items()
+            }
+            self.shrinks += resized != self.sizes
+        elif self.window_peak < self.limit * MEMORY_LOW_WATERMARK:
+            resized = {
+                key: min(self.configured[key] or value * 2, value * 2)
+                for key, value in self.sizes.items()
+            }
+            self.grows += resized != self.sizes
+        else:
+            resized = self.sizes
+        self.sizes = resized
+        self.window_peak = 0
+        self.settled = self.sample()
+
+    def summary(self) -> str:
+        def megabytes(value: int) -> str:
+            return f"{value / (1024 * 1024):.0f} MB"
+
+        sizes = ", ".join(f"{key}={value}" for key, value in self.sizes.items())
+        return (
+            f"Peak RSS {megabytes(self.peak)} of {megabytes(self.limit)} cap "
+            f"({self.shrinks} shrinks, {self.grows} grows); final sizes: {sizes}"
+        )
+
+
+def write_shard_artifact(
+    path: Path,
+    documents: List[Dict[str, Any]],
+    embeddings: Any,
+    bm25_state: Dict[str, Any],
+    info: Dict[str, Any],
+) -> None:
+    """Write a self-contained shard: embeddings, chunks, metadata and BM25 stats."""
+    import numpy as np
+
+    payload = {
+        "format_version": SHARD_FORMAT_VERSION,
+        "info": info,
+        "documents": documents,
+        "bm25": bm25_state,
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(
+            f,
+            embeddings=np.asarray(embeddings, dtype=np.float32),
+            payload=np.frombuffer(json.dumps(payload).encode("utf-8"), dtype=np.uint8),
+        )
+    os.replace(tmp_path, path)
+
+
+def read_shard_artifact(path: Path) -> Dict[str, Any]:
+    """Read a shard written by write_shard_artifact."""
+    import numpy as np
+
+    with np.load(path) as data:
+        payload = json.loads(data["payload"].tobytes().decode("utf-8"))
+        payload["embeddings"] = data["embeddings"]
+    if payload.get("format_version") != SHARD_FORMAT_VERSION:
+        raise ValueError(f"Unsupported shard format in {path.name}")
+    return payload
+
+
+def fuse_query_results(
+    results: Dict[str, Any], n_results: int, k: int = RRF_K
+) -> Dict[str, Any]:
+    """Reciprocal-rank fuse a multi-query ChromaDB result into a single list.
+
+    Each chunk scores ``sum(1 / (k + rank))`` over the query lists it appears
+    in, keeps the columns from its best-ranked appearance and reports its
+    smallest distance.
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    best: Dict[str, Tuple[int, int]] = {}
+    distances = results.get("distances")
+    best_distance: Dict[str, float] = {}
+
+    for row, ids in enumerate(results["ids"]):
+        for rank, doc_id in enumerate(ids):
+            scores[doc_id] += 1.0 / (k + rank + 1)
+            if doc_id not in best or rank < best[doc_id][1]:
+                best[doc_id] = (row, rank)
+            if distances is not None:
+                distance = distances[row][rank]
+                best_distance[doc_id] = min(best_distance.get(doc_id, distance), distance)
+
+    fused = sorted(scores, key=lambda doc_id: (-scores[doc_id], doc_id))[:n_results]
+    output: Dict[str, Any] = {"ids": [fused]}
+    for key in ("documents", "metadatas", "embeddings"):
+        if results.get(key) is not None:
+            output[key] = [[results[key][best[doc_id][0]][best[doc_id][1]] for doc_id in fused]]
+    if distances is not None:
+        output["distances"] = [[best_distance[doc_id] for doc_id in fused]]
+    return output
+
+
+def build_where_filter(
+    sources: Optional[List[str]] = None,
+    file_types: Optional[List[str]] = None,
+    section_headers: Optional[List[str]] = None,
+) -> Optional[Dict[str, Any]]:
+    """Build a ChromaDB ``where`` clause from exact metadata values."""
+    conditions = []
+    for key, values in (
+        ("source", sources),
+        ("file_type", file_types),
+        ("section_header", section_headers),
+    ):
+        if values:
+            conditions.append(
+                {key: values[0]} if len(values) == 1 else {key: {"$in": list(values)}}
+            )
+
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def normalize_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """Normalize search filters to lists, e.g. ``{"file_type": "pdf"}``."""
+    normalized = {}
+    for key in ("source", "file_type", "section"):
+        value = (filters or {}).get(key)
+        if not value:
+            continue
+        values = [value] if isinstance(value, str) else list(value)
+        if key == "file_type":
+            values = [f".{v.lower().lstrip('.')}" for v in values]
+        normalized[key] = sorted(set(values))
+    return normalized
+
+
 def interpret_score(score: float) -> str:
     """Provide human-readable score interpretation."""
     if score >= 0.8:
@@ -467,6 +1503,48 @@ def interpret_score(score: float) -> str:
         return "Poor"
 
 
+def mmr_select(
+    relevance: Any,
+    embeddings: Any,
+    k: int,
+    lambda_mult: float = DEFAULT_MMR_LAMBDA,
+) -> List[int]:
+    """Select k candidate indices by maximal marginal relevance.
+
+    Each step picks the candidate maximizing
+    ``lambda * relevance - (1 - lambda) * max_sim(candidate, selected)``.
+    The running max-similarity vector is updated with one matrix-vector
+    product per pick, so the cost is O(k * n * dim) instead of O(n^2) pairs.
+    """
+    import numpy as np
+
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    n_candidates = len(vectors)
+    k = min(k, n_candidates)
+    if k <= 0:
+        return []
+
+    # Normalize rows so dot products are cosine similarities
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors = vectors / norms
+
+    relevance = np.asarray(relevance, dtype=np.float32)
+    max_similarity = np.zeros(n_candidates, dtype=np.float32)
+    available = np.ones(n_candidates, dtype=bool)
+    selected = []
+
+    for _ in range(k):
+        mmr_scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_similarity
+        mmr_scores[~available] = -np.inf
+        best = int(np.argmax(mmr_scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, vectors @ vectors[best], out=max_similarity)
+
+    return selected
+
+
 def load_config(config_path: Optional[str] = None) -> Dict[str, Any]:
     """Load optional configuration file."""
     default_config = {
@@ -475,6 +1553,12 @@ def load_config(config_path: Optional[str] = None) -> Dict[str, Any]:
             "chunk_size": DEFAULT_CHUNK_SIZE,
             "chunk_overlap": DEFAULT_CHUNK_OVERLAP,
             "rerank": True,
+            "rerank_strategy": DEFAULT_RERANK_STRATEGY,
+            "mmr_lambda": DEFAULT_MMR_LAMBDA,
+            "binary_prefilter": False,  # Hamming-search sign bits, then rescore in full precision
+            "binary_rescore_factor": BINARY_RESCORE_FACTOR,
+            "result_cache_size": MAX_CACHE_SIZE,
+            "result_cache_ttl": CACHE_TTL,
             "show_scores": True,
             "context_chars": DEFAULT_CONTEXT_CHARS,
             "max_results": DEFAULT_RESULTS,
@@ -498,6 +1582,30 @@ def load_config(config_path: Optional[str] = None) -> Dict[str, Any]:
             "preserve_headers": True,
             "min_chunk_size": 300,
             "max_chunk_size": 1500,
+            "stream_threshold_mb": STREAM_THRESHOLD_MB,  # Stream .md/.txt files larger than this
+            "pdf_workers": DEFAULT_PDF_WORKERS,  # Page-extraction processes for long PDFs (1 = in-process, 0 = per core)
+            "boundaries": "fixed",  # "fixed" offsets or "content"-defined (stable across edits)
+        },
+        "discovery": {
+            "include": DEFAULT_INCLUDE_PATTERNS,  # gitignore-style patterns of files to index
+            "exclude": DEFAULT_EXCLUDE_PATTERNS,  # gitignore-style patterns to skip
+            "gitignore": True,  # Honor .gitignore files inside the docs tree
+            "mtime_cache": True,  # Reuse listings of directories whose mtime is unchanged
+        },
+        "embedding": {
+            "backend": DEFAULT_EMBEDDING_BACKEND,  # "torch" or "onnx" (CPU, optional int8)
+            "quantize": True,
+            "quantization_config": None,  # None = auto (avx2 / arm64)
+            "cache_dir": DEFAULT_MODEL_CACHE_DIR,
+            "bench_tolerance": DEFAULT_BENCH_TOLERANCE,
+            "batch_size": DEFAULT_ENCODE_BATCH_SIZE,
+            "workers": DEFAULT_ENCODE_WORKERS,  # Build-time encode processes (0 = all cores)
+            "token_budget": DEFAULT_TOKEN_BUDGET,  # Padded tokens per batch (0 = fixed batches)
+            "warm_start": True,  # Load the model while documents are extracted
+            "commit_chunks": DEFAULT_COMMIT_CHUNKS,  # Chunks per checkpointed commit (0 = one batch)
+            "reduce_dim": None,  # Store embeddings with this many dimensions (None = full)
+            "reduce_method": "pca",  # "pca" or "truncate" (Matryoshka models)
+            "max_memory_mb": None,  # Shrink build batches to keep RSS under this (None = off)
         },
         "updates": {
             "check_enabled": True,  # Enable update checking by default
@@ -656,6 +1764,7 @@ dependencies = [
 [project.optional-dependencies]
 magic-win = ["python-magic-bin>=0.4.14"]
 magic-unix = ["python-magic"]
+onnx = ["sentence-transformers[onnx]>=3.2.0"]
 
 [build-system]
 requires = ["hatchling"]
@@ -857,6 +1966,12 @@ search:
   chunk_size: 1000
   chunk_overlap: 200
   rerank: true
+  rerank_strategy: mmr  # "mmr" (embedding diversity) or "source" (one hit per file first)
+  mmr_lambda: 0.7       # MMR trade-off: 1.0 = pure relevance, 0.0 = pure diversity
+  binary_prefilter: false  # Very large indexes: Hamming search over 1-bit codes, then exact rescoring (written by build)
+  binary_rescore_factor: 10  # Candidates rescored per requested result with binary_prefilter
+  result_cache_size: 1000  # Cached search results (0 disables the cache)
+  result_cache_ttl: 3600   # Seconds before a cached result expires
   show_scores: true
   context_chars: 200
   max_results: 5
@@ -891,11 +2006,34 @@ models:
   multilingual: "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"  # Multi-language
   accurate: "all-mpnet-base-v2"         # Best accuracy, slower
 
+embedding:
+  backend: torch        # "torch" or "onnx" (ONNX Runtime, faster on CPU-only hosts)
+  quantize: true        # Dynamic int8 quantization for the ONNX backend
+  cache_dir: .raggy_models  # Where exported ONNX models are cached
+  bench_tolerance: 0.99 # Minimum cosine similarity to PyTorch embeddings in `bench`
+  batch_size: 32        # Chunks per encode batch during build
+  workers: 1            # Encode worker processes during build (0 = one per CPU core)
+  token_budget: 8192    # Length-bucketed batches capped at this many padded tokens (0 = off)
+  warm_start: true      # Load the model in the background while documents are extracted
+  commit_chunks: 2000   # Commit and checkpoint every N chunks so 'build --resume' can continue
+  reduce_dim: null      # e.g. 256: smaller, faster index (check recall with 'bench')
+  reduce_method: pca    # pca (fit at build time) or truncate (Matryoshka-trained models)
+  max_memory_mb: null   # e.g. 2048: build adapts batch sizes to keep RSS under this cap
+
 chunking:
   smart: false          # Enable markdown-aware smart chunking (experimental)
   preserve_headers: true # Include section headers in chunks
   min_chunk_size: 300   # Minimum chunk size in characters
   max_chunk_size: 1500  # Maximum chunk size in characters
+  stream_threshold_mb: 8 # Chunk larger .md/.txt files while streaming them
+  pdf_workers: 1        # Processes extracting pages of long PDFs during builds (0 = one per CPU core)
+  boundaries: fixed     # "content": boundaries and ids follow the text, so small edits re-embed few chunks
+
+discovery:
+  include: ["*.md", "*.pdf", "*.docx", "*.txt"]  # gitignore-style patterns of files to index
+  exclude: [".git/", "node_modules/", "__pycache__/"]  # gitignore-style patterns to skip
+  gitignore: true       # Honor .gitignore files inside the docs tree
+  mtime_cache: true     # Skip re-listing directories whose mtime is unchanged
 
 # Usage:
 # 1. Copy this file to raggy_config.yaml  
@@ -1063,6 +2201,468 @@ def setup_dependencies(skip_cache: bool = False, quiet: bool = False):
             )
 
 
+def find_chunk_end(text: str, start: int, size: int, paragraphs: bool = False) -> int:
+    """Pick where a chunk starting at ``start`` should end.
+
+    Prefers a paragraph break (when ``paragraphs``) within 300 characters of
+    the target size, then a sentence end within 200. Expects
+    ``start + size < len(text)``.
+    """
+    end = start + size
+    if paragraphs:
+        for i in range(end, max(end - 300, start), -1):
+            if i > start and text[i - 2 : i] == "\n\n":
+                return i
+    for i in range(end, max(end - 200, start), -1):
+        if text[i] in ".!?\n":
+            return i + 1
+    return end
+
+
+class StreamingChunker:
+    """Cut overlapping chunks from text that arrives in pieces.
+
+    Chunk boundaries only depend on the text around them, so feeding a file
+    window by window yields the same chunks as chunking it in one go, while
+    only the unconsumed tail (under one chunk) plus the latest piece is held.
+    """
+
+    def __init__(self, chunk_size: int, overlap: int, paragraphs: bool = False) -> None:
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.paragraphs = paragraphs
+        self._buffer = ""
+
+    def feed(self, piece: str) -> List[str]:
+        """Add text, returning the chunks it completes."""
+        buffer = self._buffer + piece
+        chunks = []
+        start = 0
+        # Cut only once the boundary search window lies inside the buffer
+        while len(buffer) - start > self.chunk_size:
+            end = find_chunk_end(buffer, start, self.chunk_size, self.paragraphs)
+            chunk = buffer[start:end].strip()
+            if chunk:
+                chunks.append(chunk)
+            start = max(end - self.overlap, start + 1)
+        self._buffer = buffer[start:]
+        return chunks
+
+    def finish(self) -> List[str]:
+        """Return the final partial chunk, if any."""
+        chunk, self._buffer = self._buffer.strip(), ""
+        return [chunk] if chunk else []
+
+
+class ContentDefinedChunker:
+    """Cut chunks at content-anchored landmarks, with the StreamingChunker interface.
+
+    Candidate cut points are sentence ends and line breaks. Once a chunk has
+    reached half of ``chunk_size``, a candidate ends it when the hash of
+    the CONTENT_HASH_WINDOW characters before it falls in a 1-in-
+    CONTENT_CUT_DIVISOR bucket (or, with ``paragraphs``, at any paragraph
+    break). Whether a position cuts therefore depends only on nearby text,
+    so after an edit the boundaries resynchronize within a chunk or two and
+    later chunks come out byte-identical. Chunks that reach ``chunk_size``
+    are cut at their last candidate instead. Each chunk is prefixed with up
+    to ``overlap`` characters from the end of the previous one.
+    """
+
+    def __init__(self, chunk_size: int, overlap: int, paragraphs: bool = False) -> None:
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.paragraphs = paragraphs
+        self.min_size = max(1, chunk_size // 2)
+        self._buffer = ""
+        self._start = 0  # Start of the open chunk in the buffer
+        self._scan = 0  # Where the landmark scan resumes
+        self._last_landmark: Optional[int] = None
+        self._previous = ""  # Last chunk body, for the overlap prefix
+
+    def _is_anchor(self, buffer: str, position: int) -> bool:
+        if self.paragraphs and buffer[position - 2:position] == "\n\n":
+            return True
+        window = buffer[max(0, position - CONTENT_HASH_WINDOW):position]
+        return zlib.crc32(window.encode("utf-8")) % CONTENT_CUT_DIVISOR == 0
+
+    def _cut(self, buffer: str, end: int, chunks: List[str]) -> None:
+        body = buffer[self._start:end]
+        prefix = ""
+        if self.overlap and self._previous:
+            prefix_start = max(0, len(self._previous) - self.overlap)
+            if prefix_start and not self._previous[prefix_start - 1].isspace():
+                # Whole words only
+                space = self._previous.find(" ", prefix_start)
+                prefix_start = len(self._previous) if space < 0 else space
+            prefix = self._previous[prefix_start:]
+        chunk = (prefix + body).strip()
+        if body.strip() and chunk:
+            chunks.append(chunk)
+            self._previous = body
+        self._start = end
+        self._last_landmark = None
+
+    def _cut_oversized(self, buffer: str, limit: int, chunks: List[str]) -> None:
+        # Force cuts while the open chunk would run past chunk_size before limit
+        while limit - self._start > self.chunk_size:
+            if self._last_landmark is not None and self._last_landmark - self._start >= self.min_size:
+                end = self._last_landmark
+            else:
+                end = self._start + self.chunk_size
+            self._cut(buffer, end, chunks)
+
+    def feed(self, piece: str) -> List[str]:
+        """Add text, returning the chunks it completes."""
+        buffer = self._buffer + piece
+        chunks: List[str] = []
+        for match in LANDMARK_PATTERN.finditer(buffer, self._scan):
+            position = match.end()
+            self._cut_oversized(buffer, position, chunks)
+            if position - self._start >= self.min_size and self._is_anchor(buffer, position):
+                self._cut(buffer, position, chunks)
+            elif position > self._start:
+                self._last_landmark = position
+            self._scan = position
+        # A final "." may still become a landmark once the next piece arrives
+        self._scan = max(self._scan, len(buffer) - 1, self._start)
+        self._cut_oversized(buffer, len(buffer), chunks)
+
+        # Keep the open chunk plus the hash window before it
+        drop = max(0, self._start - CONTENT_HASH_WINDOW)
+        self._buffer = buffer[drop:]
+        self._start -= drop
+        self._scan -= drop
+        if self._last_landmark is not None:
+            self._last_landmark -= drop
+        return chunks
+
+    def finish(self) -> List[str]:
+        """Return the final partial chunk, if any."""
+        chunks: List[str] = []
+        self._cut(self._buffer, len(self._buffer), chunks)
+        self._buffer, self._start, self._scan, self._previous = "", 0, 0, ""
+        return chunks
+
+
+def iter_text_windows(
+    file_path: Path, encoding: str = "utf-8", window_chars: int = STREAM_WINDOW_CHARS
+) -> Iterator[str]:
+    """Yield a text file in fixed-size decoded windows."""
+    with open(file_path, "r", encoding=encoding) as file:
+        for window in iter(lambda: file.read(window_chars), ""):
+            yield window
+
+
+def iter_text_lines(windows: Iterable[str], max_line_chars: int = STREAM_WINDOW_CHARS) -> Iterator[Tuple[str, bool]]:
+    """Split windows into lines, yielding ``(line, complete)`` pairs.
+
+    Lines longer than ``max_line_chars`` are yielded in pieces with
+    ``complete=False`` so a file without newlines stays bounded too.
+    """
+    carry = ""
+    for window in windows:
+        lines = (carry + window).split("\n")
+        carry = lines.pop()
+        for line in lines:
+            yield line + "\n", True
+        if len(carry) > max_line_chars:
+            yield carry, False
+            carry = ""
+    if carry:
+        yield carry, True
+
+
+def _docx_paragraph_text(paragraph: ElementTree.Element) -> str:
+    """Text of a ``w:p`` element, mirroring python-docx ``Paragraph.text``.
+
+    Only runs that are direct children of the paragraph or of its
+    hyperlinks count; tabs and line breaks map to ``\t`` and ``\n``.
+    """
+    w = DOCX_NAMESPACE
+    parts = []
+    for child in paragraph:
+        if child.tag == w + "r":
+            runs = [child]
+        elif child.tag == w + "hyperlink":
+            runs = child.findall(w + "r")
+        else:
+            continue
+        for run in runs:
+            for item in run:
+                if item.tag == w + "t":
+                    parts.append(item.text or "")
+                elif item.tag in (w + "tab", w + "ptab"):
+                    parts.append("\t")
+                elif item.tag == w + "br":
+                    if item.get(w + "type", "textWrapping") == "textWrapping":
+                        parts.append("\n")
+                elif item.tag == w + "cr":
+                    parts.append("\n")
+                elif item.tag == w + "noBreakHyphen":
+                    parts.append("-")
+    return "".join(parts)
+
+
+def _docx_table_rows(table: ElementTree.Element) -> List[str]:
+    """Row texts of a ``w:tbl`` element, mirroring python-docx ``row.cells``.
+
+    A cell spanning several grid columns repeats once per column and a
+    vertically merged continuation repeats the cell above it. Raises
+    ValueError when a continuation has no cell above to resolve to.
+    """
+    w = DOCX_NAMESPACE
+    rows = []
+    above: Dict[int, Tuple[str, int]] = {}  # Grid offset -> (text, span) in the prior row
+    for row in table.findall(w + "tr"):
+        current: Dict[int, Tuple[str, int]] = {}
+        grid_before = row.find(f"{w}trPr/{w}gridBefore")
+        offset = int(grid_before.get(w + "val", 0)) if grid_before is not None else 0
+        cells = []
+        for cell in row.findall(w + "tc"):
+            span_element = cell.find(f"{w}tcPr/{w}gridSpan")
+            span = int(span_element.get(w + "val", 1)) if span_element is not None else 1
+            merge = cell.find(f"{w}tcPr/{w}vMerge")
+            if merge is not None and merge.get(w + "val", "continue") == "continue":
+                if offset not in above:
+                    raise ValueError("vertically merged cell has no cell above it")
+                text, root_span = above[offset]
+            else:
+                text = "\n".join(_docx_paragraph_text(p) for p in cell.findall(w + "p"))
+                root_span = span
+            current[offset] = (text, root_span)
+            cells.extend([text.strip()] * root_span)
+            offset += span
+        row_text = [text for text in cells if text]
+        if row_text:
+            rows.append(" | ".join(row_text))
+        above = current
+    return rows
+
+
+def extract_docx_text(file_path: Path) -> str:
+    """Stream paragraph and table text straight from a .docx package.
+
+    Parses ``word/document.xml`` incrementally, handling and discarding each
+    top-level paragraph or table as soon as it is complete, instead of
+    building python-docx's object model. Output matches the python-docx
+    extractor: body paragraphs first, then one `` | ``-joined line per
+    table row. Raises KeyError, ValueError or ElementTree.ParseError for
+    packages it can't read, so callers can fall back to python-docx.
+    """
+    w = DOCX_NAMESPACE
+    paragraphs: List[str] = []
+    table_rows: List[str] = []
+    depth = 0
+    body = None
+    with zipfile.ZipFile(file_path) as package:
+        with package.open(DOCX_DOCUMENT_PART) as document:
+            for event, element in ElementTree.iterparse(document, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if depth == 2 and element.tag == w + "body":
+                        body = element
+                    continue
+                depth -= 1
+                if depth != 2 or body is None:
+                    continue
+                # A top-level block is complete: extract it, then free it
+                if element.tag == w + "p":
+                    text = _docx_paragraph_text(element).strip()
+                    if text:
+                        paragraphs.append(text)
+                elif element.tag == w + "tbl":
+                    table_rows.extend(_docx_table_rows(element))
+                body.remove(element)
+    if body is None:
+        raise ValueError("no WordprocessingML body found")
+    return "\n\n".join(paragraphs + table_rows)
+
+
+def compile_ignore_pattern(pattern: str) -> Optional[Tuple[Pattern, bool, bool]]:
+    """Compile one gitignore-style line into ``(regex, negated, directory_only)``.
+
+    Returns None for blank lines and comments. Patterns without an inner
+    slash match a name at any depth; ``**`` spans directories.
+    """
+    pattern = pattern.rstrip()
+    if not pattern or pattern.startswith("#"):
+        return None
+    negated = pattern.startswith("!")
+    if negated:
+        pattern = pattern[1:]
+    pattern = pattern.lstrip("\\")  # "\#" and "\!" escape a literal first character
+    directory_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    if not pattern:
+        return None
+    if "/" not in pattern:
+        pattern = "**/" + pattern
+    pattern = pattern.lstrip("/")
+
+    regex = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            regex.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            regex.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            regex.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 2:]:
+            end = pattern.index("]", i + 2)
+            body = pattern[i + 1:end]
+            regex.append("[" + ("^" + body[1:] if body.startswith("!") else body) + "]")
+            i = end + 1
+        else:
+            regex.append(re.escape(pattern[i]))
+            i += 1
+    return re.compile("".join(regex) + r"\Z"), negated, directory_only
+
+
+class IgnoreRules:
+    """Ordered gitignore-style rules; the last matching pattern wins.
+
+    All rules are also folded into one alternation per entry kind, so the
+    common case of a path no rule touches costs a single regex match.
+    """
+
+    def __init__(self, rules: Optional[List[Tuple[Pattern, bool, bool]]] = None) -> None:
+        self.rules = rules or []
+        self._negations = any(negated for _, negated, _ in self.rules)
+        self._any_file = self._combine([regex for regex, _, directory_only in self.rules if not directory_only])
+        self._any_dir = self._combine([regex for regex, _, _ in self.rules])
+
+    @staticmethod
+    def _combine(regexes: List[Pattern]) -> Optional[Pattern]:
+        if not regexes:
+            return None
+        return re.compile("|".join(f"(?:{regex.pattern})" for regex in regexes))
+
+    @classmethod
+    def from_patterns(cls, patterns: Iterable[str], base: str = "") -> "IgnoreRules":
+        return cls().extend(patterns, base)
+
+    def extend(self, patterns: Iterable[str], base: str = "") -> "IgnoreRules":
+        """Rules plus ``patterns`` scoped to the directory ``base`` (a new object)."""
+        prefix = re.escape(base + "/") if base else ""
+        rules = list(self.rules)
+        for pattern in patterns:
+            rule = compile_ignore_pattern(pattern)
+            if rule is not None:
+                regex, negated, directory_only = rule
+                rules.append((re.compile(prefix + regex.pattern), negated, directory_only))
+        return IgnoreRules(rules)
+
+    def match(self, relative: str, is_dir: bool = False) -> Optional[bool]:
+        """True if matched, False if re-included by a "!" rule, None if untouched."""
+        combined = self._any_dir if is_dir else self._any_file
+        if combined is None or not combined.match(relative):
+            return None
+        if not self._negations:
+            return True
+        result = None
+        for regex, negated, directory_only in self.rules:
+            if (is_dir or not directory_only) and regex.match(relative):
+                result = not negated
+        return result
+
+
+def _extract_pdf_page_range(path: str, start: int, stop: int) -> List[str]:
+    """Extract the text of pages ``start``..``stop - 1`` (runs in worker processes)."""
+    import PyPDF2
+
+    with open(path, "rb") as file:
+        reader = PyPDF2.PdfReader(file)
+        return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def resolve_pdf_workers(workers: int) -> int:
+    """PDF page-extraction process count with 0 meaning one per CPU core."""
+    return (os.cpu_count() or 1) if workers == 0 else workers
+
+
+def start_pdf_pool(workers: int) -> Optional[ProcessPoolExecutor]:
+    """Start a page-extraction pool for extract_pdf_pages (None when in-process).
+
+    Workers are spawned rather than forked: a build may be loading the
+    embedding model in another thread, and forking while it holds locks can
+    deadlock the child. The calling process extracts one share itself, so
+    the pool has one process fewer than ``workers``.
+    """
+    if workers <= 1:
+        return None
+    return ProcessPoolExecutor(
+        max_workers=workers - 1, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def extract_pdf_pages(
+    file_path: Path, pool: Optional[ProcessPoolExecutor] = None, workers: int = 1
+) -> List[str]:
+    """Extract a PDF's text page by page, sharing long files with a worker pool.
+
+    The file is parsed once here; with a ``pool`` from start_pdf_pool(workers)
+    and at least PDF_PARALLEL_MIN_PAGES pages, the pool's workers each take a
+    contiguous page range while this process extracts the first one. Pages
+    come back in order.
+    """
+    import PyPDF2
+
+    with open(file_path, "rb") as file:
+        reader = PyPDF2.PdfReader(file)
+        page_count = len(reader.pages)
+        if pool is None or workers <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+            return [reader.pages[i].extract_text() or "" for i in range(page_count)]
+
+        step = math.ceil(page_count / workers)
+        futures = [
+            pool.submit(_extract_pdf_page_range, str(file_path), start, min(start + step, page_count))
+            for start in range(step, page_count, step)
+        ]
+        pages = [reader.pages[i].extract_text() or "" for i in range(min(step, page_count))]
+    for future in futures:
+        pages.extend(future.result())
+    return pages
+
+
+class _SectionStream:
+    """Chunk state for one markdown section being chunked incrementally."""
+
+    def __init__(self, header: Optional[str], chunker: StreamingChunker) -> None:
+        self.header = header
+        self.chunker = chunker
+        self.chunk_index = 0
+
+    def _wrap(self, chunk_texts: List[str]) -> List[Dict[str, Any]]:
+        chunks = []
+        for chunk_text in chunk_texts:
+            chunks.append(
+                {
+                    "text": chunk_text,
+                    "metadata": {
+                        "chunk_type": "smart",
+                        "section_header": self.header,
+                        "header_depth": len(re.findall(r"^#", self.header or "")),
+                        "section_chunk_index": self.chunk_index,
+                    },
+                }
+            )
+            self.chunk_index += 1
+        return chunks
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        return self._wrap(self.chunker.feed(text))
+
+    def finish(self) -> List[Dict[str, Any]]:
+        return self._wrap(self.chunker.finish())
+
+
 class DocumentProcessor:
     """Handles file discovery, text extraction, and chunking operations."""
     
@@ -1070,11 +2670,15 @@ class DocumentProcessor:
         self, 
         docs_dir: Path, 
         config: Dict[str, Any],
-        quiet: bool = False
+        quiet: bool = False,
+        cache_dir: Optional[Path] = None,
     ) -> None:
         self.docs_dir = docs_dir
         self.config = config
         self.quiet = quiet
+        self.cache_dir = cache_dir  # Build caches: PDF page texts, discovery listings (None = off)
+        self._pdf_pool: Optional[ProcessPoolExecutor] = None
+        self._pdf_workers = 1
         
         # File type handlers (Strategy pattern)
         self._file_handlers = {
@@ -1084,6 +2688,25 @@ class DocumentProcessor:
             ".txt": self._extract_text_from_txt,
         }
     
+    @contextmanager
+    def pdf_pool(self) -> Iterator[None]:
+        """Share one page-extraction process pool across a build's long PDFs.
+
+        With ``chunking.pdf_workers`` of 1 (the default) pages are extracted
+        in-process; outside this context they always are.
+        """
+        workers = resolve_pdf_workers(self.config["chunking"].get("pdf_workers", DEFAULT_PDF_WORKERS))
+        pool = start_pdf_pool(workers)
+        if pool is None:
+            yield
+            return
+        self._pdf_pool, self._pdf_workers = pool, workers
+        try:
+            yield
+        finally:
+            self._pdf_pool, self._pdf_workers = None, 1
+            pool.shutdown()
+
     def find_documents(self) -> List[Path]:
         """Find all supported documents in docs directory."""
         if not self.docs_dir.exists():
@@ -1094,25 +2717,130 @@ class DocumentProcessor:
                 print(f"Please add your documentation files to {self.docs_dir}")
             return []
 
-        files = []
-        for pattern in GLOB_PATTERNS:
-            files.extend(self.docs_dir.glob(pattern))
-        
-        return sorted(files)
-    
-    def process_document(self, file_path: Path) -> List[Dict[str, Any]]:
-        """Process a single document into chunks."""
-        if not self.quiet:
-            print(f"Processing: {file_path.relative_to(self.docs_dir)}")
-
-        # Validate file path for security
-        if not validate_path(file_path, self.docs_dir):
-            log_warning(f"Skipping file outside docs directory: {file_path.name}", quiet=self.quiet)
-            return []
+        discovery = self.config.get("discovery", {})
+        include = IgnoreRules.from_patterns(discovery.get("include", DEFAULT_INCLUDE_PATTERNS))
+        exclude = IgnoreRules.from_patterns(discovery.get("exclude", DEFAULT_EXCLUDE_PATTERNS))
+        use_gitignore = discovery.get("gitignore", True)
+        cache_path = (
+            self.cache_dir / DISCOVERY_CACHE_FILE
+            if self.cache_dir is not None and discovery.get("mtime_cache", True)
+            else None
+        )
+        listings = self._load_discovery_cache(cache_path)
+        fresh_listings: Dict[str, Dict[str, Any]] = {}
+        racy_before = (time.time() - DISCOVERY_RACY_SECONDS) * 1e9
 
-        # Check file size limits
-        try:
-            file_size = file_path.stat().st_size
+        # One scandir per directory; excluded directories are never entered
+        files = []
+        pending = [("", exclude)]
+        while pending:
+            relative_dir, rules = pending.pop()
+            directory = self.docs_dir / relative_dir
+            try:
+                mtime_ns = directory.stat().st_mtime_ns
+            except OSError:
+                continue  # Vanished or unreadable directory
+            ignore_mtime_ns = None
+            if use_gitignore:
+                try:
+                    ignore_mtime_ns = (directory / IGNORE_FILE).stat().st_mtime_ns
+                except OSError:
+                    pass  # No ignore file here
+
+            listing = listings.get(relative_dir)
+            if (
+                listing is None
+                or listing["mtime_ns"] != mtime_ns
+                or listing["ignore_mtime_ns"] != ignore_mtime_ns
+            ):
+                listing = self._list_directory(directory, mtime_ns, ignore_mtime_ns)
+                if listing is None:
+                    continue
+            if mtime_ns < racy_before and (ignore_mtime_ns or 0) < racy_before:
+                fresh_listings[relative_dir] = listing
+
+            if listing["ignore"]:
+                rules = rules.extend(listing["ignore"], relative_dir)
+            prefix = relative_dir + "/" if relative_dir else ""
+            for name in listing["files"]:
+                relative = prefix + name
+                if not rules.match(relative) and include.match(relative):
+                    files.append(relative)
+            for name in listing["dirs"]:
+                if not rules.match(prefix + name, is_dir=True):
+                    pending.append((prefix + name, rules))
+
+        if cache_path is not None and fresh_listings != listings:
+            self._save_discovery_cache(cache_path, fresh_listings)
+        files.sort(key=lambda relative: relative.split("/"))  # Path order
+        return [self.docs_dir / relative for relative in files]
+
+    def _list_directory(
+        self, directory: Path, mtime_ns: int, ignore_mtime_ns: Optional[int]
+    ) -> Optional[Dict[str, Any]]:
+        """Scan one directory: file names, subdirectory names and its ignore rules."""
+        files, dirs = [], []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            dirs.append(entry.name)
+                        elif entry.is_file():
+                            files.append(entry.name)
+                    except OSError:
+                        continue  # Vanished or unreadable entry
+        except OSError:
+            return None
+        ignore: List[str] = []
+        if ignore_mtime_ns is not None:
+            try:
+                ignore = (directory / IGNORE_FILE).read_text(encoding="utf-8", errors="replace").splitlines()
+            except OSError:
+                pass  # Unreadable ignore file
+        return {
+            "mtime_ns": mtime_ns,
+            "ignore_mtime_ns": ignore_mtime_ns,
+            "files": files,
+            "dirs": dirs,
+            "ignore": ignore,
+        }
+
+    def _load_discovery_cache(self, cache_path: Optional[Path]) -> Dict[str, Dict[str, Any]]:
+        """Directory listings from the last discovery, keyed by relative path."""
+        if cache_path is None:
+            return {}
+        try:
+            cached = json.loads(cache_path.read_text())
+        except (OSError, ValueError):
+            return {}
+        if cached.get("docs_dir") != str(self.docs_dir.resolve()):
+            return {}
+        return cached.get("listings", {})
+
+    def _save_discovery_cache(self, cache_path: Path, listings: Dict[str, Dict[str, Any]]) -> None:
+        """Atomically persist directory listings (best effort)."""
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+            tmp_path.write_text(json.dumps({"docs_dir": str(self.docs_dir.resolve()), "listings": listings}))
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass  # Discovery still works without the cache
+    
+    def process_document(self, file_path: Path) -> List[Dict[str, Any]]:
+        """Process a single document into chunks."""
+        if not self.quiet:
+            print(f"Processing: {file_path.relative_to(self.docs_dir)}")
+
+        # Validate file path for security
+        if not validate_path(file_path, self.docs_dir):
+            log_warning(f"Skipping file outside docs directory: {file_path.name}", quiet=self.quiet)
+            return []
+
+        # Check file size limits
+        try:
+            file_size = file_path.stat().st_size
             if file_size > MAX_FILE_SIZE_MB * 1024 * 1024:
                 log_warning(f"Skipping large file (>{MAX_FILE_SIZE_MB}MB): {file_path.name}", quiet=self.quiet)
                 return []
@@ -1132,25 +2860,55 @@ class DocumentProcessor:
                     print(f"Supported types: {supported_types}")
                 return []
             
-            text = handler(file_path)
+            file_hash = self._get_file_hash(file_path)
+            stream_threshold = self.config["chunking"].get("stream_threshold_mb", STREAM_THRESHOLD_MB)
+            if file_extension in STREAMING_EXTENSIONS and file_size > stream_threshold * 1024 * 1024:
+                # Large text: chunk while reading instead of loading it whole
+                chunk_data = self._chunk_file_streaming(file_path)
+                if not chunk_data:
+                    log_warning(f"No text extracted from {file_path.name}", quiet=self.quiet)
+                    return []
+            elif file_extension == ".pdf":
+                # Chunk page by page so unchanged pages keep their chunk ids
+                chunk_data = self._chunk_pdf_pages(file_path, file_hash)
+                if not chunk_data:
+                    log_warning(f"No text extracted from {file_path.name}", quiet=self.quiet)
+                    return []
+            else:
+                text = handler(file_path)
 
-            if not text.strip():
-                log_warning(f"No text extracted from {file_path.name}", quiet=self.quiet)
-                return []
+                if not text.strip():
+                    log_warning(f"No text extracted from {file_path.name}", quiet=self.quiet)
+                    return []
 
-            # Generate chunks
-            chunk_data = self._chunk_text(text)
+                # Generate chunks
+                chunk_data = self._chunk_text(text)
 
             # Create document entries
             documents = []
-            file_hash = self._get_file_hash(file_path)
+            source = str(file_path.relative_to(self.docs_dir))
+            content_ids = self.config["chunking"].get("boundaries", "fixed") == "content"
+            seen: Counter = Counter()
 
             for i, chunk_info in enumerate(chunk_data):
-                doc_id = f"{file_path.stem}_{file_hash[:8]}_{i}"
+                page_key = chunk_info.get("page_key")
+                if content_ids:
+                    # Named after the chunk's own text, so unchanged chunks keep their ids
+                    content_key = hashlib.sha256(
+                        f"{source}\0{chunk_info['text']}".encode("utf-8")
+                    ).hexdigest()[:16]
+                    occurrence = seen[content_key]
+                    seen[content_key] += 1
+                    doc_id = f"{file_path.stem}_{content_key}" + (f"_{occurrence}" if occurrence else "")
+                elif page_key:
+                    # Page chunks are named after their source and page text, not the file hash
+                    doc_id = f"{file_path.stem}_p{page_key}_{chunk_info['metadata']['page_chunk_index']}"
+                else:
+                    doc_id = f"{file_path.stem}_{file_hash[:8]}_{i}"
 
                 # Merge chunk metadata with file metadata
                 metadata = {
-                    "source": str(file_path.relative_to(self.docs_dir)),
+                    "source": source,
                     "chunk_index": i,
                     "total_chunks": len(chunk_data),
                     "file_hash": file_hash,
@@ -1168,6 +2926,90 @@ class DocumentProcessor:
             handle_file_error(file_path, "process", e, quiet=self.quiet)
             return []
     
+    def _chunk_pdf_pages(self, file_path: Path, file_hash: str) -> List[Dict[str, Any]]:
+        """Chunk a PDF one page at a time, tagging chunks with their page.
+
+        Each chunk carries a ``page_key`` derived from its source path and
+        page text (plus an occurrence number for repeated pages), so an edit
+        to one page leaves every other page's chunk ids unchanged, and equal
+        pages of same-named files in different folders never share an id.
+        """
+        chunks = []
+        seen: Counter = Counter()
+        source = str(file_path.relative_to(self.docs_dir))
+        for page_number, page_text in enumerate(self._extract_pdf_pages(file_path, file_hash), 1):
+            if not page_text.strip():
+                continue
+            page_hash = hashlib.sha256(page_text.encode("utf-8")).hexdigest()
+            occurrence = seen[page_hash]
+            seen[page_hash] += 1
+            source_page_hash = hashlib.sha256(f"{source}\0{page_text}".encode("utf-8")).hexdigest()
+            page_key = source_page_hash[:12] + (f"-{occurrence}" if occurrence else "")
+            for page_chunk_index, chunk_info in enumerate(self._chunk_text(page_text)):
+                chunk_info["metadata"].update(
+                    page=page_number,
+                    page_hash=page_hash,
+                    page_chunk_index=page_chunk_index,
+                )
+                chunk_info["page_key"] = page_key
+                chunks.append(chunk_info)
+        return chunks
+
+    def _extract_pdf_pages(self, file_path: Path, file_hash: Optional[str] = None) -> List[str]:
+        """Page texts of a PDF, reused from the page cache while the file is unchanged."""
+        file_hash = file_hash or self._get_file_hash(file_path)
+        cache_path = self.page_cache_path(file_path)
+        if cache_path is not None:
+            try:
+                with gzip.open(cache_path, "rt", encoding="utf-8") as f:
+                    cached = json.load(f)
+                if cached.get("file_hash") == file_hash:
+                    return [page["text"] for page in cached["pages"]]
+            except (OSError, ValueError, KeyError):
+                pass  # No usable cache
+
+        pages = extract_pdf_pages(file_path, self._pdf_pool, self._pdf_workers)
+        if cache_path is not None:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "source": file_path.relative_to(self.docs_dir).as_posix(),
+                        "file_hash": file_hash,
+                        "pages": [
+                            {"hash": hashlib.sha256(text.encode("utf-8")).hexdigest(), "text": text}
+                            for text in pages
+                        ],
+                    },
+                    f,
+                )
+            os.replace(tmp_path, cache_path)
+        return pages
+
+    def page_cache_path(self, file_path: Path) -> Optional[Path]:
+        """Page text cache file for a PDF (None when caching is off)."""
+        if self.cache_dir is None:
+            return None
+        relative = file_path.relative_to(self.docs_dir).as_posix()
+        return self.cache_dir / PAGE_CACHE_DIR / f"{hashlib.sha1(relative.encode('utf-8')).hexdigest()[:16]}.json.gz"
+
+    def prune_page_cache(self) -> int:
+        """Delete cached page texts of PDFs that no longer exist; return the count."""
+        if self.cache_dir is None or not (self.cache_dir / PAGE_CACHE_DIR).exists():
+            return 0
+        removed = 0
+        for cache_path in (self.cache_dir / PAGE_CACHE_DIR).glob("*.json.gz"):
+            try:
+                with gzip.open(cache_path, "rt", encoding="utf-8") as f:
+                    source = json.load(f)["source"]
+            except (OSError, ValueError, KeyError):
+                source = None
+            if source is None or not (self.docs_dir / source).is_file():
+                cache_path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
     def _get_file_hash(self, file_path: Path) -> str:
         """Generate SHA256 hash of file for change detection using streaming for large files."""
         hash_sha256 = hashlib.sha256()
@@ -1213,14 +3055,7 @@ class DocumentProcessor:
 
     def _extract_pdf_content(self, file_path: Path) -> str:
         """Extract content from PDF file."""
-        with open(file_path, "rb") as file:
-            reader = PyPDF2.PdfReader(file)
-            text_parts = []
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text.strip():
-                    text_parts.append(page_text)
-            return "\n".join(text_parts)
+        return "\n".join(page for page in self._extract_pdf_pages(file_path) if page.strip())
 
     def _extract_md_content(self, file_path: Path) -> str:
         """Extract content from Markdown file."""
@@ -1228,7 +3063,18 @@ class DocumentProcessor:
             return file.read()
 
     def _extract_docx_content(self, file_path: Path) -> str:
-        """Extract content from Word document."""
+        """Extract content from Word document.
+
+        Streams the OOXML package directly; documents the fast path can't
+        read are handed to python-docx.
+        """
+        try:
+            return extract_docx_text(file_path)
+        except (KeyError, ValueError, zipfile.BadZipFile, ElementTree.ParseError):
+            return self._extract_docx_content_python_docx(file_path)
+
+    def _extract_docx_content_python_docx(self, file_path: Path) -> str:
+        """Extract content from Word document through python-docx."""
         from docx import Document
         
         doc = Document(file_path)
@@ -1278,6 +3124,12 @@ class DocumentProcessor:
         else:
             return self._chunk_text_simple(text, chunk_size, overlap)
 
+    def _make_chunker(self, chunk_size: int, overlap: int, paragraphs: bool = False):
+        """Chunker for the configured boundary mode (fixed offsets or content-defined)."""
+        if self.config["chunking"].get("boundaries", "fixed") == "content":
+            return ContentDefinedChunker(chunk_size, overlap, paragraphs)
+        return StreamingChunker(chunk_size, overlap, paragraphs)
+
     def _chunk_text_simple(
         self, text: str, chunk_size: int, overlap: int
     ) -> List[Dict[str, Any]]:
@@ -1285,29 +3137,95 @@ class DocumentProcessor:
         if len(text) <= chunk_size:
             return [{"text": text, "metadata": {"chunk_type": "simple"}}]
 
-        chunks = []
-        start = 0
+        chunker = self._make_chunker(chunk_size, overlap)
+        return [
+            {"text": chunk_text, "metadata": {"chunk_type": "simple"}}
+            for chunk_text in chunker.feed(text) + chunker.finish()
+        ]
 
-        while start < len(text):
-            end = start + chunk_size
+    def _chunk_file_streaming(self, file_path: Path) -> List[Dict[str, Any]]:
+        """Chunk a large .md/.txt file window by window.
 
-            # Try to break at sentence boundary
-            if end < len(text):
-                # Look for sentence endings near the chunk boundary
-                for i in range(end, max(start + chunk_size - 200, start), -1):
-                    if text[i] in ".!?\n":
-                        end = i + 1
-                        break
+        Memory is bounded by the window and chunk sizes rather than the file
+        size. Text files fall back to latin-1 like _extract_txt_content.
+        """
+        encodings = ["utf-8", "latin-1"] if file_path.suffix.lower() == ".txt" else ["utf-8"]
+        for encoding in encodings:
+            try:
+                return list(self._iter_file_chunks(file_path, encoding))
+            except UnicodeDecodeError:
+                if encoding == encodings[-1]:
+                    raise
+        return []
+
+    def _iter_file_chunks(self, file_path: Path, encoding: str) -> Iterator[Dict[str, Any]]:
+        """Yield chunk dicts for a file, matching _chunk_text's output."""
+        chunk_size = self.config["search"].get("chunk_size", DEFAULT_CHUNK_SIZE)
+        overlap = self.config["search"].get("chunk_overlap", DEFAULT_CHUNK_OVERLAP)
+        windows = iter_text_windows(file_path, encoding)
+
+        if not self.config["chunking"]["smart"]:
+            chunker = self._make_chunker(chunk_size, overlap)
+            for window in windows:
+                for chunk_text in chunker.feed(window):
+                    yield {"text": chunk_text, "metadata": {"chunk_type": "simple"}}
+            for chunk_text in chunker.finish():
+                yield {"text": chunk_text, "metadata": {"chunk_type": "simple"}}
+            return
 
-            chunk_text = text[start:end].strip()
-            if chunk_text:
-                chunks.append(
-                    {"text": chunk_text, "metadata": {"chunk_type": "simple"}}
+        # Smart chunking, one header-delimited section at a time
+        header = None
+        pieces: List[str] = []
+        pieces_length = 0
+        section_stream = None
+        # Past this length a section's target size is fixed, so it can stream
+        stream_after = max(STREAM_WINDOW_CHARS, 3 * self.config["chunking"]["max_chunk_size"])
+
+        for line, complete in iter_text_lines(windows):
+            if complete and re.match(r"^#{1,6}\s+", line):
+                if section_stream is not None:
+                    yield from section_stream.finish()
+                else:
+                    yield from self._process_section("".join(pieces), header, chunk_size, overlap)
+                header, pieces, pieces_length, section_stream = line.strip(), [], 0, None
+                continue
+
+            if section_stream is not None:
+                yield from section_stream.feed(line)
+                continue
+
+            pieces.append(line)
+            pieces_length += len(line)
+            if pieces_length > stream_after:
+                section_stream, content = self._start_section_stream(
+                    header, "".join(pieces), chunk_size, overlap
                 )
+                yield from section_stream.feed(content)
+                pieces, pieces_length = [], 0
 
-            start = end - overlap
+        if section_stream is not None:
+            yield from section_stream.finish()
+        else:
+            yield from self._process_section("".join(pieces), header, chunk_size, overlap)
+
+    def _start_section_stream(
+        self, header: Optional[str], content: str, chunk_size: int, overlap: int
+    ) -> Tuple["_SectionStream", str]:
+        """Switch an oversized section to streaming, sized as _process_section would.
+
+        Returns the section stream and the buffered text to feed it first.
+        """
+        content = content.lstrip()  # More of the section follows
+        lines = content.split("\n", 5)[:5]
+        if any(line.strip().startswith(("-", "*", "1.")) for line in lines):
+            target_size = min(chunk_size, self.config["chunking"]["min_chunk_size"] * 2)
+        else:
+            target_size = self.config["chunking"]["max_chunk_size"]
 
-        return chunks
+        if header and self.config["chunking"]["preserve_headers"]:
+            content = f"{header}\n\n{content}"
+        section_stream = _SectionStream(header, self._make_chunker(target_size, overlap, paragraphs=True))
+        return section_stream, content
 
     def _chunk_text_smart(
         self, text: str, base_chunk_size: int, overlap: int
@@ -1388,44 +3306,493 @@ class DocumentProcessor:
                 }
             )
         else:
-            start = 0
-            chunk_index = 0
+            # Break at paragraph, then sentence boundaries
+            section_stream = _SectionStream(header, self._make_chunker(target_size, overlap, paragraphs=True))
+            chunks.extend(section_stream.feed(content))
+            chunks.extend(section_stream.finish())
 
-            while start < len(content):
-                end = start + target_size
+        return chunks
 
-                # Try to break at paragraph or sentence boundary
-                if end < len(content):
-                    # Look for paragraph breaks first
-                    for i in range(end, max(start + target_size - 300, start), -1):
-                        if i > start and content[i - 2 : i] == "\n\n":
-                            end = i
-                            break
-                    else:
-                        # Fall back to sentence breaks
-                        for i in range(end, max(start + target_size - 200, start), -1):
-                            if content[i] in ".!?\n":
-                                end = i + 1
-                                break
 
-                chunk_text = content[start:end].strip()
-                if chunk_text:
-                    chunks.append(
-                        {
-                            "text": chunk_text,
-                            "metadata": {
-                                "chunk_type": "smart",
-                                "section_header": header,
-                                "header_depth": len(re.findall(r"^#", header or "")),
-                                "section_chunk_index": chunk_index,
-                            },
-                        }
-                    )
-                    chunk_index += 1
+class DimensionReducer:
+    """Reduce embeddings to fewer dimensions, then re-normalize them.
 
-                start = end - overlap
+    ``pca`` projects onto the top right-singular vectors of a sample of the
+    corpus (uncentered, so projected dot products approximate the original
+    ones); ``truncate`` keeps the leading dimensions, which is only sound
+    for Matryoshka-trained models. ``fit_ids`` names the chunks a build
+    fitted the projection on, so benchmarks can evaluate it on other chunks.
+    """
 
-        return chunks
+    def __init__(
+        self,
+        method: str,
+        dim: int,
+        source_dim: int,
+        components: Any = None,
+        fit_ids: Optional[List[str]] = None,
+    ) -> None:
+        self.method = method
+        self.dim = dim
+        self.source_dim = source_dim
+        self.components = components
+        self.fit_ids = fit_ids or []
+
+    @classmethod
+    def fit(cls, embeddings: Any, dim: int, method: str = "pca") -> "DimensionReducer":
+        """Fit a reducer on corpus embeddings."""
+        import numpy as np
+
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        source_dim = vectors.shape[1]
+        if method not in REDUCTION_METHODS:
+            raise ValueError(f"Unknown reduction method '{method}'")
+        if not 0 < dim < source_dim:
+            raise ValueError(f"Reduced dimension must be between 1 and {source_dim - 1}")
+        if method == "truncate":
+            return cls(method, dim, source_dim)
+
+        # Evenly spaced rows, so a large input is sampled from end to end
+        sample = vectors[np.linspace(0, len(vectors) - 1, min(len(vectors), REDUCTION_FIT_SAMPLE)).astype(int)]
+        if len(sample) < dim:
+            raise ValueError(f"PCA to {dim} dimensions needs at least {dim} chunks (got {len(sample)})")
+        _, _, vt = np.linalg.svd(sample, full_matrices=False)
+        return cls(method, dim, source_dim, np.ascontiguousarray(vt[:dim]))
+
+    def transform(self, embeddings: Any) -> Any:
+        """Reduce and L2-normalize a batch of embeddings."""
+        import numpy as np
+
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if self.method == "truncate":
+            reduced = vectors[:, :self.dim]
+        else:
+            reduced = vectors @ self.components.T
+        norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return reduced / norms
+
+    def to_bytes(self) -> bytes:
+        """Serialize as an .npz payload."""
+        import io
+        import numpy as np
+
+        buffer = io.BytesIO()
+        arrays = {
+            "method": np.array(self.method),
+            "dim": np.array(self.dim),
+            "source_dim": np.array(self.source_dim),
+        }
+        if self.components is not None:
+            arrays["components"] = self.components
+        if self.fit_ids:
+            arrays["fit_ids"] = np.array(self.fit_ids, dtype=str)
+        np.savez(buffer, **arrays)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> "DimensionReducer":
+        """Load a reducer serialized by to_bytes()."""
+        import io
+        import numpy as np
+
+        with np.load(io.BytesIO(payload), allow_pickle=False) as data:
+            return cls(
+                str(data["method"]),
+                int(data["dim"]),
+                int(data["source_dim"]),
+                data["components"] if "components" in data else None,
+                data["fit_ids"].tolist() if "fit_ids" in data else None,
+            )
+
+
+def match_where(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a ChromaDB-style ``where`` clause against one metadata dict."""
+    if not where:
+        return True
+    if "$and" in where:
+        return all(match_where(metadata, clause) for clause in where["$and"])
+    if "$or" in where:
+        return any(match_where(metadata, clause) for clause in where["$or"])
+
+    for key, condition in where.items():
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, operand in condition.items():
+            if operator == "$eq" and value != operand:
+                return False
+            if operator == "$ne" and value == operand:
+                return False
+            if operator == "$in" and value not in operand:
+                return False
+            if operator == "$nin" and value in operand:
+                return False
+    return True
+
+
+def match_where_document(text: str, where_document: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a ChromaDB-style ``where_document`` clause against chunk text."""
+    if not where_document:
+        return True
+    if "$and" in where_document:
+        return all(match_where_document(text, clause) for clause in where_document["$and"])
+    if "$or" in where_document:
+        return any(match_where_document(text, clause) for clause in where_document["$or"])
+    if "$contains" in where_document:
+        return where_document["$contains"] in text
+    if "$not_contains" in where_document:
+        return where_document["$not_contains"] not in text
+    return True
+
+
+def _gzip_json(value: Any) -> bytes:
+    """Deterministic gzip-compressed JSON (same content, same bytes)."""
+    raw = json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return gzip.compress(raw, mtime=0)
+
+
+def export_snapshot(
+    collection,
+    path: Path,
+    dtype: str = DEFAULT_SNAPSHOT_DTYPE,
+    info: Optional[Dict[str, Any]] = None,
+    page_size: int = DEFAULT_ADD_BATCH_SIZE,
+    projection: Optional[bytes] = None,
+) -> str:
+    """Write a collection to a compact snapshot file and return its content hash.
+
+    Layout: magic, header length, JSON header, then 64-byte aligned sections
+    for the row-major vector matrix (memory-mappable), columnar chunk data,
+    BM25 statistics and, for reduced indexes, the query projection. Rows are
+    ordered by id and compressed sections are written with a fixed mtime, so
+    identical content yields identical bytes.
+    """
+    import numpy as np
+
+    ids = sorted(collection.get(include=[])["ids"])
+    documents: List[str] = []
+    metadatas: List[Dict[str, Any]] = []
+    vectors = None
+
+    for start in range(0, len(ids), page_size):
+        page = ids[start:start + page_size]
+        data = collection.get(ids=page, include=["embeddings", "documents", "metadatas"])
+        position = {doc_id: i for i, doc_id in enumerate(data["ids"])}
+        page_vectors = np.asarray(data["embeddings"], dtype=np.float32)
+        if vectors is None:
+            vectors = np.empty((len(ids), page_vectors.shape[1]), dtype=dtype)
+        for offset, doc_id in enumerate(page):
+            i = position[doc_id]
+            documents.append(data["documents"][i])
+            metadatas.append(data["metadatas"][i] or {})
+            vectors[start + offset] = page_vectors[i]
+
+    if vectors is None:
+        vectors = np.empty((0, 0), dtype=dtype)
+
+    # Columnar metadata: one value list per key
+    keys = sorted({key for metadata in metadatas for key in metadata})
+    columns = {
+        "ids": ids,
+        "documents": documents,
+        "metadata": {key: [metadata.get(key) for metadata in metadatas] for key in keys},
+    }
+    bm25 = BM25Scorer()
+    bm25.fit(documents, ids)
+
+    sections = [
+        ("vectors", np.ascontiguousarray(vectors).tobytes()),
+        ("columns", _gzip_json(columns)),
+        ("bm25", _gzip_json(bm25.state_dict())),
+    ]
+    if projection is not None:
+        sections.append(("projection", projection))
+    content_hash = hashlib.sha256()
+    for _, payload in sections:
+        content_hash.update(payload)
+
+    header = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "count": len(ids),
+        "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+        "dtype": np.dtype(dtype).name,
+        "content_hash": content_hash.hexdigest(),
+        "info": info or {},
+        "sections": {},
+    }
+    # Offsets depend on the header size, which depends on the offsets
+    header_size = 0
+    while True:
+        offset = _align(len(SNAPSHOT_MAGIC) + 8 + header_size)
+        for name, payload in sections:
+            header["sections"][name] = {"offset": offset, "length": len(payload)}
+            offset = _align(offset + len(payload))
+        header_bytes = json.dumps(header, sort_keys=True).encode("utf-8")
+        if len(header_bytes) == header_size:
+            break
+        header_size = len(header_bytes)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for name, payload in sections:
+            f.write(b"\0" * (header["sections"][name]["offset"] - f.tell()))
+            f.write(payload)
+    os.replace(tmp_path, path)
+    return header["content_hash"]
+
+
+def _align(offset: int) -> int:
+    """Round an offset up to the snapshot section alignment."""
+    return (offset + SNAPSHOT_ALIGNMENT - 1) // SNAPSHOT_ALIGNMENT * SNAPSHOT_ALIGNMENT
+
+
+def read_snapshot_header(path: Path) -> Dict[str, Any]:
+    """Read and validate a snapshot header."""
+    with open(path, "rb") as f:
+        if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path.name} is not a raggy snapshot")
+        (header_length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_length).decode("utf-8"))
+    if header.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format in {path.name}")
+    return header
+
+
+def verify_snapshot(path: Path) -> Dict[str, Any]:
+    """Check a snapshot's content hash, returning its header."""
+    header = read_snapshot_header(path)
+    content_hash = hashlib.sha256()
+    with open(path, "rb") as f:
+        for name in SNAPSHOT_SECTIONS:
+            if name not in header["sections"]:
+                continue  # Optional section
+            section = header["sections"][name]
+            f.seek(section["offset"])
+            remaining = section["length"]
+            while remaining:
+                block = f.read(min(remaining, CHUNK_READ_SIZE * 128))
+                if not block:
+                    raise ValueError(f"Snapshot {path.name} is truncated")
+                content_hash.update(block)
+                remaining -= len(block)
+    if content_hash.hexdigest() != header["content_hash"]:
+        raise ValueError(f"Snapshot {path.name} failed its content hash check")
+    return header
+
+
+class SnapshotCollection:
+    """Read-only, memory-mapped collection backed by a snapshot file.
+
+    Implements the subset of the ChromaDB collection API that SearchEngine
+    and DatabaseManager use, with exact (brute-force) cosine search.
+    """
+
+    def __init__(self, path: Path) -> None:
+        import numpy as np
+
+        self.path = path
+        self.header = read_snapshot_header(path)
+        self.name = self.header.get("info", {}).get("collection", path.stem)
+
+        vectors = self.header["sections"]["vectors"]
+        count, dim = self.header["count"], self.header["dim"]
+        self.vectors = (
+            np.memmap(path, dtype=self.header["dtype"], mode="r", offset=vectors["offset"], shape=(count, dim))
+            if count and dim
+            else np.zeros((0, dim), dtype=np.float32)
+        )
+        columns = self._read_section("columns")
+        self.ids: List[str] = columns["ids"]
+        self.documents: List[str] = columns["documents"]
+        self.columns: Dict[str, List[Any]] = columns["metadata"]
+        # Object arrays so where filters compare whole columns at once
+        self._column_arrays: Dict[str, Any] = {}
+        for key, values in self.columns.items():
+            self._column_arrays[key] = np.empty(len(values), dtype=object)
+            self._column_arrays[key][:] = values
+        self._positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self._norms = None
+
+    def _read_section(self, name: str) -> Any:
+        section = self.header["sections"][name]
+        with open(self.path, "rb") as f:
+            f.seek(section["offset"])
+            return json.loads(gzip.decompress(f.read(section["length"])).decode("utf-8"))
+
+    def load_projection(self) -> Optional[DimensionReducer]:
+        """Load the query projection stored with a reduced index, if any."""
+        section = self.header["sections"].get("projection")
+        if section is None:
+            return None
+        with open(self.path, "rb") as f:
+            f.seek(section["offset"])
+            return DimensionReducer.from_bytes(f.read(section["length"]))
+
+    def load_bm25(self) -> BM25Scorer:
+        """Load the BM25 statistics stored in the snapshot."""
+        return BM25Scorer.from_states([self._read_section("bm25")])
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def metadata(self, index: int) -> Dict[str, Any]:
+        """Rebuild one row's metadata dict from the columns."""
+        return {
+            key: values[index]
+            for key, values in self.columns.items()
+            if values[index] is not None
+        }
+
+    def _where_mask(self, where: Dict[str, Any]) -> Any:
+        """Boolean row mask for a ``where`` clause (same semantics as match_where)."""
+        import numpy as np
+
+        if "$and" in where:
+            return np.logical_and.reduce([self._where_mask(clause) for clause in where["$and"]])
+        if "$or" in where:
+            return np.logical_or.reduce([self._where_mask(clause) for clause in where["$or"]])
+
+        mask = np.ones(len(self.ids), dtype=bool)
+        for key, condition in where.items():
+            column = self._column_arrays.get(key)
+            if column is None:
+                column = np.full(len(self.ids), None, dtype=object)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for operator, operand in condition.items():
+                if operator in ("$eq", "$ne"):
+                    hits = np.asarray(column == operand, dtype=bool)
+                elif operator in ("$in", "$nin"):
+                    hits = np.frompyfunc(set(operand).__contains__, 1, 1)(column).astype(bool)
+                else:
+                    continue
+                mask &= hits if operator in ("$eq", "$in") else ~hits
+        return mask
+
+    def _filter_rows(
+        self,
+        where: Optional[Dict[str, Any]] = None,
+        where_document: Optional[Dict[str, Any]] = None,
+    ) -> Optional[List[int]]:
+        """Row indices matching the filters, or None when unfiltered."""
+        import numpy as np
+
+        if not where and not where_document:
+            return None
+        rows = np.flatnonzero(self._where_mask(where)) if where else range(len(self.ids))
+        return [
+            int(i) for i in rows
+            if match_where_document(self.documents[i], where_document)
+        ]
+
+    def _rows(self, indices: List[int], include: List[str]) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"ids": [self.ids[i] for i in indices]}
+        if "documents" in include:
+            result["documents"] = [self.documents[i] for i in indices]
+        if "metadatas" in include:
+            result["metadatas"] = [self.metadata(i) for i in indices]
+        if "embeddings" in include:
+            result["embeddings"] = self.vectors[indices].astype("float32")
+        return result
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        include: Optional[List[str]] = None,
+        where_document: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        include = ["documents", "metadatas"] if include is None else include
+        if ids is not None:
+            indices = [self._positions[doc_id] for doc_id in ids if doc_id in self._positions]
+        else:
+            indices = list(range(len(self.ids)))
+        allowed = self._filter_rows(where, where_document)
+        if allowed is not None:
+            allowed_set = set(allowed)
+            indices = [i for i in indices if i in allowed_set]
+        indices = indices[offset:offset + limit if limit is not None else None]
+        return self._rows(indices, include)
+
+    def query(
+        self,
+        query_embeddings: Optional[List[List[float]]] = None,
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        where_document: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+        query_texts: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        import numpy as np
+
+        if query_embeddings is None:
+            raise ValueError("Snapshot collections need query_embeddings")
+        include = ["documents", "metadatas", "distances"] if include is None else include
+
+        candidates = self._filter_rows(where, where_document)
+        if self._norms is None:
+            self._norms = self._row_norms()
+
+        results: Dict[str, List[Any]] = {"ids": []}
+        for key in ("documents", "metadatas", "distances", "embeddings"):
+            if key in include:
+                results[key] = []
+
+        for query_embedding in query_embeddings:
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            query_vector = query_vector / (np.linalg.norm(query_vector) or 1.0)
+            similarity = self._similarities(query_vector, candidates)
+            rows = np.arange(len(self.ids)) if candidates is None else np.asarray(candidates, dtype=np.int64)
+
+            k = min(n_results, len(rows))
+            if k:
+                top = np.argpartition(-similarity, k - 1)[:k]
+                top = top[np.argsort(-similarity[top])]
+            else:
+                top = np.zeros(0, dtype=np.int64)
+            indices = rows[top].tolist()
+
+            rows_data = self._rows(indices, include)
+            results["ids"].append(rows_data["ids"])
+            for key in ("documents", "metadatas", "embeddings"):
+                if key in include:
+                    results[key].append(rows_data[key])
+            if "distances" in include:
+                # Cosine distance, as normalize_cosine_distance expects
+                results["distances"].append((1.0 - similarity[top]).tolist())
+        return results
+
+    def _row_norms(self) -> Any:
+        import numpy as np
+
+        norms = np.empty(len(self.ids), dtype=np.float32)
+        for start in range(0, len(self.ids), SNAPSHOT_SCAN_BLOCK):
+            block = np.asarray(self.vectors[start:start + SNAPSHOT_SCAN_BLOCK], dtype=np.float32)
+            norms[start:start + len(block)] = np.linalg.norm(block, axis=1)
+        norms[norms == 0] = 1.0
+        return norms
+
+    def _similarities(self, query_vector: Any, candidates: Optional[List[int]]) -> Any:
+        """Cosine similarities for all rows (or the candidate rows), in blocks."""
+        import numpy as np
+
+        if candidates is not None:
+            rows = np.asarray(candidates, dtype=np.int64)
+            block = np.asarray(self.vectors[rows], dtype=np.float32)
+            return (block @ query_vector) / self._norms[rows]
+
+        similarity = np.empty(len(self.ids), dtype=np.float32)
+        for start in range(0, len(self.ids), SNAPSHOT_SCAN_BLOCK):
+            block = np.asarray(self.vectors[start:start + SNAPSHOT_SCAN_BLOCK], dtype=np.float32)
+            similarity[start:start + len(block)] = block @ query_vector
+        return similarity / self._norms
 
 
 class DatabaseManager:
@@ -1434,295 +3801,1287 @@ class DatabaseManager:
     def __init__(
         self,
         db_dir: Path,
-        collection_name: str = "project_docs",
-        quiet: bool = False
+        collection_name: str = DEFAULT_COLLECTION,
+        quiet: bool = False,
+        max_handles: int = MAX_COLLECTION_HANDLES,
     ) -> None:
         self.db_dir = db_dir
         self.collection_name = collection_name
         self.quiet = quiet
+        self.max_handles = max_handles
         self._client = None
+        self._client_lock = threading.Lock()
+        self._collections: "OrderedDict[str, Any]" = OrderedDict()
+        self._collections_lock = threading.Lock()
+        self._generation = 0
+        self._generation_mtime: Optional[int] = None
+        self._aliases: Dict[str, Any] = {"aliases": {}, "retired": []}
+        self._aliases_mtime: Optional[int] = None
+        self._leases: Dict[str, int] = defaultdict(int)
+        self._leases_lock = threading.Lock()
+        self._collect_timer: Optional[threading.Timer] = None
+        self._collect_due = 0.0
     
     @property
     def client(self):
         """Lazy-load ChromaDB client."""
         if self._client is None:
-            try:
-                global chromadb
-                self._client = chromadb.PersistentClient(path=str(self.db_dir))
-            except NameError:
-                # chromadb not imported yet, try importing
-                import chromadb
-                self._client = chromadb.PersistentClient(path=str(self.db_dir))
+            with self._client_lock:
+                if self._client is None:
+                    try:
+                        global chromadb
+                        self._client = chromadb.PersistentClient(path=str(self.db_dir))
+                    except NameError:
+                        # chromadb not imported yet, try importing
+                        import chromadb
+                        self._client = chromadb.PersistentClient(path=str(self.db_dir))
         return self._client
     
     def build_index(
         self,
         documents: List[Dict[str, Any]],
         embeddings: Any,
-        force_rebuild: bool = False
+        force_rebuild: bool = False,
+        collection_name: Optional[str] = None,
+        reducer: Optional[DimensionReducer] = None,
+        model_name: Optional[str] = None,
+        binary_index: bool = False,
     ) -> None:
-        """Build or update the vector database."""
+        """Build or update the vector database.
+
+        A forced rebuild fills a shadow collection and then flips the alias
+        readers resolve, so searches keep hitting the old index until the new
+        one is complete. The old collection is dropped once it has been
+        retired for RETIRED_COLLECTION_GRACE seconds and no local query holds it.
+        With ``reducer`` the embeddings are stored reduced and the projection
+        is saved alongside the collection for queries; ``binary_index`` also
+        writes the binary prefilter codes (see finish_build()).
+        """
+        name = collection_name or self.collection_name
         try:
-            if force_rebuild:
-                try:
-                    self.client.delete_collection(self.collection_name)
-                    if not self.quiet:
-                        print("Deleted existing collection")
-                except Exception:
-                    pass  # Collection may not exist
-
-            collection = self.client.get_or_create_collection(
-                name=self.collection_name,
-                metadata={"description": "Project documentation embeddings"},
-            )
-            
-            # Add to ChromaDB
-            texts = [doc["text"] for doc in documents]
-            collection.add(
-                embeddings=embeddings.tolist(),
-                documents=texts,
-                metadatas=[doc["metadata"] for doc in documents],
-                ids=[doc["id"] for doc in documents],
-            )
-            
+            collection = self.begin_build(name, force_rebuild, model_name=model_name)
+            try:
+                if reducer is not None:
+                    self.save_projection(collection, reducer)
+                    embeddings = reducer.transform(embeddings)
+                self.add_documents(collection, documents, embeddings)
+            except Exception:
+                self.abort_build(collection, force_rebuild)
+                raise
+            self.finish_build(name, collection, force_rebuild, binary_index=binary_index)
         except Exception as e:
             log_error("Failed to build index", e, quiet=self.quiet)
             raise
-    
-    def get_collection(self):
-        """Get the collection for search operations."""
-        return self.client.get_collection(self.collection_name)
-    
-    def get_stats(self) -> Dict[str, Any]:
-        """Get database statistics."""
-        try:
-            collection = self.get_collection()
-            count = collection.count()
-
-            # Get source distribution
-            all_data = collection.get()
-            sources = {}
-            for meta in all_data["metadatas"]:
-                src = meta["source"]
-                sources[src] = sources.get(src, 0) + 1
 
-            return {
-                "total_chunks": count,
-                "sources": sources,
-                "db_path": str(self.db_dir),
-            }
+    def begin_build(
+        self,
+        name: str,
+        force_rebuild: bool = False,
+        target: Optional[str] = None,
+        model_name: Optional[str] = None,
+    ):
+        """Open the collection a build writes to.
+
+        Rebuilds get a fresh shadow collection (or reopen ``target`` when
+        resuming one); incremental builds write to the live collection.
+        ``model_name`` is recorded in the metadata of collections created here.
+        """
+        self.collect_retired()
+        metadata = {"description": "Project documentation embeddings"}
+        if model_name:
+            metadata["embedding_model"] = model_name
+        if not force_rebuild:
+            physical = self.resolve_collection(name)
+            collection = self.client.get_or_create_collection(name=physical, metadata=metadata)
+            with self._collections_lock:
+                self._remember_collection(physical, collection)
+            return collection
+
+        if target is not None:
+            try:
+                return self.client.get_collection(target)
+            except Exception:
+                pass  # Shadow is gone; start a new one
+
+        aliases = self._read_aliases()
+        taken = set(aliases["aliases"].values())
+        taken.update(entry["collection"] for entry in aliases["retired"])
+        version = self.get_generation() + 1
+        while f"{name}_v{version}" in taken:
+            version += 1
+        shadow = f"{name}_v{version}"
+        self.drop_collection(shadow)  # Leftover from a failed build
+        return self.client.create_collection(name=shadow, metadata=metadata)
+
+    def abort_build(self, collection, force_rebuild: bool = False) -> None:
+        """Drop a failed rebuild's shadow collection (the live one is untouched)."""
+        if force_rebuild:
+            self.drop_collection(collection.name)
+
+    def drop_collection(self, physical: str) -> None:
+        """Delete a physical collection and everything stored alongside it."""
+        try:
+            self.client.delete_collection(physical)
         except Exception:
-            return {
-                "error": "Database not found. Run 'python raggy.py build' first to index your documents."
-            }
+            pass  # Collection may not exist
+        self.forget_collection(physical)
+        self.projection_path(physical).unlink(missing_ok=True)
+        shutil.rmtree(self.binary_index_path(physical), ignore_errors=True)
+
+    def projection_path(self, physical: str) -> Path:
+        """Path of the dimension-reduction projection for a physical collection."""
+        return self.db_dir / "projections" / f"{physical}.npz"
+
+    def save_projection(self, collection, reducer: DimensionReducer) -> None:
+        """Store a collection's projection so queries can be reduced the same way."""
+        path = self.projection_path(collection.name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_bytes(reducer.to_bytes())
+        os.replace(tmp_path, path)
+
+    def load_projection(self, collection) -> Optional[DimensionReducer]:
+        """Load a collection's projection (None for full-dimension indexes)."""
+        if hasattr(collection, "load_projection"):
+            return collection.load_projection()  # Snapshots carry their own
+        try:
+            return DimensionReducer.from_bytes(self.projection_path(collection.name).read_bytes())
+        except OSError:
+            return None
 
+    def finish_build(
+        self, name: str, collection, force_rebuild: bool = False, binary_index: bool = False
+    ) -> None:
+        """Publish a build: swap in a rebuilt collection and bump the generation.
+
+        With ``binary_index`` the collection's binary prefilter codes are
+        rewritten first, so they are in place before searches see the build.
+        """
+        if binary_index:
+            self.write_binary_index(collection)
+        if force_rebuild:
+            previous = self.resolve_collection(name)
+            self._swap_alias(name, collection.name, previous)
+            with self._collections_lock:
+                self._remember_collection(collection.name, collection)
+            if previous != collection.name:
+                self.forget_collection(previous)
+                if not self.quiet:
+                    print(f"Swapped '{name}' to new collection (previous one retired)")
 
-class SearchEngine:
-    """Handles semantic search, hybrid search, and scoring operations."""
-    
-    def __init__(
+        # A rebuilt collection replaces any imported snapshot
+        self.remove_snapshot(name)
+        self.bump_generation()
+
+    def add_documents(
         self,
-        database_manager: DatabaseManager,
-        query_processor: QueryProcessor,
-        config: Dict[str, Any],
-        quiet: bool = False
+        collection,
+        documents: List[Dict[str, Any]],
+        embeddings: Any,
+        upsert: bool = False,
+        batch_size: Optional[int] = None,
     ) -> None:
-        self.database_manager = database_manager
-        self.query_processor = query_processor
-        self.config = config
-        self.quiet = quiet
-        self._bm25_scorer = None
-        self._documents_cache = None
-    
-    def search(
-        self,
-        query: str,
-        embedding_model: Any,
-        n_results: int = DEFAULT_RESULTS,
-        hybrid: bool = False,
-        expand_query: bool = False,
-        show_scores: bool = None,
-    ) -> List[Dict[str, Any]]:
-        """Search the vector database with enhanced capabilities."""
-        try:
-            collection = self.database_manager.get_collection()
-        except Exception:
-            log_error("Database collection not found - run 'python raggy.py build' first", quiet=self.quiet)
-            return []
+        """Add documents in batches no larger than ChromaDB accepts.
 
+        ``upsert`` makes re-adding the same chunk ids (e.g. when resuming a
+        build) overwrite instead of being rejected; ``batch_size`` caps the
+        writes further (e.g. under a memory budget).
+        """
         try:
-            # Process query
-            if expand_query:
-                query_info = self.query_processor.process(query)
-                processed_query = query_info["processed"]
-            else:
-                query_info = {
-                    "original": query,
-                    "type": "keyword",
-                    "boost_exact": False,
-                }
-                processed_query = query
+            max_batch_size = self.client.get_max_batch_size()
+        except AttributeError:
+            max_batch_size = getattr(self.client, "max_batch_size", DEFAULT_ADD_BATCH_SIZE)
+        batch_size = min(batch_size, max_batch_size) if batch_size else max_batch_size
+
+        write = collection.upsert if upsert else collection.add
+        for start in range(0, len(documents), batch_size):
+            batch = documents[start:start + batch_size]
+            write(
+                embeddings=embeddings[start:start + batch_size].tolist(),
+                documents=[doc["text"] for doc in batch],
+                metadatas=[doc["metadata"] for doc in batch],
+                ids=[doc["id"] for doc in batch],
+            )
 
-            # Get semantic results
-            results = collection.query(
-                query_texts=[processed_query],
-                n_results=(
-                    n_results * 2 if hybrid else n_results
-                ),  # Get more for hybrid filtering
+    def get_stored_embeddings(
+        self, collection, documents: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Stored embeddings of chunks whose id and text are already in a collection."""
+        texts = {doc["id"]: doc["text"] for doc in documents}
+        ids = list(texts)
+        stored: Dict[str, Any] = {}
+        for start in range(0, len(ids), DEFAULT_ADD_BATCH_SIZE):
+            data = collection.get(
+                ids=ids[start:start + DEFAULT_ADD_BATCH_SIZE], include=["embeddings", "documents"]
             )
+            for doc_id, text, vector in zip(data["ids"], data["documents"], data["embeddings"]):
+                if text == texts.get(doc_id):
+                    stored[doc_id] = vector
+        return stored
+
+    def has_unstored_chunks(self, collection, documents: List[Dict[str, Any]]) -> bool:
+        """Whether any chunk's id and text are not in a collection yet (i.e. need embedding)."""
+        texts = {doc["id"]: doc["text"] for doc in documents}
+        ids = list(texts)
+        for start in range(0, len(ids), DEFAULT_ADD_BATCH_SIZE):
+            batch = ids[start:start + DEFAULT_ADD_BATCH_SIZE]
+            data = collection.get(ids=batch, include=["documents"])
+            stored = sum(
+                1 for doc_id, text in zip(data["ids"], data["documents"]) if text == texts.get(doc_id)
+            )
+            if stored < len(batch):
+                return True
+        return False
 
-            formatted_results = []
+    def checkpoint_path(self, collection_name: Optional[str] = None) -> Path:
+        """Path of the resumable build checkpoint for a collection."""
+        return self.db_dir / "checkpoints" / f"{collection_name or self.collection_name}.json"
 
-            # Initialize BM25 scorer for hybrid search
-            if hybrid and self._bm25_scorer is None:
-                self._init_bm25_scorer(collection)
+    def load_checkpoint(self, collection_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Load a build checkpoint, or None if there is none."""
+        try:
+            return json.loads(self.checkpoint_path(collection_name).read_text())
+        except (OSError, ValueError):
+            return None
 
-            for i in range(len(results["documents"][0])):
-                distance = (
-                    results["distances"][0][i] if "distances" in results else None
-                )
+    def save_checkpoint(self, state: Dict[str, Any], collection_name: Optional[str] = None) -> None:
+        """Atomically write a build checkpoint."""
+        path = self.checkpoint_path(collection_name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(json.dumps(state))
+        os.replace(tmp_path, path)
 
-                # Normalize semantic similarity score
-                semantic_score = (
-                    normalize_cosine_distance(distance)
-                    if distance is not None
-                    else 0
-                )
+    def clear_checkpoint(self, collection_name: Optional[str] = None) -> None:
+        """Remove a build checkpoint once the build is published."""
+        self.checkpoint_path(collection_name).unlink(missing_ok=True)
 
-                # Calculate keyword score if using hybrid search
-                if hybrid and self._bm25_scorer:
-                    keyword_score = self._bm25_scorer.score(query, i)
-                    # Combine scores
-                    final_score = normalize_hybrid_score(
-                        semantic_score,
-                        keyword_score,
-                        self.config["search"]["hybrid_weight"],
-                    )
-                else:
-                    keyword_score = 0
-                    final_score = semantic_score
+    def bm25_state_path(self, collection_name: Optional[str] = None) -> Path:
+        """Path of the persisted BM25 statistics for a collection."""
+        return self.db_dir / "bm25" / f"{collection_name or self.collection_name}.json.gz"
 
-                # Apply exact match boost
-                if (
-                    query_info.get("boost_exact")
-                    and query.lower() in results["documents"][0][i].lower()
-                ):
-                    final_score = min(1.0, final_score * 1.5)
+    def binary_index_path(self, physical: str) -> Path:
+        """Directory of the binary prefilter codes and vectors for a physical collection."""
+        return self.db_dir / "binary" / physical
 
-                formatted_results.append(
-                    {
-                        "text": results["documents"][0][i],
-                        "metadata": results["metadatas"][0][i],
-                        "semantic_score": semantic_score,
-                        "keyword_score": keyword_score,
-                        "final_score": final_score,
-                        "score_interpretation": interpret_score(final_score),
-                        "distance": distance,  # Keep for backward compatibility
-                        "similarity": final_score,  # Keep for backward compatibility
-                    }
-                )
+    def write_binary_index(self, collection) -> None:
+        """Write a collection's binary prefilter codes and rescoring vectors."""
+        if not self.quiet:
+            print("Writing binary prefilter codes...")
+        try:
+            BinaryIndex.write(self.binary_index_path(collection.name), collection)
+        except OSError as e:
+            log_warning("Could not write binary prefilter codes; searches use the vector index", e, quiet=self.quiet)
 
-            # Sort by final score and limit results
-            formatted_results.sort(key=lambda x: x["final_score"], reverse=True)
-            formatted_results = formatted_results[:n_results]
+    def get_generation(self) -> int:
+        """Get the index generation counter (re-read only when the file changes)."""
+        self._read_generation()
+        return self._generation
 
-            # Rerank results if enabled
-            if self.config["search"]["rerank"]:
-                formatted_results = self._rerank_results(query, formatted_results)
+    def _read_generation(self, fresh: bool = False) -> None:
+        """Refresh the cached generation (always re-read if ``fresh``).
 
-            # Add highlighting if requested
-            show_scores = (
-                show_scores
-                if show_scores is not None
-                else self.config["search"]["show_scores"]
-            )
-            if show_scores:
-                for result in formatted_results:
-                    result["highlighted_text"] = self._highlight_matches(
-                        query, result["text"]
-                    )
+        Empty or malformed content counts as a failed read, so the last known
+        generation is kept rather than dropping to 0.
+        """
+        generation_file = self.db_dir / GENERATION_FILE
+        try:
+            mtime = generation_file.stat().st_mtime_ns
+        except OSError:
+            return
 
-            return formatted_results
+        if fresh or mtime != self._generation_mtime:
+            try:
+                self._generation = int(generation_file.read_text().strip())
+                self._generation_mtime = mtime
+            except (OSError, ValueError):
+                pass  # Keep the last known generation
+
+    def bump_generation(self) -> int:
+        """Increment the index generation so cached search results are invalidated."""
+        generation_file = self.db_dir / GENERATION_FILE
+        try:
+            with self._file_lock():
+                self._read_generation(fresh=True)  # Unreadable: bump the last known value
+                generation = self._generation + 1
+                tmp_file = generation_file.with_name(generation_file.name + ".tmp")
+                tmp_file.write_text(str(generation))
+                os.replace(tmp_file, generation_file)
+                self._generation = generation
+                self._generation_mtime = generation_file.stat().st_mtime_ns
+        except OSError as e:
+            self._generation += 1
+            log_warning("Could not persist index generation", e, quiet=self.quiet)
+        return self._generation
+    
+    def get_collection(self, collection_name: Optional[str] = None):
+        """Get a collection for search operations (LRU-cached handle)."""
+        name = collection_name or self.collection_name
+        snapshot_path = self.snapshot_path(name)
+        if snapshot_path.exists():
+            key = str(snapshot_path)
+            with self._collections_lock:
+                collection = self._collections.get(key) or SnapshotCollection(snapshot_path)
+                self._remember_collection(key, collection)
+        else:
+            # Handles are cached by physical name, so an alias flip is seen at once
+            key = self.resolve_collection(name)
+            with self._collections_lock:
+                collection = self._collections.get(key) or self.client.get_collection(key)
+                self._remember_collection(key, collection)
+        return collection
+
+    def resolve_collection(self, collection_name: Optional[str] = None) -> str:
+        """Physical collection currently serving a logical collection name."""
+        name = collection_name or self.collection_name
+        return self._read_aliases()["aliases"].get(name, name)
+
+    def _read_aliases(self, fresh: bool = False) -> Dict[str, Any]:
+        """Read the alias file (re-read only when it changes, or always if ``fresh``)."""
+        alias_file = self.db_dir / ALIAS_FILE
+        try:
+            mtime = alias_file.stat().st_mtime_ns
+        except OSError:
+            return self._aliases
 
-        except Exception as e:
-            log_error("Search error", e, quiet=self.quiet)
+        if fresh or mtime != self._aliases_mtime:
+            try:
+                aliases = json.loads(alias_file.read_text())
+                self._aliases = {
+                    "aliases": aliases.get("aliases", {}),
+                    "retired": aliases.get("retired", []),
+                }
+                self._aliases_mtime = mtime
+                self._schedule_collect(self._aliases["retired"])
+            except (OSError, ValueError):
+                pass  # Keep the last known aliases
+        return self._aliases
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Hold an exclusive lock shared by every process using this db dir.
+
+        Taken around each read-modify-write of the alias and generation files,
+        so concurrent builds cannot overwrite each other's swaps or bumps.
+        """
+        self.db_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.db_dir / LOCK_FILE, "a+b") as lock_file:
+            try:
+                import fcntl
+            except ImportError:  # Windows
+                import msvcrt
+
+                while True:
+                    try:
+                        lock_file.seek(0)
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue  # LK_LOCK gives up after ~10 s; keep waiting
+                try:
+                    yield
+                finally:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _write_aliases(self, aliases: Dict[str, Any]) -> None:
+        """Atomically replace the alias file."""
+        self.db_dir.mkdir(parents=True, exist_ok=True)
+        alias_file = self.db_dir / ALIAS_FILE
+        tmp_file = alias_file.with_name(alias_file.name + ".tmp")
+        tmp_file.write_text(json.dumps(aliases, indent=2, sort_keys=True))
+        os.replace(tmp_file, alias_file)
+        self._aliases = aliases
+        self._aliases_mtime = alias_file.stat().st_mtime_ns
+
+    def _swap_alias(self, name: str, physical: str, previous: str) -> None:
+        """Point ``name`` at ``physical`` and retire the collection it replaced."""
+        with self._file_lock():
+            current = self._read_aliases(fresh=True)
+            aliases = {
+                "aliases": dict(current["aliases"], **{name: physical}),
+                "retired": [entry for entry in current["retired"] if entry["collection"] != physical],
+            }
+            if previous != physical:
+                aliases["retired"].append({"collection": previous, "retired_at": time.time()})
+            self._write_aliases(aliases)
+        self._schedule_collect(aliases["retired"])
+
+    @contextmanager
+    def lease(self, collection: Any) -> Iterator[Any]:
+        """Mark a collection as in use so collect_retired() leaves it alone.
+
+        Leases are per process; see RETIRED_COLLECTION_GRACE for other readers.
+        """
+        name = getattr(collection, "name", None)
+        with self._leases_lock:
+            self._leases[name] += 1
+        try:
+            yield collection
+        finally:
+            with self._leases_lock:
+                self._leases[name] -= 1
+                if not self._leases[name]:
+                    del self._leases[name]
+
+    def collect_retired(self, grace: float = RETIRED_COLLECTION_GRACE) -> List[str]:
+        """Delete retired collections past their grace period and not in use here."""
+        if not self._read_aliases()["retired"]:
             return []
 
-    def _init_bm25_scorer(self, collection):
-        """Initialize BM25 scorer with collection documents."""
-        if self._documents_cache is None:
-            # Get all documents from collection
+        with self._file_lock():
+            current = self._read_aliases(fresh=True)
+            live = set(current["aliases"].values())
+            now = time.time()
+            keep, dropped = [], []
+            for entry in current["retired"]:
+                name = entry["collection"]
+                with self._leases_lock:
+                    in_use = self._leases.get(name, 0) > 0
+                if name in live:
+                    continue  # Swapped back in; no longer retired
+                if in_use or now - entry["retired_at"] < grace:
+                    keep.append(entry)
+                    continue
+                self.drop_collection(name)
+                dropped.append(name)
+
+            if len(keep) != len(current["retired"]):
+                self._write_aliases({"aliases": current["aliases"], "retired": keep})
+        self._schedule_collect(keep, grace)
+        return dropped
+
+    def _schedule_collect(
+        self, retired: List[Dict[str, Any]], grace: float = RETIRED_COLLECTION_GRACE
+    ) -> None:
+        """Run collect_retired() in the background once the earliest grace period ends.
+
+        Collections still leased then are retried a second later, so long-lived
+        processes (such as a bot) drop them as soon as their queries drain.
+        """
+        if not retired:
+            return
+        due = max(time.time(), min(entry["retired_at"] for entry in retired) + grace) + 1.0
+        with self._leases_lock:
+            if self._collect_timer is not None:
+                if self._collect_due <= due:
+                    return  # Already scheduled
+                self._collect_timer.cancel()
+            timer = threading.Timer(due - time.time(), self._collect_in_background, args=(grace,))
+            timer.daemon = True
+            self._collect_timer, self._collect_due = timer, due
+        timer.start()
+
+    def _collect_in_background(self, grace: float) -> None:
+        """Timer callback for _schedule_collect()."""
+        with self._leases_lock:
+            self._collect_timer = None
+        try:
+            self.collect_retired(grace)
+        except Exception as e:
+            log_warning("Could not drop retired collections", e, quiet=self.quiet)
+
+    def snapshot_path(self, collection_name: Optional[str] = None) -> Path:
+        """Path of an imported snapshot serving a collection."""
+        return self.db_dir / "snapshots" / f"{collection_name or self.collection_name}{SNAPSHOT_SUFFIX}"
+
+    def export_snapshot(
+        self,
+        path: Path,
+        collection_name: Optional[str] = None,
+        dtype: str = DEFAULT_SNAPSHOT_DTYPE,
+        info: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Export a collection to a snapshot file, returning its content hash."""
+        name = collection_name or self.collection_name
+        info = dict(info or {}, collection=name)
+        collection = self.get_collection(name)
+        reducer = self.load_projection(collection)
+        return export_snapshot(
+            collection,
+            path,
+            dtype=dtype,
+            info=info,
+            projection=reducer.to_bytes() if reducer is not None else None,
+        )
+
+    def import_snapshot(self, path: Path, collection_name: Optional[str] = None) -> Dict[str, Any]:
+        """Verify a snapshot and attach it as the named collection."""
+        header = verify_snapshot(path)
+        name = collection_name or header.get("info", {}).get("collection") or self.collection_name
+        if not isinstance(name, str) or Path(name).name != name or name in (".", ".."):
+            raise ValueError(f"Invalid collection name in snapshot: {name!r}")
+        target = self.snapshot_path(name)
+        target.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp_target = target.with_name(target.name + ".tmp")
+        tmp_target.unlink(missing_ok=True)
+        try:
+            os.link(path, tmp_target)  # Same filesystem: no copy needed
+        except OSError:
+            shutil.copyfile(path, tmp_target)
+        os.replace(tmp_target, target)
+
+        self.forget_collection(name)
+        self.bump_generation()
+        return dict(header, collection=name)
+
+    def remove_snapshot(self, collection_name: Optional[str] = None) -> bool:
+        """Detach an imported snapshot; returns True if one was removed."""
+        name = collection_name or self.collection_name
+        path = self.snapshot_path(name)
+        if not path.exists():
+            return False
+        path.unlink()
+        self.forget_collection(name)
+        return True
+
+    def forget_collection(self, collection_name: str) -> None:
+        """Drop a cached collection handle."""
+        physical = self.resolve_collection(collection_name)
+        with self._collections_lock:
+            self._collections.pop(collection_name, None)
+            self._collections.pop(physical, None)
+            self._collections.pop(str(self.snapshot_path(collection_name)), None)
+
+    def delete_chunks(self, collection, ids: List[str]) -> None:
+        """Delete chunks by id in batches no larger than ChromaDB accepts."""
+        try:
+            batch_size = self.client.get_max_batch_size()
+        except AttributeError:
+            batch_size = getattr(self.client, "max_batch_size", DEFAULT_ADD_BATCH_SIZE)
+        for start in range(0, len(ids), batch_size):
+            collection.delete(ids=ids[start:start + batch_size])
+
+    def drop_abandoned_shadows(self, collection_name: Optional[str] = None) -> List[str]:
+        """Delete shadow collections left by rebuilds that never finished.
+
+        A shadow still named by a build checkpoint may belong to a running
+        or resumable build, so it is kept.
+        """
+        name = collection_name or self.collection_name
+        aliases = self._read_aliases()
+        keep = set(aliases["aliases"].values())
+        keep.update(entry["collection"] for entry in aliases["retired"])
+        checkpoint = self.load_checkpoint(name)
+        if checkpoint:
+            keep.add(checkpoint.get("target"))
+
+        pattern = re.compile(rf"^{re.escape(name)}_v\d+$")
+        dropped = []
+        for collection in self.client.list_collections():
+            physical = getattr(collection, "name", collection)
+            if pattern.match(physical) and physical not in keep:
+                self.drop_collection(physical)
+                dropped.append(physical)
+        return dropped
+
+    def storage_size(self) -> int:
+        """Total bytes used by the database directory."""
+        total = 0
+        for path in self.db_dir.rglob("*"):
+            try:
+                if path.is_file():
+                    total += path.stat().st_size
+            except OSError:
+                pass  # Removed while scanning
+        return total
+
+    def close_client(self) -> bool:
+        """Release the ChromaDB client so its SQLite file is no longer held open.
+
+        ChromaDB caches one system per path, so this stops every ChromaDB
+        client in the process; the next ``client`` access reopens it. Returns
+        False when this ChromaDB version can't release the system.
+        """
+        with self._client_lock:
+            client, self._client = self._client, None
+        with self._collections_lock:
+            self._collections.clear()
+        if client is None:
+            return True
+        clear_system_cache = getattr(client, "clear_system_cache", None)
+        if clear_system_cache is None:
+            return False
+        clear_system_cache()
+        return True
+
+    def compact(self) -> bool:
+        """VACUUM ChromaDB's SQLite store so freed pages go back to the OS."""
+        sqlite_path = self.db_dir / "chroma.sqlite3"
+        if not sqlite_path.exists():
+            return False
+        # Never VACUUM underneath our own open connections
+        if not self.close_client():
+            log_warning("Skipping compaction: this ChromaDB version can't release the database", quiet=self.quiet)
+            return False
+        try:
+            connection = sqlite3.connect(str(sqlite_path), timeout=30)
+            try:
+                connection.execute("VACUUM")
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            log_warning("Could not compact the database (is another process writing?)", e, quiet=self.quiet)
+            return False
+        return True
+
+    def list_collections(self) -> List[str]:
+        """List collection names in the database."""
+        # Older ChromaDB returns Collection objects, newer returns names
+        names = {
+            getattr(collection, "name", collection)
+            for collection in self.client.list_collections()
+        }
+        # Report logical names, not the physical collections behind them
+        aliases = self._read_aliases()
+        names -= set(aliases["aliases"].values())
+        names -= {entry["collection"] for entry in aliases["retired"]}
+        names.update(aliases["aliases"])
+        snapshot_dir = self.db_dir / "snapshots"
+        if snapshot_dir.exists():
+            names.update(path.stem for path in snapshot_dir.glob(f"*{SNAPSHOT_SUFFIX}"))
+        return sorted(names)
+
+    def _remember_collection(self, name: str, collection: Any) -> None:
+        """Store a collection handle, evicting the least recently used one.
+
+        Callers hold ``_collections_lock``.
+        """
+        self._collections[name] = collection
+        self._collections.move_to_end(name)
+        while len(self._collections) > self.max_handles:
+            self._collections.popitem(last=False)
+    
+    def get_stats(self, collection_name: Optional[str] = None) -> Dict[str, Any]:
+        """Get database statistics."""
+        try:
+            collection = self.get_collection(collection_name)
+            count = collection.count()
+
+            # Get source distribution
             all_data = collection.get()
-            self._documents_cache = all_data["documents"]
+            sources = {}
+            for meta in all_data["metadatas"]:
+                src = meta["source"]
+                sources[src] = sources.get(src, 0) + 1
+
+            return {
+                "total_chunks": count,
+                "sources": sources,
+                "db_path": str(self.db_dir),
+                "collection": collection_name or self.collection_name,
+            }
+        except Exception:
+            return {
+                "error": "Database not found. Run 'python raggy.py build' first to index your documents."
+            }
+
+
+class SearchEngine:
+    """Handles semantic search, hybrid search, and scoring operations."""
+    
+    def __init__(
+        self,
+        database_manager: DatabaseManager,
+        query_processor: QueryProcessor,
+        config: Dict[str, Any],
+        quiet: bool = False
+    ) -> None:
+        self.database_manager = database_manager
+        self.query_processor = query_processor
+        self.config = config
+        self.quiet = quiet
+        # Per-collection BM25 state, LRU-bounded like the collection handles
+        self._bm25_scorers: "OrderedDict[str, BM25Scorer]" = OrderedDict()
+        # Per-collection distinct metadata values for resolving filters
+        self._facets: "OrderedDict[str, Dict[str, List[str]]]" = OrderedDict()
+        # Per-collection query projection for dimension-reduced indexes
+        self._projections: "OrderedDict[str, Optional[DimensionReducer]]" = OrderedDict()
+        # Per-physical-collection sign-bit codes for the binary prefilter
+        self._binary_indexes: "OrderedDict[str, BinaryIndex]" = OrderedDict()
+        # Guards the caches above; concurrent misses on one key wait for a single build
+        self._cache_lock = threading.Lock()
+        self._build_locks: Dict[Tuple[int, str], threading.Lock] = {}
+        self._generation: Optional[int] = None
+    
+    def search(
+        self,
+        query: str,
+        embedding_model: Any,
+        n_results: int = DEFAULT_RESULTS,
+        hybrid: bool = False,
+        expand_query: bool = False,
+        show_scores: bool = None,
+        collection_name: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Search the vector database with enhanced capabilities.
+
+        ``filters`` may hold ``source`` (path or glob), ``file_type``
+        (e.g. "pdf") and ``section`` (case-sensitive header substring); they
+        are pushed down into the ChromaDB query so no result slots are wasted.
+        """
+        collection_name = collection_name or self.database_manager.collection_name
+
+        # Drop per-collection state if another process rebuilt the index
+        generation = self.database_manager.get_generation()
+        if generation != self._generation:
+            self.invalidate()
+            self._generation = generation
+
+        try:
+            collection = self.database_manager.get_collection(collection_name)
+        except Exception:
+            log_error("Database collection not found - run 'python raggy.py build' first", quiet=self.quiet)
+            return []
+
+        # Lease the collection so a blue/green swap can't drop it mid-query
+        with self.database_manager.lease(collection):
+            try:
+                # Process query
+                if expand_query:
+                    query_info = self.query_processor.process(query)
+                    processed_query = query_info["processed"]
+                    # Embed the query and its synonym rewrites, not the OR string
+                    query_variants = query_info.get("variants") or [processed_query]
+                else:
+                    must_have, must_not, processed_query = self.query_processor.parse_boolean(query)
+                    query_info = {
+                        "original": query,
+                        "type": "keyword",
+                        "boost_exact": False,
+                        "must_have": must_have,
+                        "must_not": must_not,
+                    }
+                    query_variants = [processed_query]
+                # Operators and excluded terms don't take part in scoring
+                scoring_query = (
+                    query
+                    if query_info["type"] == "exact"
+                    else self.query_processor.parse_boolean(query)[2] or query
+                )
+
+                # MMR needs a wider candidate pool and the candidate embeddings
+                use_mmr = (
+                    self.config["search"]["rerank"]
+                    and self.config["search"].get("rerank_strategy", DEFAULT_RERANK_STRATEGY) == "mmr"
+                )
+                n_candidates = n_results * 2 if hybrid else n_results  # Get more for hybrid filtering
+                include = ["documents", "metadatas", "distances"]
+                if use_mmr:
+                    n_candidates = max(n_candidates, n_results * MMR_CANDIDATE_MULTIPLIER)
+                    include.append("embeddings")
+
+                # Resolve metadata filters into where/where_document clauses
+                filter_kwargs = self._build_filter_kwargs(
+                    collection_name, collection, normalize_filters(filters)
+                )
+                if filter_kwargs is None:
+                    return []  # Filters match nothing in this collection
+
+                # Boolean constraints narrow the candidates before vector scoring
+                bm25_scorer = None
+                allowed = None
+                if query_info.get("must_have") or query_info.get("must_not"):
+                    bm25_scorer = self._get_bm25_scorer(collection_name, collection)
+                    allowed = bm25_scorer.match(
+                        query_info.get("must_have", []), query_info.get("must_not", [])
+                    )
+                    if not allowed:
+                        return []
+
+                # Get semantic results, embedding all query variants in one batch
+                if embedding_model is not None:
+                    query_embeddings = embedding_model.encode(query_variants)
+                    reducer = self._get_projection(collection)
+                    if reducer is not None:
+                        query_embeddings = reducer.transform(query_embeddings)
+                    query_kwargs = {
+                        "query_embeddings": [list(map(float, vector)) for vector in query_embeddings]
+                    }
+                else:
+                    query_kwargs = {"query_texts": query_variants}
+
+                binary_index = None
+                if (
+                    allowed is None
+                    and self.config["search"].get("binary_prefilter")
+                    and "query_embeddings" in query_kwargs
+                    and not filter_kwargs
+                ):
+                    binary_index = self._get_binary_index(collection)
+
+                if allowed is not None:
+                    results = self._query_prefiltered(
+                        collection, query_kwargs, bm25_scorer, allowed,
+                        n_candidates, include, filter_kwargs,
+                    )
+                elif binary_index is not None:
+                    results = self._query_binary(
+                        collection, binary_index, query_kwargs, n_candidates, include
+                    )
+                else:
+                    results = collection.query(
+                        n_results=n_candidates,
+                        include=include,
+                        **query_kwargs,
+                        **filter_kwargs,
+                    )
+                if len(query_variants) > 1:
+                    results = fuse_query_results(results, n_candidates)
+
+                formatted_results = []
+
+                # Get the collection's BM25 scorer for hybrid search
+                if hybrid and bm25_scorer is None:
+                    bm25_scorer = self._get_bm25_scorer(collection_name, collection)
+                elif not hybrid:
+                    bm25_scorer = None
+
+                for i in range(len(results["documents"][0])):
+                    distance = (
+                        results["distances"][0][i] if "distances" in results else None
+                    )
+
+                    # Normalize semantic similarity score
+                    semantic_score = (
+                        normalize_cosine_distance(distance)
+                        if distance is not None
+                        else 0
+                    )
+
+                    # Calculate keyword score if using hybrid search
+                    if bm25_scorer:
+                        doc_index = bm25_scorer.doc_index.get(results["ids"][0][i], -1)
+                        keyword_score = bm25_scorer.score(scoring_query, doc_index)
+                        # Combine scores
+                        final_score = normalize_hybrid_score(
+                            semantic_score,
+                            keyword_score,
+                            self.config["search"]["hybrid_weight"],
+                        )
+                    else:
+                        keyword_score = 0
+                        final_score = semantic_score
+
+                    # Apply exact match boost
+                    if (
+                        query_info.get("boost_exact")
+                        and query.lower() in results["documents"][0][i].lower()
+                    ):
+                        final_score = min(1.0, final_score * 1.5)
+
+                    formatted_results.append(
+                        {
+                            "text": results["documents"][0][i],
+                            "metadata": results["metadatas"][0][i],
+                            "semantic_score": semantic_score,
+                            "keyword_score": keyword_score,
+                            "final_score": final_score,
+                            "score_interpretation": interpret_score(final_score),
+                            "distance": distance,  # Keep for backward compatibility
+                            "similarity": final_score,  # Keep for backward compatibility
+                        }
+                    )
+
+                # Sort by final score, keeping candidate embeddings aligned
+                candidate_embeddings = None
+                if use_mmr and results.get("embeddings") is not None:
+                    candidate_embeddings = results["embeddings"][0]
+                order = sorted(
+                    range(len(formatted_results)),
+                    key=lambda j: formatted_results[j]["final_score"],
+                    reverse=True,
+                )
+                formatted_results = [formatted_results[j] for j in order]
+                if candidate_embeddings is not None:
+                    candidate_embeddings = [candidate_embeddings[j] for j in order]
+
+                # Rerank results if enabled, otherwise just limit results
+                if self.config["search"]["rerank"]:
+                    formatted_results = self._rerank_results(
+                        scoring_query, formatted_results, n_results, candidate_embeddings
+                    )
+                else:
+                    formatted_results = formatted_results[:n_results]
+
+                # Add highlighting if requested
+                show_scores = (
+                    show_scores
+                    if show_scores is not None
+                    else self.config["search"]["show_scores"]
+                )
+                if show_scores:
+                    # Compile the query terms once for all results
+                    highlighter = QueryHighlighter(
+                        scoring_query, self.config["search"]["context_chars"]
+                    )
+                    for result in formatted_results:
+                        result["highlighted_text"] = highlighter.highlight(result["text"])
+
+                return formatted_results
+
+            except Exception as e:
+                log_error("Search error", e, quiet=self.quiet)
+                return []
+
+    def _query_prefiltered(
+        self,
+        collection,
+        query_kwargs: Dict[str, Any],
+        bm25_scorer: BM25Scorer,
+        allowed: Set[int],
+        n_candidates: int,
+        include: List[str],
+        filter_kwargs: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """Vector-score only the chunks that satisfy the boolean constraints.
+
+        Small candidate sets (at most ``PREFILTER_EXACT_MAX`` chunks) are
+        scored exactly from their stored embeddings. Otherwise the index is
+        queried for ``PREFILTER_QUERY_FACTOR`` hits per candidate and the
+        excluded ones are dropped, widening k by the same factor while too
+        few allowed chunks survive.
+        """
+        import numpy as np
+
+        excluded = bm25_scorer.doc_count - len(allowed)
+        exact_limit = min(PREFILTER_EXACT_MAX, max(excluded, n_candidates))
+        if "query_embeddings" in query_kwargs and len(allowed) <= exact_limit:
+            return self._score_exact(
+                collection,
+                [bm25_scorer.doc_ids[i] for i in sorted(allowed)],
+                np.asarray(query_kwargs["query_embeddings"], dtype=np.float32),
+                n_candidates,
+                include,
+                filter_kwargs,
+            )
+
+        needed = min(bm25_scorer.doc_count, n_candidates + excluded)
+        n_query = min(needed, n_candidates * PREFILTER_QUERY_FACTOR)
+        allowed_ids = {bm25_scorer.doc_ids[i] for i in allowed}
+        while True:
+            results = collection.query(
+                n_results=n_query,
+                include=include,
+                **query_kwargs,
+                **filter_kwargs,
+            )
+            keeps = [
+                [i for i, doc_id in enumerate(ids) if doc_id in allowed_ids][:n_candidates]
+                for ids in results["ids"]
+            ]
+            if n_query >= needed or all(len(keep) >= n_candidates for keep in keeps):
+                break
+            # Excluded chunks took the hits; ask again with a wider k
+            n_query = min(needed, n_query * PREFILTER_QUERY_FACTOR)
+        for key in ["ids"] + include:
+            if results.get(key) is not None:
+                results[key] = [
+                    [column[i] for i in keep] for column, keep in zip(results[key], keeps)
+                ]
+        return results
+
+    def _query_binary(
+        self,
+        collection,
+        binary_index: BinaryIndex,
+        query_kwargs: Dict[str, Any],
+        n_candidates: int,
+        include: List[str],
+    ) -> Dict[str, Any]:
+        """Shortlist by Hamming distance over sign bits, then rescore exactly.
+
+        The shortlists of all query variants are rescored together from the
+        index's memory-mapped full-precision vectors, so distances match what
+        the vector index would have returned; only the winners' documents and
+        metadata are fetched from the collection.
+        """
+        import numpy as np
+
+        factor = self.config["search"].get("binary_rescore_factor", BINARY_RESCORE_FACTOR)
+        query_vectors = np.asarray(query_kwargs["query_embeddings"], dtype=np.float32)
+        shortlist = sorted({
+            i
+            for query_vector in query_vectors
+            for i in binary_index.search(query_vector, n_candidates * factor)
+        })
+        return self._score_exact(
+            collection,
+            [str(binary_index.ids[i]) for i in shortlist],
+            query_vectors,
+            n_candidates,
+            include,
+            {},
+            vectors=binary_index.vectors[shortlist],
+        )
+
+    def _score_exact(
+        self,
+        collection,
+        ids: List[str],
+        query_vectors: Any,
+        n_candidates: int,
+        include: List[str],
+        filter_kwargs: Dict[str, Any],
+        vectors: Any = None,
+    ) -> Dict[str, Any]:
+        """Cosine-score a set of chunks from their stored embeddings.
+
+        Embeddings are fetched in pages of ``EXACT_SCORE_PAGE`` ids unless
+        ``vectors`` (rows matching ``ids``) are given; documents and metadata
+        are fetched only for the chunks that make the top ``n_candidates`` of
+        some query.
+        """
+        import numpy as np
+
+        results: Dict[str, Any] = {key: [] for key in ["ids"] + include}
+        scored_ids: List[str] = list(ids) if vectors is not None else []
+        pages = [np.asarray(vectors, dtype=np.float32)] if vectors is not None and len(ids) else []
+        for start in range(0, len(ids) if vectors is None else 0, EXACT_SCORE_PAGE):
+            page = collection.get(
+                ids=ids[start:start + EXACT_SCORE_PAGE],
+                include=["embeddings"],
+                **filter_kwargs,
+            )
+            if page["ids"]:
+                scored_ids.extend(page["ids"])
+                pages.append(np.asarray(page["embeddings"], dtype=np.float32))
+        if not scored_ids:
+            return {key: [[] for _ in query_vectors] for key in results}
+
+        vectors = np.concatenate(pages)
+        vector_norms = np.linalg.norm(vectors, axis=1)
+        orders = []
+        for query_vector in query_vectors:
+            norms = vector_norms * (np.linalg.norm(query_vector) or 1.0)
+            norms[norms == 0] = 1.0
+            distances = 1.0 - (vectors @ query_vector) / norms
+            order = np.argsort(distances, kind="stable")[:n_candidates]
+            orders.append((order, distances))
+
+        top_ids = list(dict.fromkeys(scored_ids[i] for order, _ in orders for i in order))
+        data = collection.get(ids=top_ids, include=["documents", "metadatas"])
+        rows = {doc_id: i for i, doc_id in enumerate(data["ids"])}
+        for order, distances in orders:
+            order_ids = [scored_ids[i] for i in order]
+            results["ids"].append(order_ids)
+            results["documents"].append([data["documents"][rows[doc_id]] for doc_id in order_ids])
+            results["metadatas"].append([data["metadatas"][rows[doc_id]] for doc_id in order_ids])
+            results["distances"].append([float(distances[i]) for i in order])
+            if "embeddings" in include:
+                results["embeddings"].append(vectors[order])
+        return results
+
+    def invalidate(self, collection_name: Optional[str] = None) -> None:
+        """Drop cached BM25 state after the index changes (all collections if None)."""
+        with self._cache_lock:
+            if collection_name is None:
+                self._bm25_scorers.clear()
+                self._facets.clear()
+                self._projections.clear()
+                self._binary_indexes.clear()
+            else:
+                self._bm25_scorers.pop(collection_name, None)
+                self._facets.pop(collection_name, None)
+                self._projections.clear()  # Keyed by physical name
+                self._binary_indexes.clear()  # Keyed by physical name
+
+    def _cached(self, cache: "OrderedDict[str, Any]", key: str, build: Callable[[], Any]) -> Any:
+        """Get a per-collection cached value, building it at most once per miss.
+
+        Safe to call from AsyncUniversalRAG's worker threads: the LRU caches
+        are only touched under ``_cache_lock``, and threads missing the same
+        key wait on one build instead of each fitting their own.
+        """
+        with self._cache_lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+            build_lock = self._build_locks.setdefault((id(cache), key), threading.Lock())
+        with build_lock:
+            with self._cache_lock:
+                if key in cache:
+                    cache.move_to_end(key)
+                    return cache[key]
+            value = build()
+            with self._cache_lock:
+                cache[key] = value
+                cache.move_to_end(key)
+                while len(cache) > self.database_manager.max_handles:
+                    cache.popitem(last=False)
+                self._build_locks.pop((id(cache), key), None)
+        return value
+
+    def _build_filter_kwargs(
+        self, collection_name: str, collection, filters: Dict[str, List[str]]
+    ) -> Optional[Dict[str, Any]]:
+        """Translate normalized filters into ChromaDB query kwargs.
+
+        Returns None when the filters cannot match any chunk.
+        """
+        if not filters:
+            return {}
+
+        sources = filters.get("source")
+        if sources and any(glob.has_magic(pattern) for pattern in sources):
+            known_sources = self._get_facets(collection_name, collection)["source"]
+            sources = sorted(
+                {src for src in known_sources for pattern in sources if fnmatch.fnmatch(src, pattern)}
+            )
+            if not sources:
+                return None
+
+        kwargs: Dict[str, Any] = {}
+        section_headers = None
+        if filters.get("section"):
+            known_headers = self._get_facets(collection_name, collection)["section_header"]
+            # Case-sensitive like the $contains fallback, so both paths agree
+            section_headers = sorted(
+                {
+                    header for header in known_headers
+                    if any(section in header for section in filters["section"])
+                }
+            )
+            if not section_headers:
+                if known_headers:
+                    return None
+                # Simple chunks carry no headers; match the section text instead
+                contains = [{"$contains": section} for section in filters["section"]]
+                kwargs["where_document"] = (
+                    contains[0] if len(contains) == 1 else {"$or": contains}
+                )
 
-        self._bm25_scorer = BM25Scorer()
-        self._bm25_scorer.fit(self._documents_cache)
+        where = build_where_filter(sources, filters.get("file_type"), section_headers)
+        if where is not None:
+            kwargs["where"] = where
+        return kwargs
+
+    def _get_facets(self, collection_name: str, collection) -> Dict[str, List[str]]:
+        """Get distinct source and section_header values for a collection."""
+        def build() -> Dict[str, List[str]]:
+            metadatas = collection.get(include=["metadatas"])["metadatas"]
+            return {
+                key: sorted({meta[key] for meta in metadatas if meta.get(key)})
+                for key in ("source", "section_header")
+            }
+
+        return self._cached(self._facets, collection_name, build)
+
+    def _get_projection(self, collection) -> Optional[DimensionReducer]:
+        """Get the projection a reduced collection's queries must go through."""
+        return self._cached(
+            self._projections,
+            collection.name,
+            lambda: self.database_manager.load_projection(collection),
+        )
+
+    def _get_binary_index(self, collection) -> Optional[BinaryIndex]:
+        """Get the binary prefilter codes written for a collection by build.
+
+        None (plain vector search) for snapshots, which are already searched
+        exactly from memory-mapped vectors, and for collections built before
+        binary_prefilter was enabled.
+        """
+        def load() -> Optional[BinaryIndex]:
+            if isinstance(collection, SnapshotCollection):
+                return None
+            binary_index = BinaryIndex.load(self.database_manager.binary_index_path(collection.name))
+            if binary_index is None:
+                log_warning(
+                    "No binary prefilter codes for this index; run 'python raggy.py build' to write them",
+                    quiet=self.quiet,
+                )
+            return binary_index
+
+        return self._cached(self._binary_indexes, collection.name, load)
+
+    def _get_bm25_scorer(self, collection_name: str, collection) -> BM25Scorer:
+        """Get or fit the BM25 scorer for a collection."""
+        def build() -> BM25Scorer:
+            scorer = None
+            if hasattr(collection, "load_bm25"):
+                # Snapshots carry their own BM25 statistics
+                scorer = collection.load_bm25()
+            if scorer is None:
+                # Prefer statistics persisted for the current index generation
+                scorer = BM25Scorer.load(
+                    self.database_manager.bm25_state_path(collection_name),
+                    self.database_manager.get_generation(),
+                )
+            if scorer is None:
+                # Get all documents from collection
+                all_data = collection.get(include=["documents"])
+                scorer = BM25Scorer()
+                scorer.fit(all_data["documents"], all_data["ids"])
+            return scorer
+
+        return self._cached(self._bm25_scorers, collection_name, build)
 
     def _rerank_results(
-        self, query: str, results: List[Dict[str, Any]]
+        self,
+        query: str,
+        results: List[Dict[str, Any]],
+        n_results: Optional[int] = None,
+        embeddings: Optional[Any] = None,
     ) -> List[Dict[str, Any]]:
-        """Rerank results to improve diversity and relevance."""
+        """Rerank results to improve diversity and relevance.
+
+        Uses maximal marginal relevance over the candidate embeddings when
+        they are available, otherwise a linear-time source-diversity pass.
+        """
+        n_results = len(results) if n_results is None else n_results
         if len(results) <= 2:
-            return results
+            return results[:n_results]
+
+        if embeddings is not None and len(embeddings) == len(results):
+            lambda_mult = self.config["search"].get("mmr_lambda", DEFAULT_MMR_LAMBDA)
+            try:
+                selected = mmr_select(
+                    [result["final_score"] for result in results],
+                    embeddings,
+                    n_results,
+                    lambda_mult,
+                )
+                return [results[i] for i in selected]
+            except (ImportError, ValueError) as e:
+                log_warning("MMR reranking unavailable, using source diversity", e, quiet=self.quiet)
+
+        return self._rerank_by_source(results[:n_results])
 
-        reranked = []
+    def _rerank_by_source(
+        self, results: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Promote the best result from each source, then keep score order."""
+        diverse = []
+        remaining = []
         used_sources = set()
+        quota = len(results) // 2
 
-        # First pass: take best result from each source
+        # Single pass: best result per source up to the quota, rest in order
         for result in results:
             source = result["metadata"]["source"]
-            if source not in used_sources:
-                reranked.append(result)
+            if len(diverse) < quota and source not in used_sources:
+                diverse.append(result)
                 used_sources.add(source)
-                if len(reranked) >= len(results) // 2:
-                    break
-
-        # Second pass: add remaining results
-        for result in results:
-            if result not in reranked:
-                reranked.append(result)
+            else:
+                remaining.append(result)
 
-        return reranked[: len(results)]
+        return diverse + remaining
 
     def _highlight_matches(
         self, query: str, text: str, context_chars: int = None
     ) -> str:
         """Highlight matching terms in text."""
         context_chars = context_chars or self.config["search"]["context_chars"]
-
-        # Simple highlighting - find first match and show context
-        query_terms = re.findall(r"\b\w+\b", query.lower())
-        text_lower = text.lower()
-
-        # Find first match position
-        match_pos = -1
-        for term in query_terms:
-            pos = text_lower.find(term)
-            if pos != -1:
-                match_pos = pos
-                break
-
-        if match_pos == -1:
-            # No direct match, return beginning
-            return text[:context_chars] + "..." if len(text) > context_chars else text
-
-        # Calculate context window around match
-        start = max(0, match_pos - context_chars // 2)
-        end = min(len(text), match_pos + context_chars // 2)
-
-        # Extend to word boundaries
-        while start > 0 and text[start] != " ":
-            start -= 1
-        while end < len(text) and text[end] != " ":
-            end += 1
-
-        excerpt = text[start:end].strip()
-        if start > 0:
-            excerpt = "..." + excerpt
-        if end < len(text):
-            excerpt = excerpt + "..."
-
-        return excerpt
+        return QueryHighlighter(query, context_chars).highlight(text)
 
 
 class UniversalRAG:
@@ -1737,23 +5096,29 @@ class UniversalRAG:
         chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
         quiet: bool = False,
         config_path: Optional[str] = None,
+        collection_name: str = DEFAULT_COLLECTION,
+        embedding_backend: Optional[str] = None,
     ) -> None:
         self.docs_dir = Path(docs_dir)
         self.db_dir = Path(db_dir)
         self.model_name = model_name
+        self.collection_name = collection_name
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
         self.quiet = quiet
 
         # Load configuration
         self.config = load_config(config_path)
+        self.embedding_backend = (
+            embedding_backend or self.config["embedding"]["backend"]
+        )
 
         # Initialize components
         self.document_processor = DocumentProcessor(
-            self.docs_dir, self.config, quiet=self.quiet
+            self.docs_dir, self.config, quiet=self.quiet, cache_dir=self.db_dir
         )
         self.database_manager = DatabaseManager(
-            self.db_dir, quiet=self.quiet
+            self.db_dir, collection_name=self.collection_name, quiet=self.quiet
         )
         self.query_processor = QueryProcessor(
             self.config["search"].get("expansions", {})
@@ -1765,21 +5130,97 @@ class UniversalRAG:
             quiet=self.quiet
         )
 
+        self.search_cache = SearchResultCache(
+            self.config["search"].get("result_cache_size", MAX_CACHE_SIZE),
+            self.config["search"].get("result_cache_ttl", CACHE_TTL),
+        )
+
         # Lazy-loaded attributes
         self._embedding_model = None
+        self._model_lock = threading.Lock()
+        self.model_load_seconds: Optional[float] = None
 
     @property
     def embedding_model(self):
         """Lazy-load embedding model."""
         if self._embedding_model is None:
-            if not self.quiet:
-                print(f"Loading embedding model ({self.model_name})...")
-            self._embedding_model = SentenceTransformer(self.model_name)
+            # Guard against concurrent loads from worker threads
+            with self._model_lock:
+                if self._embedding_model is None:
+                    if not self.quiet:
+                        print(
+                            f"Loading embedding model ({self.model_name}, "
+                            f"{self.embedding_backend} backend)..."
+                        )
+                    load_start = time.time()
+                    self._embedding_model = self._load_embedding_model(
+                        self.embedding_backend
+                    )
+                    self.model_load_seconds = time.time() - load_start
         return self._embedding_model
 
-    def build(self, force_rebuild: bool = False) -> None:
-        """Build or update the vector database."""
+    def _start_model_warmup(self) -> Optional[threading.Thread]:
+        """Start loading the embedding model in a background thread.
+
+        The load releases the GIL for most of its I/O and tensor setup, so it
+        overlaps with document extraction. Builds start it only once they
+        find chunks that need encoding. A failed warm-up is simply retried
+        (and reported) on first real use of ``embedding_model``.
+        """
+        if self._embedding_model is not None:
+            return None
+        if not self.config["embedding"].get("warm_start", True):
+            return None
+
+        def warm_up() -> None:
+            try:
+                self.embedding_model
+            except Exception:
+                pass
+
+        thread = threading.Thread(target=warm_up, name="raggy-model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def _load_embedding_model(self, backend: str, fallback: bool = True) -> Any:
+        """Load the configured model with the given backend."""
+        embedding_config = self.config["embedding"]
+        return load_embedding_model(
+            self.model_name,
+            backend,
+            quantize=embedding_config.get("quantize", True),
+            cache_dir=embedding_config.get("cache_dir", DEFAULT_MODEL_CACHE_DIR),
+            quantization_config=embedding_config.get("quantization_config"),
+            quiet=self.quiet,
+            fallback=fallback,
+        )
+
+    def build(
+        self,
+        force_rebuild: bool = False,
+        collection_name: Optional[str] = None,
+        shard: Optional[Tuple[int, int]] = None,
+        shard_dir: str = DEFAULT_SHARD_DIR,
+        resume: bool = False,
+    ) -> None:
+        """Build or update the vector database (default collection if None).
+
+        Chunks are embedded and committed in batches of
+        ``embedding.commit_chunks``, each followed by a checkpoint of the
+        completed files and their chunk ids; ``resume`` continues an
+        interrupted build from its last committed batch. Chunks already
+        stored under the same id and text keep their embeddings, so only new
+        or edited chunks (e.g. changed PDF pages) are embedded again.
+
+        With ``shard=(i, N)`` only the i-th of N deterministic document
+        subsets is processed and written to a shard artifact in
+        ``shard_dir`` instead of the database; see merge_shards().
+        """
+        import numpy as np
+
         start_time = time.time()
+        collection_name = collection_name or self.collection_name
+        warmup = None
 
         # Find documents
         files = self.document_processor.find_documents()
@@ -1791,52 +5232,625 @@ class UniversalRAG:
                 print("Example: docs/readme.md, docs/guide.pdf, docs/manual.docx, docs/notes.txt")
             return
 
+        if shard is not None:
+            self._build_shard(files, shard, shard_dir, start_time)
+            return
+
         if not self.quiet:
             print(f"Found {len(files)} documents")
 
+        # Resume from the last committed batch, or start a fresh checkpoint
+        checkpoint = self.database_manager.load_checkpoint(collection_name)
+        if not resume:
+            if checkpoint is not None and not self.quiet:
+                print("Found an interrupted build; starting over (use --resume to continue it)")
+            checkpoint = None
+        elif checkpoint is None:
+            if not self.quiet:
+                print("No checkpoint found, starting a fresh build")
+        elif (
+            checkpoint.get("model_name") != self.model_name
+            or checkpoint.get("force_rebuild") != force_rebuild
+        ):
+            log_warning("Checkpoint is from a different model or build mode, starting over", quiet=self.quiet)
+            checkpoint = None
+
+        collection = self.database_manager.begin_build(
+            collection_name,
+            force_rebuild,
+            target=checkpoint["target"] if checkpoint else None,
+            model_name=self.model_name,
+        )
+        if checkpoint is None or checkpoint["target"] != collection.name:
+            checkpoint = {
+                "model_name": self.model_name,
+                "force_rebuild": force_rebuild,
+                "target": collection.name,
+                "files": {},
+            }
+        else:
+            # Files changed or deleted since they were committed must not keep their old chunks
+            current_files = {path.relative_to(self.docs_dir).as_posix(): path for path in files}
+            changed = []
+            for relative, entry in checkpoint["files"].items():
+                path = current_files.get(relative)
+                try:
+                    stat = path.stat() if path is not None else None
+                except OSError:
+                    stat = None
+                if stat is None or (entry["size"], entry["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+                    changed.append(relative)
+            for relative in changed:
+                del checkpoint["files"][relative]
+            if not self.quiet:
+                print(f"Resuming: {len(checkpoint['files'])} files already committed")
+                if changed:
+                    print(f"{len(changed)} committed files changed or were removed since, redoing them")
+        if force_rebuild and collection.count():
+            # Drop chunks that no checkpointed file owns: a batch written but never
+            # checkpointed, or files that changed or vanished since their commit
+            committed = {doc_id for entry in checkpoint["files"].values() for doc_id in entry["ids"]}
+            stale = [doc_id for doc_id in collection.get(include=[])["ids"] if doc_id not in committed]
+            if stale:
+                self.database_manager.delete_chunks(collection, stale)
+        self.database_manager.save_checkpoint(checkpoint, collection_name)
+
+        # Unchanged chunks keep their embeddings; a rebuild finds them in the live collection
+        reuse_from = self._embedding_source(collection_name, collection) if force_rebuild else collection
+        pending_documents: List[Dict[str, Any]] = []
+        pending_files: Dict[str, Dict[str, Any]] = {}
+        embedding_model = None
+        encode_pool = None
+        reused_chunks = 0
+
+        def get_model() -> Any:
+            nonlocal embedding_model
+            if embedding_model is None:
+                embedding_model = self._wait_for_model(warmup, start_time)
+            return embedding_model
+
+        reducer, prefit = self._prepare_reducer(collection, files, get_model)
+        commit_chunks = self.config["embedding"].get("commit_chunks", DEFAULT_COMMIT_CHUNKS)
+        budget = self._memory_budget(commit_chunks)
+
+        def commit() -> None:
+            nonlocal encode_pool, pending_documents, pending_files, reused_chunks
+            sizes = budget.sizes if budget else {}
+            if pending_documents:
+                # Chunks already stored with the same id and text keep their embeddings
+                stored = (
+                    self.database_manager.get_stored_embeddings(reuse_from, pending_documents)
+                    if reuse_from is not None
+                    else {}
+                )
+                fresh = [doc for doc in pending_documents if doc["id"] not in stored]
+                # Chunks encoded to fit the projection are not encoded again
+                sampled = {
+                    doc["id"]: prefit.pop(doc["id"])[1]
+                    for doc in fresh
+                    if doc["id"] in prefit and prefit[doc["id"]][0] == doc["text"]
+                }
+                to_encode = [doc for doc in fresh if doc["id"] not in sampled]
+                fresh_embeddings = iter(())
+                if fresh:
+                    encoded = iter(())
+                    if to_encode:
+                        if encode_pool is None:
+                            # One worker pool serves every commit of the build
+                            encode_pool = self._start_encode_pool(get_model(), len(to_encode))
+                        encoded = iter(self._encode_chunks(
+                            get_model(),
+                            to_encode,
+                            batch_size=sizes.get("batch_size"),
+                            token_budget=sizes.get("token_budget"),
+                            pool=encode_pool,
+                        ))
+                    embeddings = np.asarray([
+                        sampled[doc["id"]] if doc["id"] in sampled else next(encoded)
+                        for doc in fresh
+                    ], dtype=np.float32)
+                    if reducer is not None:
+                        embeddings = reducer.transform(embeddings)
+                    fresh_embeddings = iter(embeddings)
+                reused_chunks += len(stored)
+                embeddings = np.asarray([
+                    stored[doc["id"]] if doc["id"] in stored else next(fresh_embeddings)
+                    for doc in pending_documents
+                ], dtype=np.float32)
+                self.database_manager.add_documents(
+                    collection,
+                    pending_documents,
+                    embeddings,
+                    upsert=True,
+                    batch_size=sizes.get("insert_batch_size"),
+                )
+            checkpoint["files"].update(pending_files)
+            self.database_manager.save_checkpoint(checkpoint, collection_name)
+            if budget:
+                budget.adapt(len(pending_documents))
+            pending_documents, pending_files = [], {}
+
+        # Process each document, committing a batch every commit_chunks chunks
+        # (sooner when a memory budget is set and pending chunks push RSS near its cap)
+        skipped = 0
+        needs_model = embedding_model is not None  # Already loaded to fit a projection
+        try:
+            with self.document_processor.pdf_pool():
+                for i, file_path in enumerate(files, 1):
+                    relative = file_path.relative_to(self.docs_dir).as_posix()
+                    stat = file_path.stat()
+                    done = checkpoint["files"].get(relative)
+                    if done and done["size"] == stat.st_size and done["mtime_ns"] == stat.st_mtime_ns:
+                        skipped += 1
+                        continue
+
+                    if not self.quiet:
+                        print(f"[{i}/{len(files)}] Processing {file_path.name}...")
+                    docs = self.document_processor.process_document(file_path)
+                    if not needs_model and docs and (
+                        reuse_from is None
+                        or self.database_manager.has_unstored_chunks(reuse_from, docs)
+                    ):
+                        # Load the model alongside the remaining extraction, now that it is needed
+                        needs_model = True
+                        warmup = self._start_model_warmup()
+                    pending_documents.extend(docs)
+                    pending_files[relative] = {
+                        "size": stat.st_size,
+                        "mtime_ns": stat.st_mtime_ns,
+                        "ids": [doc["id"] for doc in docs],
+                    }
+                    if budget:
+                        commit_chunks = budget.sizes["commit_chunks"]
+                        if budget.should_commit_early(len(pending_documents)):
+                            commit()
+                            continue
+                    if commit_chunks and len(pending_documents) >= commit_chunks:
+                        commit()
+            commit()
+        finally:
+            if encode_pool is not None:
+                embedding_model.stop_multi_process_pool(encode_pool)
+            if budget:
+                budget.stop()
+
+        if budget:
+            if not self.quiet:
+                print(budget.summary())
+            if budget.baseline_over:
+                log_warning(
+                    "The loaded model and index alone exceed max_memory_mb's high watermark; "
+                    "batch sizes were not reduced, raise the cap",
+                    quiet=self.quiet,
+                )
+            elif budget.peak > budget.limit:
+                log_warning(
+                    "Peak RSS exceeded max_memory_mb; lower the batch sizes or raise the cap",
+                    quiet=self.quiet,
+                )
+        if skipped and not self.quiet:
+            print(f"Skipped {skipped} files committed by the interrupted build")
+        if reused_chunks and not self.quiet:
+            print(f"Reused stored embeddings for {reused_chunks} unchanged chunks")
+
+        total_chunks = sum(len(entry["ids"]) for entry in checkpoint["files"].values())
+        if not total_chunks:
+            self.database_manager.abort_build(collection, force_rebuild)
+            self.database_manager.clear_checkpoint(collection_name)
+            self._report_no_content()
+            return
+
+        self.database_manager.finish_build(
+            collection_name,
+            collection,
+            force_rebuild,
+            binary_index=self.config["search"].get("binary_prefilter", False),
+        )
+        self.database_manager.clear_checkpoint(collection_name)
+        self.search_engine.invalidate(collection_name)
+
+        elapsed = time.time() - start_time
+        print(
+            f"{SYMBOLS['success']} Successfully indexed {total_chunks} chunks from {len(files)} files"
+        )
+        print(f"Database saved to: {self.db_dir} (collection: {collection_name})")
+        if not self.quiet:
+            print(f"Build completed in {elapsed:.1f} seconds")
+
+    def _build_shard(
+        self,
+        files: List[Path],
+        shard: Tuple[int, int],
+        shard_dir: str,
+        start_time: float,
+    ) -> None:
+        """Process one shard's documents into a shard artifact."""
+        import numpy as np
+
+        total_files = len(files)
+        files = select_shard(files, self.docs_dir, *shard)
+        if not self.quiet:
+            print(f"Shard {shard[0]}/{shard[1]}: {len(files)} of {total_files} documents")
+        warmup = self._start_model_warmup() if files else None
+
         # Process each document
         all_documents = []
-        for i, file_path in enumerate(files, 1):
-            if not self.quiet:
-                print(f"[{i}/{len(files)}] Processing {file_path.name}...")
-            docs = self.document_processor.process_document(file_path)
-            all_documents.extend(docs)
+        with self.document_processor.pdf_pool():
+            for i, file_path in enumerate(files, 1):
+                if not self.quiet:
+                    print(f"[{i}/{len(files)}] Processing {file_path.name}...")
+                docs = self.document_processor.process_document(file_path)
+                all_documents.extend(docs)
 
         if not all_documents:
-            log_error("No content could be extracted from documents", quiet=self.quiet)
-            if not self.quiet:
-                print("This could mean:")
-                print("- PDF files are corrupted or password-protected")
-                print("- Word documents (.docx) are corrupted")
-                print("- Text files are empty or have encoding issues")
-                print("- Markdown files are empty")
-                print("- Files are not readable")
-                print("Check your files and try again.")
+            # Still record the shard so merge can tell it completed
+            path = self._write_shard(shard, shard_dir, [], np.zeros((0, 0)), len(files))
+            print(f"{SYMBOLS['success']} Shard {shard[0]}/{shard[1]} has no content, wrote empty {path}")
             return
 
-        if not self.quiet:
-            print(f"Generated {len(all_documents)} text chunks")
-            print("Generating embeddings...")
+        embedding_model = self._wait_for_model(warmup, start_time)
+        embeddings = self._encode_chunks(embedding_model, all_documents)
+
+        path = self._write_shard(shard, shard_dir, all_documents, embeddings, len(files))
+        elapsed = time.time() - start_time
+        print(
+            f"{SYMBOLS['success']} Wrote shard {shard[0]}/{shard[1]} with {len(all_documents)} chunks from {len(files)} files to {path}"
+        )
+        if not self.quiet:
+            print(f"Shard build completed in {elapsed:.1f} seconds")
+
+    def _wait_for_model(self, warmup: Optional[threading.Thread], start_time: float) -> Any:
+        """Get the embedding model, reporting how its load overlapped extraction."""
+        extraction_seconds = time.time() - start_time
+        loaded_here = warmup is not None or self._embedding_model is None
+        wait_start = time.time()
+        embedding_model = self.embedding_model  # Blocks until a warm-up finishes
+        model_wait_seconds = time.time() - wait_start
+
+        if not self.quiet:
+            if loaded_here and self.model_load_seconds is not None:
+                hidden = self.model_load_seconds - model_wait_seconds if warmup else 0.0
+                print(
+                    f"Discovery and extraction took {extraction_seconds:.1f}s; "
+                    f"model load took {self.model_load_seconds:.1f}s "
+                    f"({max(0.0, hidden):.1f}s overlapped with extraction)"
+                )
+            else:
+                print(f"Discovery and extraction took {extraction_seconds:.1f}s")
+        return embedding_model
+
+    def _memory_budget(self, commit_chunks: int) -> Optional[MemoryBudget]:
+        """Start RSS tracking for a build when ``embedding.max_memory_mb`` is set."""
+        embedding_config = self.config["embedding"]
+        max_memory_mb = embedding_config.get("max_memory_mb")
+        if not max_memory_mb:
+            return None
+        if current_rss() is None:
+            log_warning("Can't read current RSS (needs /proc or psutil), ignoring max_memory_mb", quiet=self.quiet)
+            return None
+        if embedding_config.get("workers", DEFAULT_ENCODE_WORKERS) != 1:
+            log_warning("max_memory_mb only tracks this process, not encode workers", quiet=self.quiet)
+        try:
+            insert_batch_size = self.database_manager.client.get_max_batch_size()
+        except AttributeError:
+            insert_batch_size = getattr(
+                self.database_manager.client, "max_batch_size", DEFAULT_ADD_BATCH_SIZE
+            )
+        return MemoryBudget(
+            max_memory_mb,
+            {
+                "commit_chunks": commit_chunks,
+                "batch_size": embedding_config.get("batch_size", DEFAULT_ENCODE_BATCH_SIZE),
+                "token_budget": embedding_config.get("token_budget", DEFAULT_TOKEN_BUDGET),
+                "insert_batch_size": insert_batch_size,
+            },
+        ).start()
+
+    def _embedding_source(self, collection_name: str, shadow) -> Optional[Any]:
+        """Live collection whose stored embeddings a rebuild into ``shadow`` may reuse.
+
+        Only a collection recorded as embedded by the same model qualifies,
+        and only when neither it nor this build uses dimension reduction
+        (a new projection would not match the stored vectors).
+        """
+        live_name = self.database_manager.resolve_collection(collection_name)
+        if live_name == shadow.name or self.config["embedding"].get("reduce_dim"):
+            return None
+        try:
+            live = self.database_manager.client.get_collection(live_name)
+        except Exception:
+            return None  # First build: nothing to reuse
+        if (getattr(live, "metadata", None) or {}).get("embedding_model") != self.model_name:
+            return None
+        if self.database_manager.load_projection(live) is not None:
+            return None
+        return live
+
+    def _start_encode_pool(self, embedding_model: Any, n_chunks: int) -> Optional[Any]:
+        """Start the build's encode worker pool once a commit is big enough to use it."""
+        embedding_config = self.config["embedding"]
+        workers = resolve_encode_workers(embedding_config.get("workers", DEFAULT_ENCODE_WORKERS))
+        batch_size = embedding_config.get("batch_size", DEFAULT_ENCODE_BATCH_SIZE)
+        # Small jobs don't amortize the worker startup cost
+        if workers <= 1 or n_chunks < workers * batch_size:
+            return None
+        return start_encode_pool(embedding_model, workers, self.quiet)
+
+    def _encode_chunks(
+        self,
+        embedding_model: Any,
+        documents: List[Dict[str, Any]],
+        batch_size: Optional[int] = None,
+        token_budget: Optional[int] = None,
+        pool: Optional[Any] = None,
+    ) -> Any:
+        """Embed chunk texts with the configured (or given) build-time batching."""
+        if not self.quiet:
+            print(f"Generating embeddings for {len(documents)} text chunks...")
+        embedding_config = self.config["embedding"]
+        if batch_size is None:
+            batch_size = embedding_config.get("batch_size", DEFAULT_ENCODE_BATCH_SIZE)
+        if token_budget is None:
+            token_budget = embedding_config.get("token_budget", DEFAULT_TOKEN_BUDGET)
+        return encode_documents(
+            embedding_model,
+            [doc["text"] for doc in documents],
+            batch_size=batch_size,
+            workers=embedding_config.get("workers", DEFAULT_ENCODE_WORKERS),
+            quiet=self.quiet,
+            token_budget=token_budget,
+            pool=pool,
+        )
+
+    def _fit_reducer(self, embeddings: Any) -> Optional[DimensionReducer]:
+        """Fit the configured dimension reduction (None when it is off or can't apply)."""
+        reduce_dim = self.config["embedding"].get("reduce_dim")
+        if not reduce_dim:
+            return None
+        method = self.config["embedding"].get("reduce_method", "pca")
+        try:
+            reducer = DimensionReducer.fit(embeddings, reduce_dim, method)
+        except ValueError as e:
+            log_warning(f"Keeping full-size embeddings: {e}", quiet=self.quiet)
+            return None
+        if not self.quiet:
+            print(f"Reducing embeddings from {reducer.source_dim} to {reducer.dim} dimensions ({method})")
+        return reducer
+
+    def _prepare_reducer(
+        self, collection, files: List[Path], get_model: Callable[[], Any]
+    ) -> Tuple[Optional[DimensionReducer], Dict[str, Tuple[str, Any]]]:
+        """Get the projection a build's embeddings go through.
+
+        Collections keep the projection they were created with. For an empty
+        collection a new one is fitted before the first commit, on up to
+        ``REDUCTION_FIT_SAMPLE`` chunks drawn from across the document set;
+        their full-size embeddings are returned by chunk id (with the text)
+        so the build does not encode them again.
+        """
+        reducer = self.database_manager.load_projection(collection)
+        if reducer is not None or not self.config["embedding"].get("reduce_dim"):
+            return reducer, {}
+        if collection.count():
+            log_warning(
+                "Collection holds full-size embeddings; run 'rebuild' to reduce them",
+                quiet=self.quiet,
+            )
+            return None, {}
+
+        method = self.config["embedding"].get("reduce_method", "pca")
+        if not self.quiet:
+            print(f"Sampling chunks across {len(files)} files to fit the {method} projection...")
+        sample = self._reduction_sample(files, REDUCTION_FIT_SAMPLE if method == "pca" else 1)
+        if not sample:
+            return None, {}
+        embeddings = self._encode_chunks(get_model(), sample)
+        reducer = self._fit_reducer(embeddings)
+        if reducer is None:
+            return None, {}
+        reducer.fit_ids = [doc["id"] for doc in sample]
+        self.database_manager.save_projection(collection, reducer)
+        return reducer, {
+            doc["id"]: (doc["text"], vector) for doc, vector in zip(sample, embeddings)
+        }
+
+    def _reduction_sample(self, files: List[Path], size: int) -> List[Dict[str, Any]]:
+        """Up to ``size`` chunks spread over the documents, for fitting a projection.
+
+        Files are visited in a fixed shuffled order and each contributes an
+        evenly spaced share of its chunks, so no single file or folder
+        dominates the sample.
+        """
+        order = random.Random(len(files)).sample(files, len(files))
+        per_file = max(1, -(-size // len(files)))
+        sample: List[Dict[str, Any]] = []
+        with self.document_processor.pdf_pool():
+            for file_path in order:
+                docs = self.document_processor.process_document(file_path)
+                step = max(1, len(docs) // per_file)
+                sample.extend(docs[::step][:per_file])
+                if len(sample) >= size:
+                    break
+        return sample[:size]
+
+    def _report_no_content(self) -> None:
+        """Explain why a build produced no chunks."""
+        log_error("No content could be extracted from documents", quiet=self.quiet)
+        if not self.quiet:
+            print("This could mean:")
+            print("- PDF files are corrupted or password-protected")
+            print("- Word documents (.docx) are corrupted")
+            print("- Text files are empty or have encoding issues")
+            print("- Markdown files are empty")
+            print("- Files are not readable")
+            print("Check your files and try again.")
+
+    def _write_shard(
+        self,
+        shard: Tuple[int, int],
+        shard_dir: str,
+        documents: List[Dict[str, Any]],
+        embeddings: Any,
+        file_count: int,
+    ) -> Path:
+        """Write a shard artifact with its own BM25 statistics."""
+        bm25 = BM25Scorer()
+        bm25.fit([doc["text"] for doc in documents], [doc["id"] for doc in documents])
+        path = Path(shard_dir) / SHARD_FILE_TEMPLATE.format(index=shard[0], count=shard[1])
+        info = {
+            "shard_index": shard[0],
+            "shard_count": shard[1],
+            "model_name": self.model_name,
+            "embedding_backend": self.embedding_backend,
+            "files": file_count,
+            "chunks": len(documents),
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        write_shard_artifact(path, documents, embeddings, bm25.state_dict(), info)
+        return path
+
+    def merge_shards(
+        self, shard_paths: List[Path], collection_name: Optional[str] = None
+    ) -> bool:
+        """Merge shard artifacts into one collection with global BM25 statistics."""
+        import numpy as np
+
+        collection_name = collection_name or self.collection_name
+        if not shard_paths:
+            log_error("No shard files found", quiet=self.quiet)
+            return False
+
+        shards = []
+        for path in sorted(shard_paths):
+            try:
+                shards.append(read_shard_artifact(path))
+            except (OSError, ValueError, KeyError) as e:
+                log_error(f"Could not read shard {path.name}", e, quiet=self.quiet)
+                return False
+
+        # All shards must come from the same split and embedding model
+        counts = {shard["info"]["shard_count"] for shard in shards}
+        models = {shard["info"]["model_name"] for shard in shards}
+        indices = sorted(shard["info"]["shard_index"] for shard in shards)
+        if len(counts) != 1 or indices != list(range(1, counts.pop() + 1)):
+            log_error(f"Incomplete or mixed shard set (found shards {indices})", quiet=self.quiet)
+            return False
+        if models != {self.model_name}:
+            log_error(
+                f"Shards were embedded with {', '.join(sorted(models))}, not {self.model_name}",
+                quiet=self.quiet,
+            )
+            return False
+
+        documents = []
+        embedding_parts = []
+        for shard in shards:
+            if shard["documents"]:
+                documents.extend(shard["documents"])
+                embedding_parts.append(shard["embeddings"])
+
+        if not documents:
+            log_error("Shards contain no chunks", quiet=self.quiet)
+            return False
+
+        if not self.quiet:
+            print(f"Merging {len(shards)} shards ({len(documents)} chunks) into '{collection_name}'...")
+
+        embeddings = np.vstack(embedding_parts)
+        self.database_manager.build_index(
+            documents,
+            embeddings,
+            force_rebuild=True,
+            collection_name=collection_name,
+            reducer=self._fit_reducer(embeddings),
+            model_name=self.model_name,
+            binary_index=self.config["search"].get("binary_prefilter", False),
+        )
+
+        # Global idf needs document frequencies summed across all shards
+        bm25 = BM25Scorer.from_states([shard["bm25"] for shard in shards])
+        bm25.save(
+            self.database_manager.bm25_state_path(collection_name),
+            self.database_manager.get_generation(),
+        )
+        self.search_engine.invalidate(collection_name)
+
+        print(
+            f"{SYMBOLS['success']} Merged {len(shards)} shards: {len(documents)} chunks in collection '{collection_name}'"
+        )
+        return True
+
+    def export_snapshot(
+        self,
+        path: Optional[Path] = None,
+        collection_name: Optional[str] = None,
+        dtype: str = DEFAULT_SNAPSHOT_DTYPE,
+    ) -> Optional[Path]:
+        """Export a collection to a portable snapshot file.
+
+        Without ``path`` the file is named after the collection and its
+        content hash, e.g. ``raggy-project_docs-1a2b3c4d5e6f.snap``.
+        """
+        collection_name = collection_name or self.collection_name
+        target = path or Path(f"raggy-{collection_name}{SNAPSHOT_SUFFIX}")
+        start_time = time.time()
+        try:
+            content_hash = self.database_manager.export_snapshot(
+                target,
+                collection_name,
+                dtype=dtype,
+                info={"model_name": self.model_name, "raggy_version": __version__},
+            )
+        except Exception as e:
+            log_error(f"Could not export collection '{collection_name}'", e, quiet=self.quiet)
+            return None
+
+        if path is None:
+            named = target.with_name(f"raggy-{collection_name}-{content_hash[:12]}{SNAPSHOT_SUFFIX}")
+            os.replace(target, named)
+            target = named
+
+        size_mb = target.stat().st_size / (1024 * 1024)
+        print(
+            f"{SYMBOLS['success']} Exported '{collection_name}' to {target} "
+            f"({size_mb:.1f} MB, {dtype}, {time.time() - start_time:.1f}s)"
+        )
+        return target
+
+    def import_snapshot(self, path: Path, collection_name: Optional[str] = None) -> bool:
+        """Verify a snapshot and serve it as a collection without re-indexing.
+
+        The collection is the one named in the snapshot header unless
+        ``collection_name`` is given.
+        """
+        try:
+            header = read_snapshot_header(path)
+        except (OSError, ValueError) as e:
+            log_error(f"Could not read snapshot {path}", e, quiet=self.quiet)
+            return False
 
-        # Generate embeddings
-        texts = [doc["text"] for doc in all_documents]
-        embeddings = self.embedding_model.encode(
-            texts, show_progress_bar=not self.quiet
-        )
+        snapshot_model = header.get("info", {}).get("model_name")
+        if snapshot_model and snapshot_model != self.model_name:
+            log_error(
+                f"Snapshot was embedded with {snapshot_model}, not {self.model_name}",
+                quiet=self.quiet,
+            )
+            return False
 
-        # Build index
-        self.database_manager.build_index(
-            all_documents, embeddings, force_rebuild=force_rebuild
-        )
+        start_time = time.time()
+        try:
+            header = self.database_manager.import_snapshot(path, collection_name)
+        except (OSError, ValueError, KeyError) as e:
+            log_error(f"Could not import snapshot {path}", e, quiet=self.quiet)
+            return False
+        self.search_engine.invalidate(header["collection"])
 
-        elapsed = time.time() - start_time
         print(
-            f"{SYMBOLS['success']} Successfully indexed {len(all_documents)} chunks from {len(files)} files"
+            f"{SYMBOLS['success']} Imported {header['count']} chunks into collection "
+            f"'{header['collection']}' ({time.time() - start_time:.1f}s)"
         )
-        print(f"Database saved to: {self.db_dir}")
-        if not self.quiet:
-            print(f"Build completed in {elapsed:.1f} seconds")
-    
+        return True
+
     def search(
         self,
         query: str,
@@ -1844,16 +5858,44 @@ class UniversalRAG:
         hybrid: bool = False,
         expand_query: bool = False,
         show_scores: bool = None,
+        collection_name: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
     ) -> List[Dict[str, Any]]:
-        """Search the vector database with enhanced capabilities."""
-        return self.search_engine.search(
+        """Search the vector database with enhanced capabilities.
+
+        ``filters`` narrows the search by ``source``, ``file_type`` and
+        ``section`` metadata. All collections share the one loaded embedding
+        model, so serving another collection only costs a cached handle and
+        its BM25 state.
+        """
+        collection_name = collection_name or self.collection_name
+        generation = self.database_manager.get_generation()
+        cache_key = SearchResultCache.make_key(
+            query, n_results, hybrid, expand_query,
+            f"{self.model_name}@{self.embedding_backend}", show_scores,
+            collection_name, filters,
+        )
+        cached = self.search_cache.get(cache_key, generation)
+        if cached is not None:
+            return cached
+
+        results = self.search_engine.search(
             query, 
             self.embedding_model,
             n_results, 
             hybrid, 
             expand_query, 
-            show_scores
+            show_scores,
+            collection_name,
+            filters,
         )
+        if results:
+            self.search_cache.put(cache_key, generation, results)
+        return results
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get search result cache hit/miss statistics."""
+        return self.search_cache.stats()
     
     def interactive_search(self) -> None:
         """Interactive search mode."""
@@ -1896,9 +5938,100 @@ class UniversalRAG:
 
         print(f"\n{SYMBOLS['bye']} Goodbye!")
     
-    def get_stats(self) -> Dict[str, Any]:
+    def get_stats(self, collection_name: Optional[str] = None) -> Dict[str, Any]:
         """Get database statistics."""
-        return self.database_manager.get_stats()
+        return self.database_manager.get_stats(collection_name)
+
+    def list_collections(self) -> List[str]:
+        """List collection names in the database."""
+        return self.database_manager.list_collections()
+
+    def vacuum(self, collection_name: Optional[str] = None, dry_run: bool = False) -> bool:
+        """Remove orphaned chunks and dead collections, then compact the store.
+
+        A chunk is orphaned when its source file is gone, or when its
+        file_hash no longer matches the file and chunks with the current hash
+        exist (the file was edited and re-indexed under new ids). Edited files
+        that haven't been re-indexed yet keep their chunks until the next build.
+        """
+        collection_name = collection_name or self.collection_name
+        size_before = self.database_manager.storage_size()
+        try:
+            # Vacuum the ChromaDB collection even if a snapshot is serving reads
+            collection = self.database_manager.client.get_collection(
+                self.database_manager.resolve_collection(collection_name)
+            )
+        except Exception:
+            log_error("Database collection not found - run 'python raggy.py build' first", quiet=self.quiet)
+            return False
+
+        current_hashes: Dict[str, Optional[str]] = {}
+        orphans: List[str] = []
+        stale: Dict[str, List[str]] = defaultdict(list)
+        reindexed: Set[str] = set()
+        reasons: Counter = Counter()
+        total = collection.count()
+        for offset in range(0, total, DEFAULT_ADD_BATCH_SIZE):
+            page = collection.get(include=["metadatas"], limit=DEFAULT_ADD_BATCH_SIZE, offset=offset)
+            for doc_id, metadata in zip(page["ids"], page["metadatas"]):
+                source = (metadata or {}).get("source")
+                if source not in current_hashes:
+                    path = self.docs_dir / source if source else None
+                    current_hashes[source] = (
+                        self.document_processor._get_file_hash(path)
+                        if path is not None and path.is_file() and validate_path(path, self.docs_dir)
+                        else None
+                    )
+                if current_hashes[source] is None:
+                    orphans.append(doc_id)
+                    reasons["deleted source"] += 1
+                elif metadata.get("file_hash") != current_hashes[source]:
+                    stale[source].append(doc_id)
+                else:
+                    reindexed.add(source)
+
+        # Stale chunks only go once the current version of their file is indexed
+        pending_sources = 0
+        for source, doc_ids in stale.items():
+            if source in reindexed:
+                orphans.extend(doc_ids)
+                reasons["stale file hash"] += len(doc_ids)
+            else:
+                pending_sources += 1
+
+        detail = ", ".join(f"{count} {reason}" for reason, count in sorted(reasons.items()))
+        print(
+            f"{SYMBOLS['search']} {len(orphans)} of {total} chunks in '{collection_name}' are orphaned"
+            + (f" ({detail})" if detail else "")
+        )
+        if pending_sources:
+            print(f"Kept chunks of {pending_sources} edited files not re-indexed yet (run build)")
+        if dry_run:
+            print("Dry run: nothing removed")
+            return True
+
+        if orphans:
+            self.database_manager.delete_chunks(collection, orphans)
+            self.database_manager.bump_generation()
+            self.search_engine.invalidate(collection_name)
+
+        dropped = self.database_manager.collect_retired()
+        dropped += self.database_manager.drop_abandoned_shadows(collection_name)
+        if dropped and not self.quiet:
+            print(f"Dropped {len(dropped)} retired or abandoned collections: {', '.join(dropped)}")
+
+        pruned = self.document_processor.prune_page_cache()
+        if pruned and not self.quiet:
+            print(f"Removed {pruned} cached page texts of deleted PDFs")
+
+        compacted = self.database_manager.compact()
+        reclaimed = size_before - self.database_manager.storage_size()
+        print(
+            f"{SYMBOLS['success']} Removed {len(orphans)} chunks"
+            f"{', compacted store' if compacted else ''}; "
+            f"reclaimed {max(0, reclaimed) / (1024 * 1024):.1f} MB"
+        )
+        return True
 
 
     def _get_file_hash(self, file_path: Path) -> str:
@@ -1962,27 +6095,7 @@ class UniversalRAG:
 
     def _extract_docx_content(self, file_path: Path) -> str:
         """Extract content from Word document."""
-        from docx import Document
-        
-        doc = Document(file_path)
-        text_parts = []
-        
-        # Extract paragraphs
-        for paragraph in doc.paragraphs:
-            if paragraph.text.strip():
-                text_parts.append(paragraph.text.strip())
-        
-        # Extract tables
-        for table in doc.tables:
-            for row in table.rows:
-                row_text = []
-                for cell in row.cells:
-                    if cell.text.strip():
-                        row_text.append(cell.text.strip())
-                if row_text:
-                    text_parts.append(" | ".join(row_text))
-        
-        return "\n\n".join(text_parts)
+        return self.document_processor._extract_docx_content(file_path)
 
     def _extract_txt_content(self, file_path: Path) -> str:
         """Extract content from plain text file with encoding fallback."""
@@ -2168,13 +6281,7 @@ class UniversalRAG:
             print(f"Please add your documentation files to {self.docs_dir}")
             return []
 
-        patterns = ["**/*.md", "**/*.pdf", "**/*.docx", "**/*.txt"]
-        files = []
-
-        for pattern in patterns:
-            files.extend(self.docs_dir.glob(pattern))
-
-        return sorted(files)
+        return self.document_processor.find_documents()
 
     def _process_document(self, file_path: Path) -> List[Dict[str, Any]]:
         """Process a single document into chunks"""
@@ -2311,6 +6418,180 @@ class UniversalRAG:
             print(f"✗ Scoring normalizer error: {e}")
         tests_total += 1
         
+        # Test 5: MMR reranking
+        try:
+            print("Testing MMR reranking...")
+            vectors = [[1.0, 0.0], [0.99, 0.01], [0.0, 1.0]]
+            selected = mmr_select([0.9, 0.89, 0.6], vectors, 2, lambda_mult=0.5)
+            if selected == [0, 2]:
+                print("✓ MMR reranking working correctly")
+                tests_passed += 1
+            else:
+                print("✗ MMR reranking test failed")
+        except Exception as e:
+            print(f"✗ MMR reranking error: {e}")
+        tests_total += 1
+        
+        # Test 6: Snippet highlighter
+        try:
+            print("Testing snippet highlighter...")
+            text = "intro " * 40 + "vector search uses vector embeddings " + "outro " * 40
+            snippet = QueryHighlighter("vector embeddings", 60).highlight(text)
+            if "vector embeddings" in snippet and snippet.startswith("..."):
+                print("✓ Snippet highlighter working correctly")
+                tests_passed += 1
+            else:
+                print("✗ Snippet highlighter test failed")
+        except Exception as e:
+            print(f"✗ Snippet highlighter error: {e}")
+        tests_total += 1
+        
+        # Test 7: Search result cache
+        try:
+            print("Testing search result cache...")
+            cache = SearchResultCache(max_size=2, ttl=60)
+            key = SearchResultCache.make_key("Hello  World", 5, False, False, "model")
+            cache.put(key, 1, [{"text": "hit"}])
+            hit = cache.get(SearchResultCache.make_key("hello world", 5, False, False, "model"), 1)
+            stale = cache.get(key, 2)
+            if hit == [{"text": "hit"}] and stale is None and cache.stats()["hits"] == 1:
+                print("✓ Search result cache working correctly")
+                tests_passed += 1
+            else:
+                print("✗ Search result cache test failed")
+        except Exception as e:
+            print(f"✗ Search result cache error: {e}")
+        tests_total += 1
+        
+        # Test 8: Length-bucketed batching
+        try:
+            print("Testing length-bucketed batching...")
+            lengths = [10, 200, 12, 190, 11, 205]
+            batches = plan_length_buckets(lengths, token_budget=450, max_batch_size=4)
+            covered = sorted(i for batch in batches for i in batch)
+            if covered == list(range(len(lengths))) and padded_tokens(lengths, batches) < padded_tokens(lengths, [[0, 1], [2, 3], [4, 5]]):
+                print("✓ Length-bucketed batching working correctly")
+                tests_passed += 1
+            else:
+                print("✗ Length-bucketed batching test failed")
+        except Exception as e:
+            print(f"✗ Length-bucketed batching error: {e}")
+        tests_total += 1
+
+        # Test 9: Boolean prefilter
+        try:
+            print("Testing boolean prefilter...")
+            must_have, must_not, _ = QueryProcessor().parse_boolean("cats AND dogs -birds")
+            scorer = BM25Scorer()
+            scorer.fit(["cats and dogs", "cats dogs birds", "cats only", "well-known dogs"])
+            if scorer.match(must_have, must_not) == {0} and scorer.match([], ["cats"]) == {3}:
+                print("✓ Boolean prefilter working correctly")
+                tests_passed += 1
+            else:
+                print("✗ Boolean prefilter test failed")
+        except Exception as e:
+            print(f"✗ Boolean prefilter error: {e}")
+        tests_total += 1
+        
+        # Test 10: Dimension reduction
+        try:
+            print("Testing dimension reduction...")
+            import numpy as np
+            vectors = np.eye(6, dtype=np.float32) + 0.1
+            reducer = DimensionReducer.from_bytes(DimensionReducer.fit(vectors, 3).to_bytes())
+            reduced = reducer.transform(vectors)
+            truncated = DimensionReducer.fit(vectors, 2, "truncate").transform(vectors)
+            if reduced.shape == (6, 3) and truncated.shape == (6, 2) and np.allclose(
+                np.linalg.norm(reduced, axis=1), 1.0, atol=1e-5
+            ):
+                print("✓ Dimension reduction working correctly")
+                tests_passed += 1
+            else:
+                print("✗ Dimension reduction test failed")
+        except Exception as e:
+            print(f"✗ Dimension reduction error: {e}")
+        tests_total += 1
+        
+        # Test 11: Binary prefilter
+        try:
+            print("Testing binary prefilter...")
+            import numpy as np
+            vectors = np.array([[1, -1, 1, -1], [-1, 1, -1, 1], [1, 1, 1, -1]], dtype=np.float32)
+            binary_index = BinaryIndex.from_embeddings(vectors, ["a", "b", "c"])
+            if binary_index.search(np.array([0.9, -0.2, 0.5, -0.1]), 2) == [0, 2]:
+                print("✓ Binary prefilter working correctly")
+                tests_passed += 1
+            else:
+                print("✗ Binary prefilter test failed")
+        except Exception as e:
+            print(f"✗ Binary prefilter error: {e}")
+        tests_total += 1
+        
+        # Test 12: Content-defined chunk boundaries
+        try:
+            print("Testing content-defined chunking...")
+            text = "".join(f"Sentence {i} has a few words in it. " for i in range(200))
+
+            def content_chunks(value: str) -> List[str]:
+                chunker = ContentDefinedChunker(300, 50)
+                return chunker.feed(value) + chunker.finish()
+
+            original = content_chunks(text)
+            edited = content_chunks("A new opening line. " + text)
+            if len(set(edited) - set(original)) <= 2 < len(original):
+                print("✓ Content-defined chunking working correctly")
+                tests_passed += 1
+            else:
+                print("✗ Content-defined chunking test failed")
+        except Exception as e:
+            print(f"✗ Content-defined chunking error: {e}")
+        tests_total += 1
+        
+        # Test 13: Ignore rules
+        try:
+            print("Testing ignore rules...")
+            rules = IgnoreRules.from_patterns(["node_modules/", "logs/*", "!logs/keep.txt", "/build"])
+            checks = [
+                rules.match("a/node_modules", is_dir=True) is True,
+                rules.match("logs/debug.txt") is True,
+                rules.match("logs/keep.txt") is False,
+                rules.match("build") is True,
+                rules.match("docs/build") is None,
+            ]
+            if all(checks):
+                print("✓ Ignore rules working correctly")
+                tests_passed += 1
+            else:
+                print("✗ Ignore rules test failed")
+        except Exception as e:
+            print(f"✗ Ignore rules error: {e}")
+        tests_total += 1
+
+        # Test 14: Memory budget
+        try:
+            print("Testing memory budget...")
+            sizes = {"commit_chunks": 1000, "batch_size": 32, "token_budget": 0, "insert_batch_size": 5000}
+            budget = MemoryBudget(1024 * 1024, sizes)
+            budget.window_peak = budget.limit
+            budget.adapt(1000)
+            shrunk = dict(budget.sizes)
+            budget.window_peak = 1
+            budget.adapt(500)
+            checks = [
+                shrunk == {"commit_chunks": 500, "batch_size": 16, "token_budget": 0, "insert_batch_size": 2500},
+                budget.sizes == sizes,
+                parse_memory_size("2G") == 2048,
+                parse_memory_size("512") == 512,
+            ]
+            if all(checks):
+                print("✓ Memory budget working correctly")
+                tests_passed += 1
+            else:
+                print("✗ Memory budget test failed")
+        except Exception as e:
+            print(f"✗ Memory budget error: {e}")
+        tests_total += 1
+        
         # Summary
         print(f"\nTest Results: {tests_passed}/{tests_total} tests passed")
         if tests_passed == tests_total:
@@ -2320,6 +6601,151 @@ class UniversalRAG:
             print(f"⚠️  {tests_total - tests_passed} tests failed")
             return False
 
+    def benchmark_backends(self, sample_size: int = BENCH_SAMPLE_SIZE) -> bool:
+        """Compare embedding backends for speed and agreement with PyTorch.
+
+        An unavailable backend fails the benchmark when it was asked for
+        (``--backend`` or config); the default ONNX comparison is skipped.
+        """
+        import numpy as np
+
+        requested = self.embedding_backend != "torch"
+        backend = self.embedding_backend if requested else "onnx"
+        tolerance = self.config["embedding"].get("bench_tolerance", DEFAULT_BENCH_TOLERANCE)
+        print(f"\n{SYMBOLS['search']} Benchmarking {self.model_name}: torch vs {backend}")
+
+        texts = self._benchmark_texts(sample_size)
+        print(f"Sample: {len(texts)} texts")
+
+        embeddings = {}
+        for name in ("torch", backend):
+            start = time.time()
+            try:
+                model = self._load_embedding_model(name, fallback=False)
+            except Exception as e:
+                if name == "torch" or requested:
+                    log_error(f"Could not load {name} backend", e)
+                    return False
+                # The ONNX extra is optional; don't fail the rest of bench over it
+                log_warning(
+                    f"Skipping the {name} comparison, backend unavailable "
+                    "(uv pip install \"sentence-transformers[onnx]\")",
+                    e,
+                )
+                return True
+            load_time = time.time() - start
+
+            model.encode(texts[:2])  # Warm up
+            start = time.time()
+            embeddings[name] = np.asarray(
+                model.encode(texts, normalize_embeddings=True), dtype=np.float32
+            )
+            encode_time = time.time() - start
+            rate = len(texts) / encode_time if encode_time > 0 else float("inf")
+            print(f"  {name:>5}: load {load_time:.2f}s, encode {encode_time:.3f}s ({rate:.1f} texts/s)")
+
+        cosine = np.sum(embeddings["torch"] * embeddings[backend], axis=1)
+        print(f"  Cosine vs torch: min {cosine.min():.4f}, mean {cosine.mean():.4f} (tolerance {tolerance})")
+
+        if cosine.min() >= tolerance:
+            print(f"{SYMBOLS['success']} {backend} embeddings are within tolerance")
+            return True
+        print(f"⚠️  {backend} embeddings drift beyond tolerance - keep the torch backend or disable quantize")
+        return False
+
+    def benchmark_reduction(self, sample_size: int = REDUCTION_BENCH_SAMPLE, k: int = DEFAULT_RESULTS) -> bool:
+        """Report the recall and speed trade-off of dimension reduction.
+
+        The projection saved with the collection is evaluated when there is
+        one; otherwise the configured reduction is fitted on half of the
+        sample. Either way recall is measured on held-out chunks: each one
+        queries the others, and recall@k is the overlap of its reduced-space
+        neighbours with its full-dimension neighbours.
+        """
+        import numpy as np
+
+        try:
+            reducer = self.database_manager.load_projection(self.database_manager.get_collection())
+        except Exception:
+            reducer = None  # No index yet
+        reduce_dim = self.config["embedding"].get("reduce_dim")
+        if reducer is None and not reduce_dim:
+            return True  # Nothing to benchmark
+
+        if reducer is not None:
+            print(f"\n{SYMBOLS['search']} Benchmarking the index's {reducer.method} projection to {reducer.dim} dimensions")
+            texts = self._benchmark_texts(sample_size, exclude=set(reducer.fit_ids))
+            if len(texts) < 2:
+                print("Every indexed chunk was used to fit the projection; no held-out chunks to measure recall on")
+                return True
+            full = np.asarray(
+                self.embedding_model.encode(texts, normalize_embeddings=True), dtype=np.float32
+            )
+            if full.shape[1] != reducer.source_dim:
+                log_error(
+                    f"The index was reduced from {reducer.source_dim} dimensions, "
+                    f"but the current model produces {full.shape[1]}"
+                )
+                return False
+        else:
+            method = self.config["embedding"].get("reduce_method", "pca")
+            print(f"\n{SYMBOLS['search']} Benchmarking {method} reduction to {reduce_dim} dimensions (not applied to the index)")
+            texts = self._benchmark_texts(2 * sample_size)
+            sample = np.asarray(
+                self.embedding_model.encode(texts, normalize_embeddings=True), dtype=np.float32
+            )
+            try:
+                reducer = DimensionReducer.fit(sample[::2], reduce_dim, method)
+            except ValueError as e:
+                log_error(f"Cannot reduce this sample: {e}")
+                return False
+            full = sample[1::2]
+        if len(full) < 2:
+            log_error("Not enough held-out chunks to measure recall")
+            return False
+        reduced = reducer.transform(full)
+        k = min(k, len(full) - 1)
+
+        def neighbours(vectors: Any) -> Tuple[Any, float]:
+            start = time.perf_counter()
+            scores = vectors @ vectors.T
+            elapsed = time.perf_counter() - start
+            np.fill_diagonal(scores, -np.inf)  # A chunk is not its own neighbour
+            return np.argpartition(-scores, k, axis=1)[:, :k], elapsed
+
+        full_top, full_time = neighbours(full)
+        reduced_top, reduced_time = neighbours(reduced)
+        recall = np.mean([
+            len(set(a) & set(b)) / k for a, b in zip(full_top.tolist(), reduced_top.tolist())
+        ])
+        speedup = full_time / reduced_time if reduced_time > 0 else float("inf")
+
+        print(f"Held-out sample: {len(full)} chunks")
+        print(f"  Dimensions: {reducer.source_dim} -> {reducer.dim} ({reducer.dim / reducer.source_dim:.0%} of the vector size)")
+        print(f"  Recall@{k} vs full embeddings: {recall:.3f}")
+        print(f"  Scoring speedup: {speedup:.1f}x")
+        return True
+
+    def _benchmark_texts(self, sample_size: int, exclude: Optional[Set[str]] = None) -> List[str]:
+        """Sample indexed chunks for benchmarking (minus ``exclude`` ids), with a built-in fallback."""
+        exclude = exclude or set()
+        try:
+            data = self.database_manager.get_collection().get(
+                limit=sample_size + len(exclude), include=["documents"]
+            )
+            if data["documents"]:
+                return [
+                    text for doc_id, text in zip(data["ids"], data["documents"]) if doc_id not in exclude
+                ][:sample_size]
+        except Exception:
+            pass  # No index yet
+        return [
+            "How do I configure the voice bot for a new guild?",
+            "Characters are defined by a biography, prompts and a voice sample.",
+            "The TTS server streams audio back over a websocket connection.",
+            "Run the build command after adding documents to the docs directory.",
+        ] * max(1, sample_size // 4)
+
     def diagnose_system(self) -> None:
         """Diagnose system setup and dependencies"""
         print(f"\n{SYMBOLS['search']} Diagnosing raggy system setup...")
@@ -2427,6 +6853,17 @@ class UniversalRAG:
         
         if not isinstance(search_config.get("max_results"), int) or search_config.get("max_results", 5) < 1:
             issues.append("Invalid max_results in search config (should be >= 1)")
+
+        if search_config.get("rerank_strategy", DEFAULT_RERANK_STRATEGY) not in ("mmr", "source"):
+            issues.append("Invalid rerank_strategy in search config (should be 'mmr' or 'source')")
+
+        mmr_lambda = search_config.get("mmr_lambda", DEFAULT_MMR_LAMBDA)
+        if not isinstance(mmr_lambda, (int, float)) or not (0 <= mmr_lambda <= 1):
+            issues.append("Invalid mmr_lambda in search config (should be 0.0-1.0)")
+
+        rescore_factor = search_config.get("binary_rescore_factor", BINARY_RESCORE_FACTOR)
+        if not isinstance(rescore_factor, int) or rescore_factor < 1:
+            issues.append("Invalid binary_rescore_factor in search config (should be >= 1)")
         
         # Validate chunking config
         chunking_config = config.get("chunking", {})
@@ -2439,6 +6876,43 @@ class UniversalRAG:
         if not isinstance(max_size, int) or max_size < min_size:
             issues.append("max_chunk_size should be >= min_chunk_size")
         
+        embedding_backend = config.get("embedding", {}).get("backend", DEFAULT_EMBEDDING_BACKEND)
+        if embedding_backend not in EMBEDDING_BACKENDS:
+            issues.append(f"Invalid embedding backend '{embedding_backend}' (should be one of {', '.join(EMBEDDING_BACKENDS)})")
+
+        embedding_config = config.get("embedding", {})
+        encode_workers = embedding_config.get("workers", DEFAULT_ENCODE_WORKERS)
+        if not isinstance(encode_workers, int) or encode_workers < 0:
+            issues.append("Invalid embedding workers (should be >= 0, 0 = all cores)")
+
+        encode_batch_size = embedding_config.get("batch_size", DEFAULT_ENCODE_BATCH_SIZE)
+        if not isinstance(encode_batch_size, int) or encode_batch_size < 1:
+            issues.append("Invalid embedding batch_size (should be >= 1)")
+
+        token_budget = embedding_config.get("token_budget", DEFAULT_TOKEN_BUDGET)
+        if not isinstance(token_budget, int) or token_budget < 0:
+            issues.append("Invalid embedding token_budget (should be >= 0, 0 = fixed batches)")
+
+        reduce_dim = embedding_config.get("reduce_dim")
+        if reduce_dim is not None and (not isinstance(reduce_dim, int) or reduce_dim < 1):
+            issues.append("Invalid embedding reduce_dim (should be >= 1, or null for full size)")
+        if embedding_config.get("reduce_method", "pca") not in REDUCTION_METHODS:
+            issues.append(f"Invalid embedding reduce_method (should be one of: {', '.join(REDUCTION_METHODS)})")
+
+        max_memory_mb = embedding_config.get("max_memory_mb")
+        if max_memory_mb is not None and (not isinstance(max_memory_mb, int) or max_memory_mb < 1):
+            issues.append("Invalid embedding max_memory_mb (should be >= 1, or null for no cap)")
+
+        boundaries = config.get("chunking", {}).get("boundaries", "fixed")
+        if boundaries not in CHUNK_BOUNDARY_MODES:
+            issues.append(f"Invalid chunking boundaries (should be one of: {', '.join(CHUNK_BOUNDARY_MODES)})")
+
+        discovery_config = config.get("discovery", {})
+        for key in ("include", "exclude"):
+            patterns = discovery_config.get(key, [])
+            if not isinstance(patterns, list) or not all(isinstance(p, str) for p in patterns):
+                issues.append(f"Invalid discovery {key} (should be a list of gitignore-style patterns)")
+
         # Check model presets
         models_config = config.get("models", {})
         required_models = ["default", "fast", "multilingual", "accurate"]
@@ -2466,6 +6940,98 @@ class UniversalRAG:
             return True
 
 
+class AsyncUniversalRAG:
+    """Asyncio facade over UniversalRAG for event-loop servers.
+
+    Blocking work (query encoding and the ChromaDB query) runs on a bounded
+    thread pool. Concurrent identical searches share one in-flight call,
+    and a cancelled caller only cancels the underlying work when no other
+    caller is still waiting for it.
+    """
+
+    def __init__(
+        self, rag: UniversalRAG, max_workers: int = DEFAULT_ASYNC_WORKERS
+    ) -> None:
+        self.rag = rag
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="raggy"
+        )
+        # cache key -> [future, number of waiting callers]
+        self._inflight: Dict[Tuple[Any, ...], List[Any]] = {}
+
+    async def __aenter__(self) -> "AsyncUniversalRAG":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def warmup(self) -> None:
+        """Load the embedding model off the event loop."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, lambda: self.rag.embedding_model)
+
+    async def search(
+        self,
+        query: str,
+        n_results: int = DEFAULT_RESULTS,
+        hybrid: bool = False,
+        expand_query: bool = False,
+        show_scores: bool = None,
+        collection_name: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Search without blocking the event loop."""
+        key = SearchResultCache.make_key(
+            query, n_results, hybrid, expand_query, self.rag.model_name, show_scores,
+            collection_name or self.rag.collection_name, filters,
+        )
+        entry = self._inflight.get(key)
+        if entry is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(
+                self._executor,
+                functools.partial(
+                    self.rag.search,
+                    query,
+                    n_results,
+                    hybrid,
+                    expand_query,
+                    show_scores,
+                    collection_name,
+                    filters,
+                ),
+            )
+            entry = [future, 0]
+            self._inflight[key] = entry
+            future.add_done_callback(
+                lambda _, key=key, entry=entry: self._forget_inflight(key, entry)
+            )
+
+        entry[1] += 1
+        try:
+            # Shield so one caller's cancellation doesn't cancel the others
+            results = await asyncio.shield(entry[0])
+        except asyncio.CancelledError:
+            if entry[1] == 1:
+                entry[0].cancel()  # Only stops work that hasn't started yet
+            raise
+        finally:
+            entry[1] -= 1
+
+        # Each caller gets its own copies of the result dicts
+        return [dict(result) for result in results]
+
+    async def aclose(self) -> None:
+        """Shut down the worker pool."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, functools.partial(self._executor.shutdown, wait=True))
+
+    def _forget_inflight(self, key: Tuple[Any, ...], entry: List[Any]) -> None:
+        """Remove a finished call from the in-flight table."""
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+
+
 def parse_args() -> Any:
     """Parse command line arguments"""
     parser = argparse.ArgumentParser(
@@ -2493,20 +7059,32 @@ Examples:
   Output & Analysis:
     %(prog)s search "query" --json             # Enhanced JSON with score breakdown
     %(prog)s optimize                           # Benchmark semantic vs hybrid search
+    %(prog)s bench --backend onnx               # Compare ONNX int8 vs PyTorch embeddings
     %(prog)s interactive --quiet                # Interactive mode, minimal output
     
   Advanced:
     %(prog)s rebuild --config custom.yaml       # Use custom configuration
+    %(prog)s rebuild --resume                   # Continue an interrupted rebuild
+    %(prog)s build --collection guild_123       # Index into a named collection
+    %(prog)s build --workers 0 --batch-size 64  # Encode with one process per core
+    %(prog)s build --shard 2/4 --shard-dir shards # Build one of 4 shards (one per node)
+    %(prog)s merge --shard-dir shards           # Merge all shards into the collection
+    %(prog)s export index.snap                  # Write a compact, portable snapshot
+    %(prog)s import index.snap                  # Serve a snapshot without re-indexing
+    %(prog)s vacuum                             # Drop chunks of edited/deleted files, compact
+    %(prog)s search "lore" --collection maya   # Search one tenant's collection
+    %(prog)s search "setup" --type pdf --source "guides/*" # Filtered search
     %(prog)s search "term" --results 10        # More results with quality scores
+    %(prog)s search "term" --mmr-lambda 0.5    # Trade relevance for more diverse results
         """,
     )
 
     parser.add_argument(
         "command",
-        choices=["init", "build", "rebuild", "search", "interactive", "status", "optimize", "test", "diagnose", "validate"],
+        choices=["init", "build", "rebuild", "merge", "export", "import", "vacuum", "search", "interactive", "status", "optimize", "bench", "test", "diagnose", "validate"],
         help="Command to execute",
     )
-    parser.add_argument("query", nargs="*", help="Search query (for search command)")
+    parser.add_argument("query", nargs="*", help="Search query (for search), shard files (for merge) or snapshot file (for export/import)")
 
     # Options
     parser.add_argument(
@@ -2517,6 +7095,13 @@ Examples:
         default="./vectordb",
         help="Vector database directory (default: ./vectordb)",
     )
+    parser.add_argument(
+        "--collection",
+        help=(
+            f"Collection name, e.g. one per guild or character (default: {DEFAULT_COLLECTION}; "
+            "import uses the name stored in the snapshot)"
+        ),
+    )
     parser.add_argument(
         "--model", default="all-MiniLM-L6-v2", help="Embedding model name"
     )
@@ -2532,6 +7117,27 @@ Examples:
     parser.add_argument(
         "--results", type=int, default=5, help="Number of search results (default: 5)"
     )
+    parser.add_argument(
+        "--source",
+        action="append",
+        help="Only search these source files (path or glob, repeatable)",
+    )
+    parser.add_argument(
+        "--type",
+        dest="file_type",
+        action="append",
+        help="Only search these file types, e.g. pdf or md (repeatable)",
+    )
+    parser.add_argument(
+        "--section",
+        action="append",
+        help="Only search sections whose header contains this text (case-sensitive, repeatable)",
+    )
+    parser.add_argument(
+        "--mmr-lambda",
+        type=float,
+        help="MMR relevance/diversity trade-off, 0.0-1.0 (overrides config)",
+    )
 
     # Flags
     parser.add_argument(
@@ -2545,6 +7151,55 @@ Examples:
     parser.add_argument(
         "--expand", action="store_true", help="Expand query with synonyms"
     )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="With vacuum: report orphaned chunks without removing them",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted build from its last committed batch",
+    )
+    parser.add_argument(
+        "--shard",
+        help="Build only shard i of N (1-based, e.g. 2/8) into --shard-dir",
+    )
+    parser.add_argument(
+        "--shard-dir",
+        default=DEFAULT_SHARD_DIR,
+        help=f"Directory for shard artifacts (default: {DEFAULT_SHARD_DIR})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Embedding worker processes for build (0 = one per CPU core)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        help=f"Embedding batch size for build (default: {DEFAULT_ENCODE_BATCH_SIZE})",
+    )
+    parser.add_argument(
+        "--max-memory",
+        help="Cap build RSS (e.g. 2G, 512M); batch sizes shrink to stay under it",
+    )
+    parser.add_argument(
+        "--reduce-dim",
+        type=int,
+        help="Store embeddings with this many dimensions (applied by 'rebuild'; bench reports recall)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=EMBEDDING_BACKENDS,
+        help="Embedding backend (overrides config; onnx = ONNX Runtime on CPU)",
+    )
+    parser.add_argument(
+        "--dtype",
+        choices=["float16", "float32"],
+        default=DEFAULT_SNAPSHOT_DTYPE,
+        help=f"Vector precision for export (default: {DEFAULT_SNAPSHOT_DTYPE})",
+    )
     parser.add_argument(
         "--model-preset",
         choices=["fast", "balanced", "multilingual", "accurate"],
@@ -2592,7 +7247,53 @@ class BuildCommand(Command):
         force_rebuild = hasattr(args, 'force_rebuild') and args.force_rebuild
         if hasattr(args, 'command') and args.command == 'rebuild':
             force_rebuild = True
-        rag.build(force_rebuild=force_rebuild)
+        shard = parse_shard_spec(args.shard) if getattr(args, 'shard', None) else None
+        rag.build(
+            force_rebuild=force_rebuild,
+            shard=shard,
+            shard_dir=args.shard_dir,
+            resume=getattr(args, 'resume', False),
+        )
+
+
+class MergeCommand(Command):
+    """Merge shard artifacts into one collection."""
+    
+    def execute(self, args: Any, rag: UniversalRAG) -> None:
+        if args.query:
+            shard_paths = [Path(path) for path in args.query]
+        else:
+            shard_paths = sorted(Path(args.shard_dir).glob("shard-*-of-*.npz"))
+        if not rag.merge_shards(shard_paths):
+            sys.exit(1)
+
+
+class ExportCommand(Command):
+    """Export a collection to a snapshot file."""
+    
+    def execute(self, args: Any, rag: UniversalRAG) -> None:
+        path = Path(args.query[0]) if args.query else None
+        if rag.export_snapshot(path, dtype=args.dtype) is None:
+            sys.exit(1)
+
+
+class ImportCommand(Command):
+    """Import a snapshot file as a collection."""
+    
+    def execute(self, args: Any, rag: UniversalRAG) -> None:
+        if not args.query:
+            log_error("Please provide a snapshot file", quiet=args.quiet)
+            sys.exit(1)
+        if not rag.import_snapshot(Path(args.query[0]), args.collection):
+            sys.exit(1)
+
+
+class VacuumCommand(Command):
+    """Remove orphaned chunks and compact the database."""
+    
+    def execute(self, args: Any, rag: UniversalRAG) -> None:
+        if not rag.vacuum(dry_run=args.dry_run):
+            sys.exit(1)
 
 
 class SearchCommand(Command):
@@ -2604,8 +7305,17 @@ class SearchCommand(Command):
             return
 
         query = " ".join(args.query)
+        filters = {
+            "source": args.source,
+            "file_type": args.file_type,
+            "section": args.section,
+        }
         results = rag.search(
-            query, n_results=args.results, hybrid=args.hybrid, expand_query=args.expand
+            query,
+            n_results=args.results,
+            hybrid=args.hybrid,
+            expand_query=args.expand,
+            filters=filters,
         )
 
         if not results:
@@ -2636,6 +7346,10 @@ class SearchCommand(Command):
                 print("(Using hybrid semantic + keyword search)")
             if args.expand:
                 print("(Using query expansion)")
+            active_filters = {k: v for k, v in filters.items() if v}
+            if active_filters:
+                described = "; ".join(f"{k}={', '.join(v)}" for k, v in active_filters.items())
+                print(f"(Filtered by {described})")
             print("=" * 50)
 
             for i, result in enumerate(results, 1):
@@ -2670,6 +7384,7 @@ class StatusCommand(Command):
             print(f"Error getting stats: {stats['error']}")
         else:
             print(f"Database Statistics:")
+            print(f"  Collection: {stats['collection']}")
             print(f"  Total chunks: {stats['total_chunks']}")
             print(f"  Database path: {stats['db_path']}")
             print(f"  Model: {rag.model_name}")
@@ -2677,6 +7392,12 @@ class StatusCommand(Command):
             print(f"  Documents:")
             for source, count in sorted(stats["sources"].items()):
                 print(f"    {source}: {count} chunks")
+            try:
+                collections = rag.list_collections()
+                if len(collections) > 1:
+                    print(f"  Collections: {', '.join(collections)}")
+            except Exception:
+                pass  # Listing is informational only
 
 
 class OptimizeCommand(Command):
@@ -2767,6 +7488,16 @@ class OptimizeCommand(Command):
         )
 
 
+class BenchCommand(Command):
+    """Benchmark embedding backends against PyTorch (and any dimension reduction)."""
+    
+    def execute(self, args: Any, rag: UniversalRAG) -> None:
+        success = rag.benchmark_backends()
+        success = rag.benchmark_reduction() and success
+        if not success:
+            sys.exit(1)
+
+
 class TestCommand(Command):
     """Run built-in self-tests."""
     
@@ -2799,10 +7530,15 @@ class CommandFactory:
         "init": InitCommand,
         "build": BuildCommand,
         "rebuild": BuildCommand,
+        "merge": MergeCommand,
+        "export": ExportCommand,
+        "import": ImportCommand,
+        "vacuum": VacuumCommand,
         "search": SearchCommand,
         "interactive": InteractiveCommand,
         "status": StatusCommand,
         "optimize": OptimizeCommand,
+        "bench": BenchCommand,
         "test": TestCommand,
         "diagnose": DiagnoseCommand,
         "validate": ValidateCommand,
@@ -2870,7 +7606,19 @@ def main() -> None:
             chunk_overlap=args.chunk_overlap,
             quiet=args.quiet,
             config_path=args.config,
+            collection_name=args.collection or DEFAULT_COLLECTION,
+            embedding_backend=args.backend,
         )
+        if args.mmr_lambda is not None:
+            rag.config["search"]["mmr_lambda"] = args.mmr_lambda
+        if args.workers is not None:
+            rag.config["embedding"]["workers"] = args.workers
+        if args.batch_size is not None:
+            rag.config["embedding"]["batch_size"] = args.batch_size
+        if args.reduce_dim is not None:
+            rag.config["embedding"]["reduce_dim"] = args.reduce_dim
+        if args.max_memory is not None:
+            rag.config["embedding"]["max_memory_mb"] = parse_memory_size(args.max_memory)
 
         # Execute the command
         command.execute(args, rag)